@@ -0,0 +1,78 @@
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+from meta_data.database import MetaDatabase
+from meta_data.models.directory import Directory
+from meta_data.models.file import File
+
+DATA_NODES = 10
+REPLICAS = 3
+
+
+def populate(db, chunk_counts):
+    files = {}
+    with db.transaction():
+        db.cursor.executemany("INSERT INTO data_node (id, ip_address, rack_number, priority, available_byte_size) "
+                              "VALUES (?, ?, 1, 0, 0);",
+                              [(node, f"10.0.0.{node}") for node in range(1, DATA_NODES + 1)])
+        directory = Directory(db=db, title=Directory.MAIN_DIR_NAME, path=Directory.main_directory_path("reader"))
+        directory.save()
+
+        for chunk_count in chunk_counts:
+            file = File(db=db, title=f"file{chunk_count}", extension="bin", directory_id=directory.id,
+                        sequence_num=chunk_count, is_complete=True)
+            file.save()
+            db.cursor.executemany("INSERT INTO chunk (sequence, local_path, chunk_size, data_node_id, file_id) "
+                                  "VALUES (?, ?, 67108864, ?, ?);",
+                                  [(sequence, f"/srv/dfs/{file.id}_{sequence}_{replica}",
+                                    (sequence + replica) % DATA_NODES + 1, file.id)
+                                   for sequence in range(1, chunk_count + 1) for replica in range(REPLICAS)])
+            files[chunk_count] = file
+    return files
+
+
+def chunk_map_per_chunk(file):
+    return [(chunk.sequence, chunk.local_path, chunk.data_node.ip_address) for chunk in file.chunks]
+
+
+def chunk_map_joined(file):
+    return [(location.sequence, location.local_path, location.ip_address) for location in file.chunk_locations]
+
+
+def measure(function, file, repeats):
+    start = perf_counter()
+    for _ in range(repeats):
+        function(file)
+    return (perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk map lookup cost with a query per chunk versus one JOIN")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 10, 100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        MetaDatabase.DATABASE_PATH = os.path.join(directory, "meta_data.db")
+        MetaDatabase.initialize_tables()
+        db = MetaDatabase()
+        files = populate(db, args.chunks)
+
+        results = []
+        for chunk_count, file in files.items():
+            per_chunk = measure(chunk_map_per_chunk, file, args.repeats)
+            joined = measure(chunk_map_joined, file, args.repeats)
+            results.append((chunk_count, per_chunk, joined))
+        db.close()
+
+    print(f"{'chunks':>7} {'per chunk query':>16} {'joined':>10} {'joined/chunk':>13}   (milliseconds, "
+          f"{REPLICAS} replicas per chunk)")
+    for chunk_count, per_chunk, joined in results:
+        print(f"{chunk_count:7} {per_chunk * 1000:16.2f} {joined * 1000:10.2f} "
+              f"{joined * 1000 / chunk_count:13.4f}")
+
+
+if __name__ == "__main__":
+    main()
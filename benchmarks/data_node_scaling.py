@@ -0,0 +1,111 @@
+import argparse
+import os
+import tempfile
+from multiprocessing import Pipe, Pool
+from time import perf_counter, sleep
+
+from controllers.data_node_worker import DataNodeWorker
+from meta_data.database import MetaDatabase
+from meta_data.models.chunk import Chunk
+from meta_data.models.data_node import DataNode
+from meta_data.models.directory import Directory
+from meta_data.models.file import File
+from meta_data.models.permission import Permission
+from meta_data.models.user import User
+from servers.data_node_server import DataNodeServer
+from session.exceptions import PeerTimeOutException
+from session.sessions import EncryptedSession, FileSession
+from valid_messages import GET_CHUNK, ACCEPT
+
+IP_ADDRESS = "127.0.0.1"
+USERNAME = "bench"
+
+
+def create_fixture(directory, chunk_size):
+    MetaDatabase.initialize_tables()
+    db = MetaDatabase()
+    data_node = DataNode(db=db, ip_address=IP_ADDRESS, rack_number=1, priority=0, available_byte_size=10 ** 12,
+                         last_seen=0)
+    data_node.save()
+    user = User(db=db, username=USERNAME, password=USERNAME)
+    user.save()
+    main_directory = Directory(db=db, title=Directory.MAIN_DIR_NAME, path=Directory.main_directory_path(USERNAME))
+    main_directory.save()
+    Permission(db=db, perm=Permission.OWNER, directory_id=main_directory.id, user_id=user.id).save()
+    file = File(db=db, title="blob", extension="bin", directory_id=main_directory.id, sequence_num=1,
+                is_complete=True)
+    file.save()
+    Permission(db=db, perm=Permission.OWNER, file_id=file.id, user_id=user.id).save()
+
+    chunk_path = os.path.join(directory, "chunk")
+    with open(chunk_path, "wb") as chunk_file:
+        chunk_file.write(os.urandom(chunk_size))
+    Chunk(db=db, sequence=1, local_path=chunk_path, chunk_size=chunk_size, data_node_id=data_node.id,
+          file_id=file.id).save()
+    db.close()
+
+
+def fetch_chunks(requests):
+    received = 0
+    for _ in range(requests):
+        session = EncryptedSession(ip_address=IP_ADDRESS, port_number=DataNodeServer.DATA_NODE_PORT_NUMBER,
+                                   frame_size=None)
+        session.transfer_data(GET_CHUNK.format(path=f"{USERNAME}/main/blob.bin", username=USERNAME, sequence=1))
+        if session.receive_data() == ACCEPT:
+            received += len(FileSession().receive_chunk(session))
+        session.close()
+    return received
+
+
+def wait_for_port():
+    while True:
+        try:
+            fetch_chunks(1)
+            return
+        except PeerTimeOutException:
+            sleep(0.1)
+
+
+def run(process_count, directory, clients, requests):
+    workers = []
+    pipes = []
+    for _ in range(process_count):
+        controller_side, worker_side = Pipe()
+        worker = DataNodeWorker(ip_address=IP_ADDRESS, storage_path=directory, config={},
+                                accounting_pipe=worker_side,
+                                identity_key_path=os.path.join(directory, "node_key.pem"))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+        pipes.append(controller_side)
+    wait_for_port()
+
+    with Pool(clients) as pool:
+        start = perf_counter()
+        received = sum(pool.map(fetch_chunks, [requests] * clients))
+        elapsed = perf_counter() - start
+
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    return received / elapsed / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate GET_CHUNK throughput with N SO_REUSEPORT workers")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--chunk-size-mb", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        create_fixture(directory, args.chunk_size_mb * 2 ** 20)
+        for process_count in args.processes:
+            throughput = run(process_count, directory + os.sep, args.clients, args.requests)
+            print(f"{process_count:>3} worker process(es): {throughput:10.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
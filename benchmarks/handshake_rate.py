@@ -0,0 +1,57 @@
+import argparse
+import socket
+from threading import Thread
+from time import perf_counter
+
+from encryption.encryptors import RSAEncryption
+from session.sessions import EncryptedSession
+
+
+def serve(server_socket, connections):
+    for _ in range(connections):
+        client_socket, addr = server_socket.accept()
+        session = EncryptedSession(input_socket=client_socket, is_server=True)
+        session.transfer_data(session.receive_data())
+        session.close()
+
+
+def run(mode, connections):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(connections)
+    port_number = server_socket.getsockname()[1]
+    thread = Thread(target=serve, args=[server_socket, connections])
+    thread.start()
+
+    RSAEncryption.get_identity_key()
+    start = perf_counter()
+    for _ in range(connections):
+        if mode == "ephemeral":
+            RSAEncryption.identity_key = None
+        if mode != "resumed":
+            RSAEncryption.TICKET_CACHE.entries.clear()
+
+        session = EncryptedSession(ip_address="127.0.0.1", port_number=port_number)
+        session.transfer_data("ping")
+        session.receive_data()
+        session.close()
+    elapsed = perf_counter() - start
+
+    thread.join()
+    server_socket.close()
+    return connections / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EncryptedSession handshakes per second")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--ephemeral-connections", type=int, default=5)
+    args = parser.parse_args()
+
+    for mode, connections in [("ephemeral", args.ephemeral_connections), ("identity", args.connections),
+                              ("resumed", args.connections)]:
+        print(f"{mode:>10}: {run(mode, connections):10.1f} handshakes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import socket
+import tempfile
+from collections import OrderedDict
+from threading import Thread
+from time import perf_counter
+
+from session.sessions import FileSession, SimpleSession
+from storage.block_cache import BlockCache
+from storage.checksums import ChunkChecksum
+
+
+class LRUCache:
+    def __init__(self, capacity, block_size):
+        self.capacity = capacity // block_size
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    def get(self, key, loader):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.entries[key] = loader()
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return self.entries[key]
+
+
+def drain(session):
+    FileSession().receive_chunk(session)
+    session.close()
+
+
+def fleet_read(path, checksums, readers, block_cache):
+    threads = []
+    start = perf_counter()
+    for _ in range(readers):
+        server_socket, client_socket = socket.socketpair()
+        threads.append(Thread(target=drain, args=[SimpleSession(input_socket=client_socket)]))
+        threads.append(Thread(target=FileSession(block_cache=block_cache).transfer_file,
+                              args=[path, SimpleSession(input_socket=server_socket)],
+                              kwargs={"checksums": checksums}))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return readers * os.path.getsize(path) / (perf_counter() - start) / 2 ** 20
+
+
+def hit_rate_after_scan(cache, hot_blocks, scan_blocks, block_size):
+    block = bytes(block_size)
+    for _ in range(3):
+        for index in range(hot_blocks):
+            cache.get(("hot", index), lambda: block)
+    for index in range(scan_blocks):
+        cache.get(("scan", index), lambda: block)
+
+    hits = cache.hits
+    for index in range(hot_blocks):
+        cache.get(("hot", index), lambda: block)
+    return (cache.hits - hits) / hot_blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Data node hot-chunk cache under a fleet of concurrent readers")
+    parser.add_argument("--chunk-mb", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--cache-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    data = os.urandom(args.chunk_mb * 2 ** 20)
+    checksum = ChunkChecksum()
+    checksum.update(data)
+    with tempfile.NamedTemporaryFile(delete=False) as file:
+        file.write(data)
+
+    try:
+        block_cache = BlockCache(args.cache_mb * 2 ** 20)
+        print(f"no cache:    {fleet_read(file.name, checksum.digest(), args.readers, None):8.1f} MB/s")
+        print(f"block cache: {fleet_read(file.name, checksum.digest(), args.readers, block_cache):8.1f} MB/s")
+        statistics = block_cache.statistics()
+        print(f"             {statistics['misses']} disk reads for {args.readers * len(data) // 2 ** 16} block "
+              f"requests, {statistics['coalesced']} coalesced, {statistics['hit_rate']:.1%} hit rate")
+    finally:
+        os.remove(file.name)
+
+    capacity = 256 * ChunkChecksum.BLOCK_SIZE
+    for name, cache in [("LRU", LRUCache(capacity, ChunkChecksum.BLOCK_SIZE)),
+                        ("2Q", BlockCache(capacity, block_size=ChunkChecksum.BLOCK_SIZE))]:
+        hit_rate = hit_rate_after_scan(cache, hot_blocks=128, scan_blocks=4096, block_size=ChunkChecksum.BLOCK_SIZE)
+        print(f"hot set hit rate after a one-off scan, {name}: {hit_rate:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+from time import perf_counter
+
+import parse
+
+from codec.codec import MessageCodec, MessageDispatcher
+from valid_messages import (MESSAGE_SEPARATOR, UPDATE_DATA_NODE, NEW_USER, NEW_FILE, NEW_CHUNK, NEW_DIR, REMOVE_FILE,
+                            NEW_FILE_PERMISSION, NEW_DIR_PERMISSION, REMOVE_DATA_NODE)
+
+TEMPLATES = [UPDATE_DATA_NODE, NEW_USER, NEW_FILE, NEW_CHUNK, NEW_DIR, REMOVE_FILE, NEW_DIR_PERMISSION,
+             NEW_FILE_PERMISSION, REMOVE_DATA_NODE]
+
+MESSAGES = [
+    UPDATE_DATA_NODE.format(ip_address="10.0.0.7", available_byte_size=2 ** 40, rack_number=3, priority=1,
+                            signature="10.0.0.1-10.0.0.4"),
+    NEW_USER.format(username="alice", password="5f4dcc3b5aa765d61d8327deb882cf99", signature="10.0.0.1"),
+    NEW_FILE.format(title="report", extension="pdf", username="alice", path="alice/main/docs", sequence_num=12,
+                    signature="10.0.0.1-10.0.0.2"),
+    NEW_CHUNK.format(ip_address="10.0.0.7", sequence=3, chunk_size=2 ** 26, path="alice/main/docs", title="report",
+                     extension="pdf", destination_file_path="/srv/dfs/4f1c", signature="10.0.0.1"),
+    NEW_DIR.format(path="alice/main/docs/2024", username="alice", signature="10.0.0.1-10.0.0.3-10.0.0.9"),
+    REMOVE_FILE.format(path="alice/main/docs/report.pdf", signature="10.0.0.1"),
+    NEW_DIR_PERMISSION.format(path="alice/main/docs", username="bob", perm=2, signature="10.0.0.1"),
+    NEW_FILE_PERMISSION.format(path="alice/main/docs/report.pdf", username="bob", perm=1, signature="10.0.0.1"),
+    REMOVE_DATA_NODE.format(ip_address="10.0.0.7", signature="10.0.0.1-10.0.0.2"),
+]
+
+
+def legacy_dispatch(message):
+    command = message.split(MESSAGE_SEPARATOR)[0]
+    for template in TEMPLATES:
+        if command == template.split(MESSAGE_SEPARATOR)[0]:
+            return dict(parse.parse(template, message).named)
+
+
+def create_dispatcher():
+    return MessageDispatcher({template: (lambda message, template=template: MessageCodec.decode(template, message))
+                              for template in TEMPLATES})
+
+
+def measure(dispatch, rounds):
+    start = perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            dispatch(message)
+    return rounds * len(MESSAGES) / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Messages decoded and dispatched per second")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"parse.parse + if/elif:    {measure(legacy_dispatch, args.rounds):12.0f} msg/s")
+    print(f"compiled codec + dict:    {measure(create_dispatcher().dispatch, args.rounds):12.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
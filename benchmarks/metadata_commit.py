@@ -0,0 +1,71 @@
+import argparse
+import os
+import tempfile
+from threading import Thread
+from time import perf_counter
+
+from meta_data.database import MetaDatabase
+from meta_data.models.directory import Directory
+from meta_data.models.file import File
+from meta_data.models.permission import Permission
+from meta_data.models.user import User
+
+
+def create_files(worker, operations, user_id, directory_id):
+    db = MetaDatabase()
+    for index in range(operations):
+        with db.transaction():
+            file = File(db=db, title=f"file{worker}_{index}", extension="bin", directory_id=directory_id,
+                        sequence_num=1, is_complete=False)
+            file.save()
+            Permission(db=db, perm=Permission.OWNER, file_id=file.id, user_id=user_id).save()
+    db.close()
+
+
+def measure(threads, operations, group_commit):
+    with tempfile.TemporaryDirectory() as directory:
+        MetaDatabase.DATABASE_PATH = os.path.join(directory, "meta_data.db")
+        MetaDatabase.GROUP_COMMIT = group_commit
+        MetaDatabase.GROUP_COMMITS = {}
+        MetaDatabase.initialize_tables()
+
+        db = MetaDatabase()
+        user = User(db=db, username="writer", password="password")
+        user.save()
+        main_directory = Directory(db=db, title=Directory.MAIN_DIR_NAME, path=Directory.main_directory_path("writer"))
+        main_directory.save()
+
+        workers = [Thread(target=create_files, args=(worker, operations, user.id, main_directory.id))
+                   for worker in range(threads)]
+        start = perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = perf_counter() - start
+
+        syncs = db.group_commit.sync_count if db.group_commit is not None else threads * operations
+        db.close()
+        return threads * operations / elapsed, syncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable create-file commits per second with and without group "
+                                                 "commit")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--operations", type=int, default=200)
+    args = parser.parse_args()
+
+    results = []
+    for threads in args.threads:
+        baseline, _ = measure(threads, args.operations, False)
+        grouped, syncs = measure(threads, args.operations, True)
+        results.append((threads, baseline, grouped, syncs))
+
+    print(f"{'threads':>7} {'per-commit fsync':>18} {'group commit':>14} {'fsyncs':>8}   (operations per second)")
+    for threads, baseline, grouped, syncs in results:
+        print(f"{threads:7} {baseline:18.0f} {grouped:14.0f} {syncs:8}")
+
+
+if __name__ == "__main__":
+    main()
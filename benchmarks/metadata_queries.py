@@ -0,0 +1,164 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+from time import perf_counter
+
+from meta_data.database import MetaDatabase
+from meta_data.migrations import SchemaMigrator
+from meta_data.models.chunk import Chunk
+from meta_data.models.directory import Directory
+from meta_data.models.file import File
+from meta_data.models.permission import Permission
+
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username VARCHAR(100) NOT NULL UNIQUE,
+                    password VARCHAR(100) NOT NULL);
+CREATE TABLE directory (id INTEGER PRIMARY KEY AUTOINCREMENT, title VARCHAR(200) NOT NULL, parent_directory_id INTEGER,
+                        FOREIGN KEY (parent_directory_id) REFERENCES directory (id) ON DELETE CASCADE);
+CREATE TABLE file (id INTEGER PRIMARY KEY AUTOINCREMENT, title VARCHAR(200) NOT NULL, extension VARCHAR(10),
+                   is_complete INTEGER NOT NULL DEFAULT 0, directory_id INTEGER NOT NULL,
+                   sequence_num INTEGER NOT NULL,
+                   FOREIGN KEY (directory_id) REFERENCES directory (id) ON DELETE CASCADE);
+CREATE TABLE permission (id INTEGER PRIMARY KEY AUTOINCREMENT, perm VARCHAR(2) NOT NULL, file_id INTEGER,
+                         directory_id INTEGER, user_id INTEGER NOT NULL,
+                         FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                         FOREIGN KEY (file_id) REFERENCES file (id) ON DELETE CASCADE,
+                         FOREIGN KEY (directory_id) REFERENCES directory (id) ON DELETE CASCADE,
+                         UNIQUE (user_id, directory_id), UNIQUE (user_id, file_id));
+CREATE TABLE data_node (id INTEGER PRIMARY KEY AUTOINCREMENT, ip_address VARCHAR(15) NOT NULL UNIQUE,
+                        rack_number INTEGER NOT NULL, priority INTEGER NOT NULL,
+                        available_byte_size INTEGER NOT NULL, last_seen VARCHAR(17) NOT NULL DEFAULT 0);
+CREATE TABLE chunk (id INTEGER PRIMARY KEY AUTOINCREMENT, sequence INTEGER NOT NULL, local_path VARCHAR(500) NOT NULL,
+                    chunk_size INTEGER NOT NULL, data_node_id INTEGER NOT NULL, file_id INTEGER NOT NULL,
+                    FOREIGN KEY (data_node_id) REFERENCES data_node (id) ON DELETE CASCADE,
+                    FOREIGN KEY (file_id) REFERENCES file (id) ON DELETE CASCADE);
+"""
+
+USERS = 1000
+DIRECTORIES_PER_USER = 10
+DATA_NODES = 10
+
+
+class LegacyMetaDatabase(MetaDatabase):
+    def __init__(self):
+        self.connection = sqlite3.connect(MetaDatabase.DATABASE_PATH)
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("PRAGMA foreign_keys = ON")
+        self.transaction_depth = 0
+        self.group_commit = None
+
+
+def populate(path, file_count):
+    connection = sqlite3.connect(path)
+    connection.executescript(LEGACY_SCHEMA)
+    connection.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?);",
+                           [(user, f"user{user}", "password") for user in range(1, USERS + 1)])
+    connection.executemany("INSERT INTO data_node (id, ip_address, rack_number, priority, available_byte_size) "
+                           "VALUES (?, ?, 1, 0, 0);",
+                           [(node, f"10.0.0.{node}") for node in range(1, DATA_NODES + 1)])
+
+    directories = []
+    directory_permissions = []
+    for user in range(1, USERS + 1):
+        main_id = len(directories) + 1
+        directories.append((main_id, Directory.MAIN_DIR_NAME, None))
+        for index in range(1, DIRECTORIES_PER_USER):
+            directories.append((main_id + index, f"dir{index}", main_id))
+        for directory_id in range(main_id, main_id + DIRECTORIES_PER_USER):
+            directory_permissions.append((Permission.OWNER, directory_id, user))
+    connection.executemany("INSERT INTO directory (id, title, parent_directory_id) VALUES (?, ?, ?);", directories)
+    connection.executemany("INSERT INTO permission (perm, directory_id, user_id) VALUES (?, ?, ?);",
+                           directory_permissions)
+
+    def files():
+        for file_id in range(1, file_count + 1):
+            yield file_id, f"file{file_id}", "bin", 1, (file_id % len(directories)) + 1, 1
+
+    connection.executemany("INSERT INTO file (id, title, extension, is_complete, directory_id, sequence_num) "
+                           "VALUES (?, ?, ?, ?, ?, ?);", files())
+    connection.executemany("INSERT INTO permission (perm, file_id, user_id) VALUES (?, ?, ?);",
+                           ((Permission.OWNER, file_id, (file_id % USERS) + 1) for file_id in range(1, file_count + 1)))
+    connection.executemany("INSERT INTO chunk (sequence, local_path, chunk_size, data_node_id, file_id) "
+                           "VALUES (1, ?, 67108864, ?, ?);",
+                           ((f"/srv/dfs/{file_id}", (file_id % DATA_NODES) + 1, file_id)
+                            for file_id in range(1, file_count + 1)))
+    connection.commit()
+
+    migrator = SchemaMigrator(connection)
+    migrator.migrations = migrator.migrations[:2]
+    migrator.migrate()
+    connection.close()
+    return len(directories)
+
+
+def measure(db, file_count, directory_count, lookups, writes):
+    generator = random.Random(7)
+    samples = [generator.randint(1, file_count) for _ in range(lookups)]
+    results = {}
+
+    start = perf_counter()
+    for file_id in samples:
+        File.fetch_by_dir_title_extension(dir_id=(file_id % directory_count) + 1, title=f"file{file_id}",
+                                          extension="bin", db=db)
+    results["file by directory/title"] = perf_counter() - start
+
+    start = perf_counter()
+    for file_id in samples:
+        Chunk.fetch_by_file_id_data_node_id_sequence(file_id=file_id, data_node_id=(file_id % DATA_NODES) + 1,
+                                                     sequence=1, db=db)
+    results["chunk by file/node/seq"] = perf_counter() - start
+
+    start = perf_counter()
+    for file_id in samples:
+        File(db=db, id=file_id).get_user_permission(f"user{(file_id % USERS) + 1}")
+    results["file permission"] = perf_counter() - start
+
+    start = perf_counter()
+    for file_id in samples:
+        Directory(db=db, id=(file_id % directory_count) + 1).children
+    results["directory children"] = perf_counter() - start
+
+    start = perf_counter()
+    for index in range(writes):
+        Permission(db=db, perm=Permission.READ_ONLY, file_id=samples[index], user_id=USERS + 1).save()
+    results["permission insert+commit"] = perf_counter() - start
+    db.execute("DELETE FROM permission WHERE user_id=?;", USERS + 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot metadata model queries before and after the schema migrations")
+    parser.add_argument("--files", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        MetaDatabase.DATABASE_PATH = os.path.join(directory, "meta_data.db")
+        start = perf_counter()
+        directory_count = populate(MetaDatabase.DATABASE_PATH, args.files)
+        print(f"populated {args.files} files in {perf_counter() - start:.1f} s")
+
+        db = LegacyMetaDatabase()
+        db.execute("INSERT INTO users (id, username, password) VALUES (?, ?, ?);", USERS + 1, "reader", "password")
+        before = measure(db, args.files, directory_count, args.lookups, args.writes)
+        db.close()
+
+        start = perf_counter()
+        MetaDatabase.initialize_tables()
+        print(f"migrated in {perf_counter() - start:.1f} s")
+
+        db = MetaDatabase()
+        after = measure(db, args.files, directory_count, args.lookups, args.writes)
+        db.close()
+
+    print(f"{'operation':28} {'before':>12} {'after':>12}   (microseconds per call)")
+    for name in before:
+        count = args.writes if name.startswith("permission insert") else args.lookups
+        print(f"{name:28} {before[name] / count * 10 ** 6:12.1f} {after[name] / count * 10 ** 6:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from meta_data.database import MetaDatabase
+from meta_data.models.directory import Directory
+from meta_data.models.file import File
+from meta_data.models.permission import Permission
+from meta_data.namespace import Namespace, NamespaceEngine
+
+USERS = 100
+DIRECTORIES_PER_USER = 10
+DATA_NODES = 10
+CHUNKS_PER_FILE = 4
+
+
+def populate(db, file_count):
+    directories = []
+    with db.transaction():
+        db.cursor.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?);",
+                              [(user, f"user{user}", "password") for user in range(1, USERS + 1)])
+        db.cursor.executemany("INSERT INTO data_node (id, ip_address, rack_number, priority, available_byte_size) "
+                              "VALUES (?, ?, 1, 0, 0);",
+                              [(node, f"10.0.0.{node}") for node in range(1, DATA_NODES + 1)])
+        for user in range(1, USERS + 1):
+            main_path = Directory.main_directory_path(f"user{user}")
+            main_id = len(directories) + 1
+            directories.append((main_id, Directory.MAIN_DIR_NAME, None, main_path, user))
+            for index in range(1, DIRECTORIES_PER_USER):
+                directories.append((main_id + index, f"dir{index}", main_id, f"{main_path}/dir{index}", user))
+        db.cursor.executemany("INSERT INTO directory (id, title, parent_directory_id, path) VALUES (?, ?, ?, ?);",
+                              [directory[:4] for directory in directories])
+        db.cursor.executemany("INSERT INTO permission (perm, directory_id, user_id) VALUES (?, ?, ?);",
+                              [(Permission.OWNER, directory[0], directory[4]) for directory in directories])
+        db.cursor.executemany("INSERT INTO file (id, title, extension, is_complete, directory_id, sequence_num) "
+                              "VALUES (?, ?, 'bin', 1, ?, ?);",
+                              [(file_id, f"file{file_id}", directories[file_id % len(directories)][0],
+                                CHUNKS_PER_FILE) for file_id in range(1, file_count + 1)])
+        db.cursor.executemany("INSERT INTO permission (perm, file_id, user_id) VALUES (?, ?, ?);",
+                              [(Permission.OWNER, file_id, directories[file_id % len(directories)][4])
+                               for file_id in range(1, file_count + 1)])
+        db.cursor.executemany("INSERT INTO chunk (sequence, local_path, chunk_size, data_node_id, file_id) "
+                              "VALUES (?, ?, 67108864, ?, ?);",
+                              [(sequence, f"/srv/dfs/{file_id}_{sequence}", (file_id + sequence) % DATA_NODES + 1,
+                                file_id) for file_id in range(1, file_count + 1)
+                               for sequence in range(1, CHUNKS_PER_FILE + 1)])
+    return directories
+
+
+def read_requests(directories, file_count, count):
+    generator = random.Random(7)
+    requests = []
+    for _ in range(count):
+        file_id = generator.randint(1, file_count)
+        directory = directories[file_id % len(directories)]
+        path_owner, path = directory[3].split("/", 1)
+        requests.append((f"user{directory[4]}", path_owner, path, f"file{file_id}"))
+    return requests
+
+
+def read_sqlite(db, requests):
+    for username, path_owner, path, title in requests:
+        directory = Directory.fetch_by_path(path_owner, path, db=db)
+        file = File.fetch_by_dir_title_extension(dir_id=directory.id, title=title, extension="bin", db=db)
+        file.get_user_permission(username)
+        file.chunk_locations
+
+
+def read_memory(engine, namespace, db, requests):
+    for username, path_owner, path, title in requests:
+        directory = namespace.fetch_directory(path_owner, path)
+        file = namespace.fetch_file(directory.id, title, "bin")
+        file.get_user_permission(username)
+        namespace.chunk_locations(file, db, engine.data_version())
+
+
+def create_files(db, engine, directory, count, prefix):
+    for index in range(count):
+        with db.transaction():
+            file = File(db=db, title=f"{prefix}{index}", extension="bin", directory_id=directory[0],
+                        sequence_num=1, is_complete=False)
+            file.save()
+            Permission(db=db, perm=Permission.OWNER, file_id=file.id, user_id=directory[4]).save()
+        if engine is not None:
+            engine.record(db, (Namespace.NEW_FILE, file.id, file.title, file.extension, file.directory_id,
+                               file.sequence_num),
+                          (Namespace.FILE_PERMISSION, file.id, directory[4], f"user{directory[4]}", Permission.OWNER))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Name node metadata operations per second: SQLite models versus "
+                                                 "the in-memory namespace engine")
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--writes", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        MetaDatabase.DATABASE_PATH = os.path.join(directory, "meta_data.db")
+        MetaDatabase.initialize_tables()
+        db = MetaDatabase()
+        directories = populate(db, args.files)
+        requests = read_requests(directories, args.files, args.reads)
+        results = {}
+
+        start = perf_counter()
+        read_sqlite(db, requests)
+        sqlite_read = args.reads / (perf_counter() - start)
+        start = perf_counter()
+        create_files(db, None, directories[0], args.writes, "durable")
+        results["create file"] = [args.writes / (perf_counter() - start)]
+        db.close()
+
+        engine = NamespaceEngine()
+        engine.open()
+        db = engine.connect()
+        start = perf_counter()
+        namespace = engine.image(db)
+        load_time = perf_counter() - start
+        read_memory(engine, namespace, db, requests)
+        start = perf_counter()
+        read_memory(engine, namespace, db, requests)
+        results["lookup+permission+chunk map"] = [sqlite_read, args.reads / (perf_counter() - start)]
+        start = perf_counter()
+        create_files(db, engine, directories[1], args.writes, "journaled")
+        results["create file"].append(args.writes / (perf_counter() - start))
+        start = perf_counter()
+        engine.checkpoint(db)
+        checkpoint_time = perf_counter() - start
+        db.close()
+
+    print(f"image load {load_time:.2f} s for {args.files} files, checkpoint {checkpoint_time * 1000:.1f} ms")
+    print(f"{'operation':28} {'sqlite':>12} {'memory':>12}   (operations per second)")
+    for name in ["lookup+permission+chunk map", "create file"]:
+        print(f"{name:28} {results[name][0]:12.0f} {results[name][1]:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
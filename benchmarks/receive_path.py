@@ -0,0 +1,91 @@
+import argparse
+import os
+import socket
+import tempfile
+import tracemalloc
+from threading import Thread
+from time import perf_counter
+
+from session.sessions import EncryptedSession, SimpleSession, FileSession
+
+
+class LegacyReceiver:
+    @staticmethod
+    def receive_data(session):
+        data_length = int.from_bytes(session.socket.recv(session.DATA_LENGTH_BYTE_NUMBER),
+                                     byteorder=session.DATA_LENGTH_BYTE_ORDER, signed=False)
+        bytes_read = 0
+        data = b''
+        while bytes_read < data_length:
+            temp_data = session.socket.recv(data_length - bytes_read)
+            data += temp_data
+            bytes_read += len(temp_data)
+        if isinstance(session, EncryptedSession):
+            return session.encryption_class.decrypt(data)
+        return data
+
+    @staticmethod
+    def receive_chunk(session):
+        chunk_size = int(LegacyReceiver.receive_data(session))
+        received = 0
+        result = b''
+        while received < chunk_size:
+            data = LegacyReceiver.receive_data(session)
+            result += data
+            received += len(data)
+        return result
+
+
+def create_sessions(kind):
+    server_socket, client_socket = socket.socketpair()
+    if kind == "simple":
+        return SimpleSession(input_socket=server_socket), SimpleSession(input_socket=client_socket)
+
+    result = {}
+    thread = Thread(target=lambda: result.setdefault("server", EncryptedSession(input_socket=server_socket,
+                                                                                is_server=True)))
+    thread.start()
+    client = EncryptedSession(input_socket=client_socket)
+    thread.join()
+    return result["server"], client
+
+
+def run(kind, receive_chunk, source_path, size):
+    receiver, sender = create_sessions(kind)
+    thread = Thread(target=FileSession().transfer_file, args=[source_path, sender])
+
+    tracemalloc.start()
+    start = perf_counter()
+    thread.start()
+    data = receive_chunk(receiver)
+    elapsed = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    thread.join()
+    assert len(data) == size
+    receiver.close()
+    sender.close()
+    return size / elapsed / 2 ** 20, peak / (size / 2 ** 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="receive_chunk throughput and allocations: bytes += vs recv_into")
+    parser.add_argument("--size-mb", type=int, default=16)
+    args = parser.parse_args()
+
+    size = args.size_mb * 2 ** 20
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "source")
+        with open(source_path, "wb") as file:
+            file.write(os.urandom(size))
+
+        for kind in ["simple", "aead"]:
+            for name, receive_chunk in [("before", LegacyReceiver.receive_chunk),
+                                        ("after", FileSession().receive_chunk)]:
+                throughput, allocated = run(kind, receive_chunk, source_path, size)
+                print(f"{kind:>7} {name:>7}: {throughput:10.1f} MB/s  peak allocated {allocated / 2 ** 20:6.2f} MB per MB")
+
+
+if __name__ == "__main__":
+    main()
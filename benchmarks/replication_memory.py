@@ -0,0 +1,97 @@
+import argparse
+import io
+import os
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from threading import Thread
+from time import perf_counter, sleep
+
+from session.sessions import FileSession
+from valid_messages import ACCEPT
+
+
+class ClientStream:
+    MDU = 64 * 1024
+
+    def __init__(self, size):
+        self.size = size
+        self.sent_size = False
+        self.remaining = size
+
+    def receive_data(self, decode=True):
+        if not self.sent_size:
+            self.sent_size = True
+            return str(self.size)
+        data = bytes(min(self.MDU, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+
+class SlowReplicaSession:
+    MDU = 64 * 1024
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+
+    def transfer_data(self, data, encode=True):
+        sleep(len(data) / self.bandwidth)
+
+    def receive_data(self, decode=True):
+        return ACCEPT
+
+    def close(self):
+        pass
+
+
+class SlowReplicaPool:
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+
+    def open_session(self, ip_address):
+        return SlowReplicaSession(self.bandwidth)
+
+
+def upload(directory, index, chunk_size, window_size, replicas, bandwidth):
+    file_session = FileSession(replication_pool=SlowReplicaPool(bandwidth), replication_window_size=window_size)
+    file_session.receive_file(os.path.join(directory, str(index)), session=ClientStream(chunk_size),
+                              replication_list=[f"replica-{i}" for i in range(replicas)],
+                              create_chunk_message="bench")
+
+
+def run(uploads, chunk_size, window_size, replicas, bandwidth):
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        start = perf_counter()
+        threads = [Thread(target=upload, args=[directory, i, chunk_size, window_size, replicas, bandwidth])
+                   for i in range(uploads)]
+        with redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak replication buffer memory for concurrent uploads")
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--chunk-size-mb", type=int, default=16)
+    parser.add_argument("--windows-mb", type=float, nargs="+", default=[1, 8])
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--replica-bandwidth-mb", type=float, default=32)
+    args = parser.parse_args()
+
+    chunk_size = args.chunk_size_mb * 2 ** 20
+    for window in [args.chunk_size_mb] + args.windows_mb:
+        peak, elapsed = run(args.uploads, chunk_size, int(window * 2 ** 20), args.replicas,
+                            args.replica_bandwidth_mb * 2 ** 20)
+        label = "whole chunk" if window == args.chunk_size_mb else f"{window:g} MB"
+        print(f"window {label:>12}: peak {peak / 2 ** 20:8.1f} MB for {args.uploads} uploads in {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import socket
+import tempfile
+from threading import Thread
+from time import perf_counter
+
+from encryption.encryptors import AEADEncryption
+from session.sessions import EncryptedSession, FileSession
+
+
+def run_transfer(source_path, destination_path, frame_size):
+    server_socket, client_socket = socket.socketpair()
+    receiver = {}
+
+    def receive():
+        session = EncryptedSession(input_socket=server_socket, is_server=True)
+        receiver["mdu"] = session.MDU
+        FileSession().receive_file(destination_path, session=session)
+        session.close()
+
+    thread = Thread(target=receive)
+    thread.start()
+    session = EncryptedSession(input_socket=client_socket, frame_size=frame_size)
+
+    start = perf_counter()
+    FileSession().transfer_file(source_path, session=session)
+    thread.join()
+    elapsed = perf_counter() - start
+
+    session.close()
+    return elapsed, receiver["mdu"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FileSession throughput: Fernet frames vs AEAD frames")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--frame-size", type=int, default=AEADEncryption.DEFAULT_FRAME_SIZE)
+    args = parser.parse_args()
+
+    size = args.size_mb * 2 ** 20
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "source")
+        destination_path = os.path.join(directory, "destination")
+        with open(source_path, "wb") as file:
+            file.write(os.urandom(size))
+
+        for name, frame_size in [("fernet", None), ("aead", args.frame_size)]:
+            elapsed, mdu = run_transfer(source_path, destination_path, frame_size)
+            print(f"{name:>8}: frame={mdu:>8} bytes  {size / elapsed / 2 ** 20:10.1f} MB/s  ({elapsed:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
 import ntpath
 import pickle
 import socket
-from threading import Thread, Condition
+import uuid
+from queue import Queue, Empty
+from threading import Thread
 
 from broadcast.transmitters import SimpleTransmitter
-from client.exceptions import InvalidClientActionConfigFile, FileSystemDown
+from client.cache import ChunkCache
+from client.exceptions import (InvalidClientActionConfigFile, FileSystemDown, ChunkFetchFailed, ChunkUnavailable,
+                               ChunkUploadFailed)
+from client.hedging import HedgedFetcher, LatencyTracker
+from client.scheduling import ReplicaScheduler
+from client.transfers import ByteBudget, UploadPool, UploadTask
+from encryption.encryptors import RSAEncryption
 import ipaddress
 import os
 
@@ -13,25 +21,57 @@ from servers.data_node_server import DataNodeServer
 from valid_messages import (CREATE_FILE, CREATE_CHUNK, ACCEPT, OUT_OF_SPACE, LOGIN, CREDENTIALS, CREATE_ACCOUNT,
                             GET_FILE, INVALID_PATH, FILE_DOES_NOT_EXIST, NO_PERMISSION, CORRUPTED_FILE, GET_CHUNK,
                             CREATE_DIR, DUPLICATE_DIR_NAME, DELETE_FILE, ADD_DIR_PERM, INVALID_USERNAME,
-                            INVALID_PERMISSION_VALUE, ADD_FILE_PERM)
+                            INVALID_PERMISSION_VALUE, ADD_FILE_PERM, GET_CHUNK_PLAIN, ACCEPT_PLAIN, GET_FILE_RANGE,
+                            GET_CHUNK_RANGE, INVALID_METADATA)
+from session.channels import ChannelPool
+from session.policies import PlainTransferPolicy
 from session.sessions import EncryptedSession, FileSession
 
 
 class ClientActions:
     CONFIG_FILE_PATH = "/Users/sepehrjavid/Desktop/distributed_storage/client/dfs.conf"
+    IDENTITY_KEY_PATH = os.path.join(os.path.dirname(CONFIG_FILE_PATH), "client_key.pem")
     DATA_NODE_NETWORK_ADDRESS = "data_node_network"
     CLIENT_ADDRESS = "ip_address"
+    RACK_NUMBER = "rack_number"
+    DOWNLOAD_WORKERS = "download_workers"
+    DOWNLOAD_WINDOW = "download_window"
+    DEFAULT_DOWNLOAD_WORKERS = 8
+    DEFAULT_DOWNLOAD_WINDOW = 64 * 2 ** 20
+    UPLOAD_WORKERS = "upload_workers"
+    UPLOAD_NODE_WORKERS = "upload_node_workers"
+    DEFAULT_UPLOAD_WORKERS = 16
+    DEFAULT_UPLOAD_NODE_WORKERS = 4
+    CHUNK_CACHE_PATH = "chunk_cache_path"
+    CHUNK_CACHE_SIZE = "chunk_cache_size"
+    DEFAULT_CHUNK_CACHE_PATH = os.path.join(os.path.dirname(CONFIG_FILE_PATH), "chunk_cache")
+    DEFAULT_CHUNK_CACHE_SIZE = 2 ** 30
     MANDATORY_FIELDS = [DATA_NODE_NETWORK_ADDRESS, CLIENT_ADDRESS]
     SOCKET_ACCEPT_TIMEOUT = 3
     TRY_SERVICE_LIMIT = 3
+    PARTIAL_CHUNK_SUFFIX = ".partial"
 
     def __init__(self):
         self.username = None
         self.configuration = None
         self.update_config_file()
+        RSAEncryption.load_identity_key(self.IDENTITY_KEY_PATH)
         self.ip_address = self.configuration.get(self.CLIENT_ADDRESS)
-        self.received_seq = 0
-        self.write_chunk_condition = Condition()
+        self.rack_number = self.configuration.get(self.RACK_NUMBER)
+        self.plain_transfer_policy = PlainTransferPolicy.from_config(self.configuration)
+        self.data_node_pool = ChannelPool(DataNodeServer.DATA_NODE_PORT_NUMBER)
+        self.download_workers = int(self.configuration.get(self.DOWNLOAD_WORKERS, self.DEFAULT_DOWNLOAD_WORKERS))
+        self.download_window = int(self.configuration.get(self.DOWNLOAD_WINDOW, self.DEFAULT_DOWNLOAD_WINDOW))
+        self.upload_workers = int(self.configuration.get(self.UPLOAD_WORKERS, self.DEFAULT_UPLOAD_WORKERS))
+        self.upload_node_workers = int(self.configuration.get(self.UPLOAD_NODE_WORKERS,
+                                                              self.DEFAULT_UPLOAD_NODE_WORKERS))
+        self.download_failed = False
+        self.hedged_fetcher = HedgedFetcher(LatencyTracker())
+        self.chunk_cache = None
+        chunk_cache_size = int(self.configuration.get(self.CHUNK_CACHE_SIZE, self.DEFAULT_CHUNK_CACHE_SIZE))
+        if chunk_cache_size > 0:
+            self.chunk_cache = ChunkCache(self.configuration.get(self.CHUNK_CACHE_PATH, self.DEFAULT_CHUNK_CACHE_PATH),
+                                          chunk_cache_size)
 
     def update_config_file(self):
         with open(self.CONFIG_FILE_PATH, "r") as config_file:
@@ -61,16 +101,17 @@ class ClientActions:
             if field not in keys:
                 raise InvalidClientActionConfigFile(field)
 
-    def __send_chunk(self, ip_address, file_path, sequence, chunk_size, logical_path, filename, extension, offset):
-        session = EncryptedSession(ip_address=ip_address, port_number=DataNodeServer.DATA_NODE_PORT_NUMBER)
-        session.transfer_data(CREATE_CHUNK.format(path=logical_path, title=filename, sequence=sequence,
-                                                  chunk_size=chunk_size, username=self.username, extension=extension))
-        response = session.receive_data()
-        if response == ACCEPT:
-            file_session = FileSession()
-            file_session.transfer_file(file_path, session=session, offset=offset, size=chunk_size)
-        else:
-            print(response)
+    def __send_chunk(self, ip_address, task: UploadTask, file_path, logical_path, filename, extension):
+        session = self.data_node_pool.open_session(ip_address)
+        try:
+            session.transfer_data(CREATE_CHUNK.format(path=logical_path, title=filename, sequence=task.sequence,
+                                                      chunk_size=task.chunk_size, username=self.username,
+                                                      extension=extension))
+            response = session.receive_data()
+            if response != ACCEPT:
+                raise ChunkUploadFailed(response)
+            FileSession().transfer_file(file_path, session=session, offset=task.offset, size=task.chunk_size)
+        finally:
             session.close()
 
     def ask_for_service(self, message) -> EncryptedSession:
@@ -157,42 +198,144 @@ class ClientActions:
 
         """
         chunk instructions' structure is as followed:
-        chunk_instructions = [(size, ip_address), (size, ip_address)]
+        chunk_instructions = [(size, ip_address, [fallback_ip_address, ...]), ...]
         """
 
-        chunk_threads = []
+        upload_pool = UploadPool(lambda ip_address, task: self.__send_chunk(ip_address, task, file_path, logical_path,
+                                                                            filename, extension),
+                                 maximum_concurrency=self.upload_workers,
+                                 maximum_node_concurrency=self.upload_node_workers)
+        offset = 0
+        for sequence, (chunk_size, ip_address, fallback_addresses) in enumerate(chunk_instructions, start=1):
+            upload_pool.add(UploadTask(sequence, chunk_size, offset, [ip_address] + fallback_addresses))
+            offset += chunk_size
+
         print("Sending file...")
+        if upload_pool.run():
+            print("File sent at {:.1f} MB/s".format(upload_pool.throughput() / 10 ** 6))
+        else:
+            print("Failed to send the file")
 
-        offset = 0
-        for i in range(len(chunk_instructions)):
-            chunk_threads.append(Thread(target=self.__send_chunk,
-                                        args=[chunk_instructions[i][1], file_path, i + 1, chunk_instructions[i][0],
-                                              logical_path, filename, extension, offset]))
-            offset += chunk_instructions[i][0]
-            chunk_threads[-1].start()
-
-        for thread in chunk_threads:
-            thread.join()
+    def __open_chunk_session(self, attempt, sequence, logical_path, offset=None, length=None):
+        if offset is None and self.plain_transfer_policy.is_trusted(self.ip_address, attempt.ip_address):
+            attempt.session = EncryptedSession(ip_address=attempt.ip_address,
+                                               port_number=DataNodeServer.DATA_NODE_PORT_NUMBER)
+            return GET_CHUNK_PLAIN.format(username=self.username, sequence=sequence, path=logical_path)
 
-    def __receive_chunk(self, ip_address, sequence, file, logical_path):
-        session = EncryptedSession(ip_address=ip_address, port_number=DataNodeServer.DATA_NODE_PORT_NUMBER)
-        session.transfer_data(GET_CHUNK.format(username=self.username, sequence=sequence, path=logical_path))
-        response = session.receive_data()
+        attempt.session = self.data_node_pool.open_session(attempt.ip_address)
+        if offset is None:
+            return GET_CHUNK.format(username=self.username, sequence=sequence, path=logical_path)
+        return GET_CHUNK_RANGE.format(sequence=sequence, offset=offset, length=length, username=self.username,
+                                      path=logical_path)
+
+    @staticmethod
+    def __request_chunk(attempt, message):
+        if attempt.cancelled:
+            raise ConnectionResetError
+        attempt.session.transfer_data(message)
+        return attempt.session.receive_data()
+
+    def __fetch_chunk_range(self, attempt, sequence, logical_path, offset, length):
+        message = self.__open_chunk_session(attempt, sequence, logical_path, offset=offset, length=length)
+        try:
+            response = self.__request_chunk(attempt, message)
+            if response == ACCEPT:
+                return FileSession().receive_chunk(attempt.session)
+            raise ChunkFetchFailed(response)
+        finally:
+            attempt.session.close()
+
+    def __download_chunk(self, attempt, sequence, logical_path, dest_path, chunk_size):
+        attempt_path = f"{dest_path}.{sequence}.{uuid.uuid4().hex}{self.PARTIAL_CHUNK_SUFFIX}"
+        os.close(os.open(attempt_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        try:
+            message = self.__open_chunk_session(attempt, sequence, logical_path)
+            try:
+                response = self.__request_chunk(attempt, message)
+                file_session = FileSession()
+                if response == ACCEPT_PLAIN:
+                    attempt.session = attempt.session.convert_to_simple_session()
+                    file_session.receive_chunk_plain_to_file(attempt.session, attempt_path, 0, chunk_size)
+                elif response == ACCEPT:
+                    file_session.receive_chunk_to_file(attempt.session, attempt_path, 0, chunk_size)
+                else:
+                    raise ChunkFetchFailed(response)
+            finally:
+                attempt.session.close()
+        except BaseException:
+            self.__remove_partial_chunk(attempt_path)
+            raise
+        return attempt_path
 
-        if response != ACCEPT:
-            print(f"{response} occurred when retrieving from {ip_address}")
+    @staticmethod
+    def __remove_partial_chunk(attempt_path):
+        try:
+            os.remove(attempt_path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def __commit_chunk(attempt_path, dest_path, file_offset, chunk_size):
+        source = os.open(attempt_path, os.O_RDONLY)
+        try:
+            destination = os.open(dest_path, os.O_WRONLY)
+            try:
+                ChunkCache.copy_range(source, 0, destination, file_offset, chunk_size)
+            finally:
+                os.close(destination)
+        finally:
+            os.close(source)
+
+    def __read_cached_chunk(self, file_id, sequence, version, chunk_size, dest_path, file_offset):
+        if self.chunk_cache is None or version is None:
+            return False
+
+        file_descriptor = os.open(dest_path, os.O_WRONLY)
+        try:
+            return self.chunk_cache.read_into(file_id, sequence, version, chunk_size, file_descriptor, file_offset)
+        except (OSError, EOFError):
+            return False
+        finally:
+            os.close(file_descriptor)
+
+    def __cache_chunk(self, file_id, sequence, version, chunk_size, dest_path, file_offset):
+        if self.chunk_cache is None or version is None:
             return
 
-        file_session = FileSession()
-        data = file_session.receive_chunk(session)
-        session.close()
+        file_descriptor = os.open(dest_path, os.O_RDONLY)
+        try:
+            self.chunk_cache.store_from(file_id, sequence, version, chunk_size, file_descriptor, file_offset)
+        except (OSError, EOFError) as error:
+            print(f"Could not cache chunk {sequence}: {error}")
+        finally:
+            os.close(file_descriptor)
+
+    def __download_chunks(self, pending_chunks, budget, scheduler, dest_path, logical_path):
+        while not self.download_failed:
+            try:
+                sequence, chunk_size, replicas, file_id, version, file_offset = pending_chunks.get_nowait()
+            except Empty:
+                return
 
-        with self.write_chunk_condition:
-            while self.received_seq != sequence:
-                self.write_chunk_condition.wait()
-            file.write(data)
-            self.received_seq += 1
-            self.write_chunk_condition.notifyAll()
+            if self.__read_cached_chunk(file_id, sequence, version, chunk_size, dest_path, file_offset):
+                continue
+
+            reserved = budget.acquire(chunk_size)
+            try:
+                attempt_path = self.hedged_fetcher.fetch(
+                    sequence, replicas, chunk_size, scheduler,
+                    lambda attempt: self.__download_chunk(attempt, sequence, logical_path, dest_path, chunk_size),
+                    discard=self.__remove_partial_chunk)
+                try:
+                    self.__commit_chunk(attempt_path, dest_path, file_offset, chunk_size)
+                finally:
+                    self.__remove_partial_chunk(attempt_path)
+                self.__cache_chunk(file_id, sequence, version, chunk_size, dest_path, file_offset)
+            except (ChunkUnavailable, ChunkFetchFailed, OSError, EOFError) as error:
+                print(error)
+                self.download_failed = True
+            finally:
+                budget.release(reserved)
 
     def retrieve_file(self):
         logical_file_path = input("File path: ")
@@ -204,14 +347,7 @@ class ClientActions:
         response = session.receive_data(decode=False)
         session.close()
 
-        if response == INVALID_PATH.encode() or response == FILE_DOES_NOT_EXIST.encode():
-            print("Invalid File Path")
-            return
-        elif response == NO_PERMISSION.encode():
-            print("Permission Denied")
-            return
-        elif response == CORRUPTED_FILE.encode():
-            print("The Requested File is Corrupted")
+        if not self.__is_file_response_valid(response):
             return
 
         chunk_list = pickle.loads(response)
@@ -221,20 +357,120 @@ class ClientActions:
 
         """
                 chunk list's structure is as followed:
-                chunk_list = [(sequence, ip_address), (sequence, ip_address)]
+                chunk_list = [(sequence, chunk_size, [(ip_address, rack_number, load), ...], file_id, version), ...]
         """
 
-        self.received_seq = 1
+        dest_path = save_to_path + filename
+        pending_chunks = Queue()
+        file_offset = 0
+        for sequence, chunk_size, replicas, file_id, version in chunk_list:
+            pending_chunks.put((sequence, chunk_size, replicas, file_id, version, file_offset))
+            file_offset += chunk_size
+
+        with open(dest_path, "wb") as file:
+            file.truncate(file_offset)
+
+        self.download_failed = False
+        budget = ByteBudget(self.download_window)
+        scheduler = ReplicaScheduler(rack_number=self.rack_number)
         threads = []
-        file = open(save_to_path + filename, "wb")
-        for chunk in chunk_list:
-            threads.append(Thread(target=self.__receive_chunk, args=[chunk[1], chunk[0], file, logical_file_path]))
+        for _ in range(min(self.download_workers, len(chunk_list))):
+            threads.append(Thread(target=self.__download_chunks,
+                                  args=[pending_chunks, budget, scheduler, dest_path, logical_file_path]))
             threads[-1].start()
 
         for thread in threads:
             thread.join()
 
-        file.close()
+        if self.download_failed:
+            os.remove(dest_path)
+            print("Failed to retrieve the file")
+
+    @staticmethod
+    def __is_file_response_valid(response):
+        if response == INVALID_PATH.encode() or response == FILE_DOES_NOT_EXIST.encode():
+            print("Invalid File Path")
+            return False
+        elif response == NO_PERMISSION.encode():
+            print("Permission Denied")
+            return False
+        elif response == CORRUPTED_FILE.encode():
+            print("The Requested File is Corrupted")
+            return False
+        elif response == INVALID_METADATA.encode():
+            print("Invalid Range")
+            return False
+        return True
+
+    def __receive_chunk_ranges(self, pending_ranges, budget, scheduler, file_descriptor, logical_path):
+        while not self.download_failed:
+            try:
+                sequence, replicas, offset, length, position = pending_ranges.get_nowait()
+            except Empty:
+                return
+
+            reserved = budget.acquire(length)
+            try:
+                data = self.hedged_fetcher.fetch(
+                    sequence, replicas, length, scheduler,
+                    lambda attempt: self.__fetch_chunk_range(attempt, sequence, logical_path, offset, length))
+                os.pwrite(file_descriptor, data, position)
+            except (ChunkUnavailable, ChunkFetchFailed) as error:
+                print(error)
+                self.download_failed = True
+            finally:
+                budget.release(reserved)
+
+    def read_file_range(self, logical_path, offset, length, dest_path):
+        session = self.ask_for_service(GET_FILE_RANGE.format(offset=offset, length=length, username=self.username,
+                                                             path=logical_path))
+        response = session.receive_data(decode=False)
+        session.close()
+
+        if not self.__is_file_response_valid(response):
+            return False
+
+        """
+        range list's structure is as followed:
+        range_list = [(sequence, [(ip_address, rack_number, load), ...], offset_in_chunk, length), ...]
+        """
+        range_list = pickle.loads(response)
+        pending_ranges = Queue()
+        position = 0
+        for sequence, replicas, chunk_offset, chunk_length in range_list:
+            pending_ranges.put((sequence, replicas, chunk_offset, chunk_length, position))
+            position += chunk_length
+
+        self.download_failed = False
+        budget = ByteBudget(self.download_window)
+        scheduler = ReplicaScheduler(rack_number=self.rack_number)
+        file_descriptor = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(file_descriptor, position)
+            threads = []
+            for _ in range(min(self.download_workers, len(range_list))):
+                threads.append(Thread(target=self.__receive_chunk_ranges,
+                                      args=[pending_ranges, budget, scheduler, file_descriptor, logical_path]))
+                threads[-1].start()
+
+            for thread in threads:
+                thread.join()
+        finally:
+            os.close(file_descriptor)
+
+        if self.download_failed:
+            os.remove(dest_path)
+            return False
+        return True
+
+    def retrieve_file_range(self):
+        logical_file_path = input("File path: ")
+        offset = int(input("Offset: "))
+        length = int(input("Length: "))
+        save_to_path = input("Save to path: ")
+
+        if not self.read_file_range(logical_file_path, offset, length, save_to_path + logical_file_path.split("/")[-1]):
+            print("Failed to retrieve the file range")
 
     def create_new_dir(self):
         path = input("Enter path: ")
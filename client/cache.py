@@ -0,0 +1,136 @@
+import os
+import uuid
+from collections import OrderedDict
+from threading import Lock
+
+
+class ChunkCache:
+    ENTRY_SUFFIX = ".chunk"
+    TEMPORARY_SUFFIX = ".partial"
+    KEY_SEPARATOR = "_"
+    COPY_SLICE_SIZE = 2 ** 20
+
+    def __init__(self, directory, capacity):
+        self.directory = directory
+        self.capacity = capacity
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.cached_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.__load()
+
+    def __load(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.TEMPORARY_SUFFIX):
+                self.__remove(entry.path)
+            elif entry.name.endswith(self.ENTRY_SUFFIX):
+                status = entry.stat()
+                entries.append((status.st_mtime, status.st_size, entry.name, entry.path))
+
+        for modification_time, size, name, path in sorted(entries):
+            self.entries[path] = size
+            self.versions[name[:-len(self.ENTRY_SUFFIX)].rsplit(self.KEY_SEPARATOR, 1)[0]] = path
+            self.cached_bytes += size
+        self.evict()
+
+    def __entry_key(self, file_id, sequence):
+        return f"{file_id}{self.KEY_SEPARATOR}{sequence}"
+
+    def __entry_path(self, file_id, sequence, version):
+        return os.path.join(self.directory, self.__entry_key(file_id, sequence) + self.KEY_SEPARATOR + version +
+                            self.ENTRY_SUFFIX)
+
+    def __count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def read_into(self, file_id, sequence, version, chunk_size, file_descriptor, offset):
+        path = self.__entry_path(file_id, sequence, version)
+        try:
+            source = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            self.__count(hit=False)
+            return False
+
+        try:
+            if os.fstat(source).st_size != chunk_size:
+                self.__count(hit=False)
+                return False
+            self.copy_range(source, 0, file_descriptor, offset, chunk_size)
+        finally:
+            os.close(source)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            if path in self.entries:
+                self.entries.move_to_end(path)
+            self.hits += 1
+        return True
+
+    def store_from(self, file_id, sequence, version, chunk_size, file_descriptor, offset):
+        if chunk_size > self.capacity:
+            return
+
+        temporary_path = os.path.join(self.directory, uuid.uuid4().hex + self.TEMPORARY_SUFFIX)
+        destination = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            self.copy_range(file_descriptor, offset, destination, 0, chunk_size)
+        except (OSError, EOFError):
+            os.close(destination)
+            os.remove(temporary_path)
+            raise
+        os.close(destination)
+
+        key = self.__entry_key(file_id, sequence)
+        path = self.__entry_path(file_id, sequence, version)
+        with self.lock:
+            previous_path = self.versions.get(key)
+            if previous_path is not None and previous_path != path:
+                self.__forget(previous_path)
+                self.__remove(previous_path)
+            os.replace(temporary_path, path)
+            self.__forget(path)
+            self.entries[path] = chunk_size
+            self.versions[key] = path
+            self.cached_bytes += chunk_size
+        self.evict()
+
+    def __forget(self, path):
+        self.cached_bytes -= self.entries.pop(path, 0)
+
+    def evict(self):
+        with self.lock:
+            while self.cached_bytes > self.capacity and len(self.entries) != 0:
+                path, size = self.entries.popitem(last=False)
+                self.cached_bytes -= size
+                key = os.path.basename(path)[:-len(self.ENTRY_SUFFIX)].rsplit(self.KEY_SEPARATOR, 1)[0]
+                if self.versions.get(key) == path:
+                    del self.versions[key]
+                self.__remove(path)
+
+    @staticmethod
+    def __remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def copy_range(source, source_offset, destination, destination_offset, size):
+        copied = 0
+        while copied < size:
+            data = os.pread(source, min(ChunkCache.COPY_SLICE_SIZE, size - copied), source_offset + copied)
+            if len(data) == 0:
+                raise EOFError
+            os.pwrite(destination, data, destination_offset + copied)
+            copied += len(data)
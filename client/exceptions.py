@@ -7,3 +7,18 @@ class InvalidClientActionConfigFile(Exception):
 class FileSystemDown(Exception):
     def __init__(self):
         super().__init__("File system appears to be down")
+
+
+class ChunkFetchFailed(Exception):
+    def __init__(self, response):
+        super().__init__(f"Data node responded with {response}")
+
+
+class ChunkUnavailable(Exception):
+    def __init__(self, sequence):
+        super().__init__(f"No replica could serve chunk {sequence}")
+
+
+class ChunkUploadFailed(Exception):
+    def __init__(self, response):
+        super().__init__(f"Data node rejected the chunk with {response}")
@@ -0,0 +1,133 @@
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import monotonic
+
+from client.exceptions import ChunkFetchFailed, ChunkUnavailable
+from session.exceptions import PeerTimeOutException
+
+
+class LatencyTracker:
+    WINDOW = 64
+    MINIMUM_SAMPLES = 4
+
+    def __init__(self):
+        self.samples = []
+        self.lock = Lock()
+
+    def record(self, seconds_per_byte):
+        with self.lock:
+            self.samples.append(seconds_per_byte)
+            if len(self.samples) > self.WINDOW:
+                self.samples.pop(0)
+
+    def percentile(self, fraction):
+        with self.lock:
+            if len(self.samples) < self.MINIMUM_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FetchAttempt:
+    def __init__(self, ip_address):
+        self.ip_address = ip_address
+        self.session = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.session is not None:
+            try:
+                self.session.close()
+            except OSError:
+                pass
+
+
+class HedgedFetcher:
+    HEDGE_PERCENTILE = 0.95
+    DEFAULT_HEDGE_DELAY = 2
+    MINIMUM_HEDGE_DELAY = 0.05
+    DEFAULT_FETCH_DEADLINE = 5 * 60
+    FETCH_ERRORS = (ChunkFetchFailed, PeerTimeOutException, OSError, ValueError)
+
+    def __init__(self, latency_tracker: LatencyTracker, fetch_deadline=DEFAULT_FETCH_DEADLINE):
+        self.latency_tracker = latency_tracker
+        self.fetch_deadline = fetch_deadline
+
+    def hedge_delay(self, byte_size):
+        seconds_per_byte = self.latency_tracker.percentile(self.HEDGE_PERCENTILE)
+        if seconds_per_byte is None:
+            return self.DEFAULT_HEDGE_DELAY
+        return max(self.MINIMUM_HEDGE_DELAY, seconds_per_byte * byte_size)
+
+    def fetch(self, sequence, replicas, byte_size, scheduler, fetch_function, discard=None):
+        candidates = list(replicas)
+        results = Queue()
+        attempts = []
+        lock = Lock()
+        finished = []
+
+        def run_attempt(attempt):
+            start = monotonic()
+            data = None
+            try:
+                data = fetch_function(attempt)
+            except self.FETCH_ERRORS as error:
+                if not attempt.cancelled:
+                    print(f"Retrieving chunk {sequence} from {attempt.ip_address} failed: {error}")
+            finally:
+                scheduler.release(attempt.ip_address)
+                with lock:
+                    accepted = len(finished) == 0
+                    if accepted:
+                        results.put((attempt, data, monotonic() - start))
+                if not accepted and data is not None and discard is not None:
+                    discard(data)
+
+        def launch_attempt():
+            ip_address = scheduler.choose(candidates)
+            candidates[:] = [x for x in candidates if x[0] != ip_address]
+            attempts.append(FetchAttempt(ip_address))
+            thread = Thread(target=run_attempt, args=[attempts[-1]])
+            thread.daemon = True
+            thread.start()
+
+        deadline = monotonic() + self.fetch_deadline
+        launch_attempt()
+        outstanding = 1
+        try:
+            while outstanding != 0:
+                remaining = deadline - monotonic()
+                try:
+                    attempt, data, elapsed = results.get(
+                        timeout=max(0, min(self.hedge_delay(byte_size), remaining) if candidates else remaining))
+                except Empty:
+                    if monotonic() >= deadline:
+                        for other_attempt in attempts:
+                            other_attempt.cancel()
+                        raise ChunkFetchFailed(f"no data for chunk {sequence} within {self.fetch_deadline} s")
+                    print(f"Hedging chunk {sequence} after {attempts[-1].ip_address} exceeded the latency threshold")
+                    launch_attempt()
+                    outstanding += 1
+                    continue
+
+                outstanding -= 1
+                if data is not None:
+                    self.latency_tracker.record(elapsed / max(1, byte_size))
+                    for other_attempt in attempts:
+                        if other_attempt is not attempt:
+                            other_attempt.cancel()
+                    return data
+
+                if candidates:
+                    launch_attempt()
+                    outstanding += 1
+
+            raise ChunkUnavailable(sequence)
+        finally:
+            with lock:
+                finished.append(True)
+            while not results.empty():
+                attempt, data, elapsed = results.get_nowait()
+                if data is not None and discard is not None:
+                    discard(data)
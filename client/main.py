@@ -12,7 +12,8 @@ class Main:
     NEW_DIR = "4"
     GRANT_DIR_PERM = "5"
     GRANT_FILE_PERM = "6"
-    EXIT_COMMAND = "7"
+    RETRIEVE_FILE_RANGE = "7"
+    EXIT_COMMAND = "8"
 
     def __init__(self):
         self.client_actions = ClientActions()
@@ -40,7 +41,8 @@ class Main:
             4.New directory
             5.Grant directory permission
             6.Grant file permission
-            7.Exit\n""")
+            7.Retrieve file range
+            8.Exit\n""")
 
             if command == self.SEND_FILE:
                 self.client_actions.send_file()
@@ -54,6 +56,8 @@ class Main:
                 self.client_actions.grant_directory_permission()
             elif command == self.GRANT_FILE_PERM:
                 self.client_actions.grant_file_permission()
+            elif command == self.RETRIEVE_FILE_RANGE:
+                self.client_actions.retrieve_file_range()
             elif command == self.EXIT_COMMAND:
                 break
 
@@ -0,0 +1,30 @@
+from threading import Lock
+
+
+class ReplicaScheduler:
+    OFF_RACK_PENALTY = 2
+
+    def __init__(self, rack_number=None):
+        self.rack_number = None if rack_number is None else str(rack_number)
+        self.assigned = {}
+        self.lock = Lock()
+
+    def cost(self, replica):
+        ip_address, rack_number, load = replica
+        penalty = 0 if self.rack_number is None or str(rack_number) == self.rack_number else self.OFF_RACK_PENALTY
+        return load + self.assigned.get(ip_address, 0) + penalty
+
+    def choose(self, replicas, weight=1.0):
+        with self.lock:
+            ip_address = min(replicas, key=self.cost)[0]
+            self.assigned[ip_address] = self.assigned.get(ip_address, 0) + weight
+            return ip_address
+
+    def release(self, ip_address, weight=1.0):
+        with self.lock:
+            assigned = self.assigned.get(ip_address, 0) - weight
+            if assigned > 0:
+                self.assigned[ip_address] = assigned
+            else:
+                self.assigned.pop(ip_address, None)
+
@@ -0,0 +1,204 @@
+from threading import Condition, Thread
+from time import monotonic
+
+from client.exceptions import ChunkUploadFailed
+from session.exceptions import PeerTimeOutException
+
+
+class ByteBudget:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.available = capacity
+        self.condition = Condition()
+
+    def acquire(self, byte_size):
+        byte_size = min(byte_size, self.capacity)
+        with self.condition:
+            while self.available < byte_size:
+                self.condition.wait()
+            self.available -= byte_size
+        return byte_size
+
+    def release(self, byte_size):
+        with self.condition:
+            self.available += byte_size
+            self.condition.notify_all()
+
+
+class AIMDLimit:
+    ADDITIVE_INCREASE = 1
+    DECREASE_FACTOR = 0.5
+    SLOWDOWN_TOLERANCE = 0.8
+
+    def __init__(self, initial, maximum):
+        self.limit = float(min(initial, maximum))
+        self.maximum = maximum
+        self.active = 0
+        self.throughput = None
+        self.window_start = None
+        self.window_bytes = 0
+        self.window_completions = 0
+
+    def has_capacity(self):
+        return self.active < int(self.limit)
+
+    def start(self, now):
+        if self.window_start is None:
+            self.window_start = now
+        self.active += 1
+
+    def on_success(self, byte_size, now):
+        self.active -= 1
+        self.window_bytes += byte_size
+        self.window_completions += 1
+        if self.window_completions < int(self.limit):
+            return
+
+        throughput = self.window_bytes / max(now - self.window_start, 1e-6)
+        if self.throughput is not None and throughput < self.throughput * self.SLOWDOWN_TOLERANCE:
+            self.limit = max(1.0, self.limit * self.DECREASE_FACTOR)
+        else:
+            self.limit = min(float(self.maximum), self.limit + self.ADDITIVE_INCREASE)
+        self.throughput = throughput
+        self.__reset_window(now)
+
+    def on_abort(self):
+        self.active -= 1
+
+    def on_failure(self, now):
+        self.active -= 1
+        self.limit = max(1.0, self.limit * self.DECREASE_FACTOR)
+        self.__reset_window(now)
+
+    def __reset_window(self, now):
+        self.window_start = now
+        self.window_bytes = 0
+        self.window_completions = 0
+
+
+class UploadTask:
+    def __init__(self, sequence, chunk_size, offset, data_nodes):
+        self.sequence = sequence
+        self.chunk_size = chunk_size
+        self.offset = offset
+        self.data_nodes = data_nodes
+        self.attempts = 0
+
+    @property
+    def ip_address(self):
+        return self.data_nodes[self.attempts % len(self.data_nodes)]
+
+
+class UploadPool:
+    INITIAL_CONCURRENCY = 4
+    INITIAL_NODE_CONCURRENCY = 2
+    MAXIMUM_ATTEMPTS = 3
+    UPLOAD_ERRORS = (ChunkUploadFailed, PeerTimeOutException, OSError, ValueError)
+
+    def __init__(self, upload_function, maximum_concurrency, maximum_node_concurrency):
+        self.upload_function = upload_function
+        self.maximum_node_concurrency = maximum_node_concurrency
+        self.global_limit = AIMDLimit(self.INITIAL_CONCURRENCY, maximum_concurrency)
+        self.node_limits = {}
+        self.pending = []
+        self.in_flight = 0
+        self.failed_tasks = []
+        self.total_bytes = 0
+        self.uploaded_bytes = 0
+        self.start_time = None
+        self.condition = Condition()
+
+    def add(self, task: UploadTask):
+        self.pending.append(task)
+        self.total_bytes += task.chunk_size
+
+    def run(self):
+        self.start_time = monotonic()
+        workers = []
+        for _ in range(min(self.global_limit.maximum, len(self.pending))):
+            workers.append(Thread(target=self.__work))
+            workers[-1].start()
+
+        for worker in workers:
+            worker.join()
+
+        return len(self.failed_tasks) == 0
+
+    def throughput(self):
+        return self.uploaded_bytes / max(monotonic() - self.start_time, 1e-6)
+
+    def __node_limit(self, ip_address):
+        if ip_address not in self.node_limits:
+            self.node_limits[ip_address] = AIMDLimit(self.INITIAL_NODE_CONCURRENCY, self.maximum_node_concurrency)
+        return self.node_limits[ip_address]
+
+    def __next_task(self):
+        if not self.global_limit.has_capacity():
+            return None
+        for task in self.pending:
+            if self.__node_limit(task.ip_address).has_capacity():
+                return task
+        return None
+
+    def __work(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.failed_tasks or (len(self.pending) == 0 and self.in_flight == 0):
+                        self.condition.notify_all()
+                        return
+                    task = self.__next_task()
+                    if task is not None:
+                        break
+                    self.condition.wait()
+
+                self.pending.remove(task)
+                self.in_flight += 1
+                ip_address = task.ip_address
+                now = monotonic()
+                self.global_limit.start(now)
+                self.__node_limit(ip_address).start(now)
+
+            uploaded = False
+            error = None
+            try:
+                self.upload_function(ip_address, task)
+                uploaded = True
+            except self.UPLOAD_ERRORS as upload_error:
+                error = upload_error
+            finally:
+                with self.condition:
+                    self.in_flight -= 1
+                    now = monotonic()
+                    if uploaded:
+                        self.global_limit.on_success(task.chunk_size, now)
+                        self.__node_limit(ip_address).on_success(task.chunk_size, now)
+                        self.uploaded_bytes += task.chunk_size
+                        self.__report_progress()
+                    else:
+                        self.global_limit.on_abort()
+                        self.__node_limit(ip_address).on_failure(now)
+                        if error is not None:
+                            self.__retry(task, ip_address, error)
+                        else:
+                            print(f"Sending chunk {task.sequence} to {ip_address} failed unexpectedly")
+                            self.failed_tasks.append(task)
+                    self.condition.notify_all()
+
+    def __retry(self, task, ip_address, error):
+        task.attempts += 1
+        if task.attempts >= max(self.MAXIMUM_ATTEMPTS, len(task.data_nodes)):
+            print(f"Sending chunk {task.sequence} failed after {task.attempts} attempts: {error}")
+            self.failed_tasks.append(task)
+            return
+
+        print(f"Sending chunk {task.sequence} to {ip_address} failed ({error}), retrying on {task.ip_address}")
+        self.pending.insert(0, task)
+
+    def __report_progress(self):
+        print("Sent {uploaded:.1f}/{total:.1f} MB ({percent:.0f}%) at {throughput:.1f} MB/s, "
+              "{workers} concurrent uploads".format(uploaded=self.uploaded_bytes / 10 ** 6,
+                                                    total=self.total_bytes / 10 ** 6,
+                                                    percent=100 * self.uploaded_bytes / max(1, self.total_bytes),
+                                                    throughput=self.throughput() / 10 ** 6,
+                                                    workers=int(self.global_limit.limit)))
@@ -0,0 +1,68 @@
+import re
+
+import parse
+
+from codec.exceptions import MalformedMessage
+from valid_messages import MESSAGE_SEPARATOR
+
+
+class MessageDecoder:
+    FIELD_PATTERN = re.compile(r"^\{(\w+)\}$")
+
+    def __init__(self, template):
+        self.template = template
+        self.command = MessageCodec.command(template)
+        self.field_names = None
+        self.parser = parse.compile(template)
+
+        parts = template.split(MESSAGE_SEPARATOR)
+        field_names = [self.FIELD_PATTERN.match(part) for part in parts[1:]]
+        if "{" not in parts[0] and all(field_names):
+            self.field_names = [field_name.group(1) for field_name in field_names]
+
+    def decode(self, message):
+        if self.field_names is not None:
+            values = message.split(MESSAGE_SEPARATOR, len(self.field_names))
+            if len(values) == len(self.field_names) + 1 and values[0] == self.command and all(values):
+                return dict(zip(self.field_names, values[1:]))
+
+        result = self.parser.parse(message)
+        if result is None:
+            raise MalformedMessage
+        return dict(result.named)
+
+
+class MessageCodec:
+    DECODERS = {}
+
+    @staticmethod
+    def command(message):
+        return message.split(MESSAGE_SEPARATOR, 1)[0]
+
+    @classmethod
+    def decoder(cls, template) -> MessageDecoder:
+        decoder = cls.DECODERS.get(template)
+        if decoder is None:
+            decoder = cls.DECODERS[template] = MessageDecoder(template)
+        return decoder
+
+    @classmethod
+    def decode(cls, template, message) -> dict:
+        return cls.decoder(template).decode(message)
+
+
+class MessageDispatcher:
+    def __init__(self, handlers: dict = None):
+        self.handlers = {}
+        for template, handler in (handlers or {}).items():
+            self.register(template, handler)
+
+    def register(self, template, handler):
+        self.handlers[MessageCodec.command(template)] = handler
+
+    def dispatch(self, message, *args):
+        handler = self.handlers.get(MessageCodec.command(message))
+        if handler is None:
+            return False
+        handler(message, *args)
+        return True
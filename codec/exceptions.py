@@ -0,0 +1,2 @@
+class MalformedMessage(ValueError):
+    message = "The message does not match its template"
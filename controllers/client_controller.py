@@ -1,18 +1,22 @@
 import ipaddress
-from multiprocessing import Process
+from multiprocessing import Process, Pipe
 from multiprocessing.connection import Connection
-from threading import Thread
-
-import parse
+from threading import Thread, Lock
 
+from codec.codec import MessageCodec, MessageDispatcher
+from controllers.data_node_worker import DataNodeWorker
 from controllers.peer_controller import PeerController
+from encryption.encryptors import RSAEncryption
 from meta_data.database import MetaDatabase
 from meta_data.models.data_node import DataNode
 from servers.broadcast_server import BroadcastServer
-from servers.data_node_server import DataNodeServer
+from session.policies import PlainTransferPolicy
 from singleton.singleton import Singleton
+from storage.exceptions import NotEnoughSpace
+from storage.scrubber import ChunkScrubber
 from storage.storage import Storage
-from valid_messages import START_CLIENT_SERVER, DELETE_CHUNK, MESSAGE_SEPARATOR, NAME_NODE_STATUS
+from valid_messages import (START_CLIENT_SERVER, DELETE_CHUNK, NAME_NODE_STATUS, UPDATE_BYTE_SIZE,
+                            ACCEPT, OUT_OF_SPACE)
 
 
 class ClientController(Process, metaclass=Singleton):
@@ -27,6 +31,8 @@ class ClientController(Process, metaclass=Singleton):
         self.available_byte_size = self.config.get("available_byte_size")
         self.storage_base_path = self.config.get("path")
         self.broadcast_address = str(ipaddress.ip_network(self.network_id).broadcast_address)
+        self.plain_transfer_policy = PlainTransferPolicy.from_config(self.config)
+        self.data_node_process_count = int(self.config.get("data_node_processes", 1))
 
         self.peer_controller_pipe = peer_controller_pipe
         self.db_connection = None
@@ -34,6 +40,9 @@ class ClientController(Process, metaclass=Singleton):
         self.data_node_server = None
         self.broadcast_server = None
         self.data_node_server_thread = None
+        self.data_node_workers = []
+        self.chunk_scrubber = None
+        self.peer_controller_pipe_lock = Lock()
         self.peer_controller_message_handler_thread = None
         self.is_name_node = False
 
@@ -47,6 +56,7 @@ class ClientController(Process, metaclass=Singleton):
         self.config = PeerController.parse_config(config)
 
     def run(self):
+        RSAEncryption.load_identity_key(PeerController.IDENTITY_KEY_PATH)
         self.db_connection = MetaDatabase()
         while True:
             msg = self.peer_controller_pipe.recv()
@@ -56,26 +66,72 @@ class ClientController(Process, metaclass=Singleton):
         self.storage = Storage(storage_path=self.storage_base_path,
                                current_data_node=DataNode.fetch_by_ip(ip_address=self.ip_address,
                                                                       db=self.db_connection), controller=self)
-        self.data_node_server = DataNodeServer(ip_address=self.ip_address, storage=self.storage)
+        if self.data_node_process_count > 1:
+            self.start_data_node_workers()
+        else:
+            self.data_node_server = DataNodeWorker.create_data_node_server(self.config, self.ip_address, self.storage)
+            self.data_node_server_thread = Thread(target=self.data_node_server.run, args=[])
+            self.data_node_server_thread.start()
+        scrub_bytes_per_second = int(self.config.get("scrub_bytes_per_second",
+                                                     ChunkScrubber.DEFAULT_BYTES_PER_SECOND))
+        if scrub_bytes_per_second > 0:
+            self.chunk_scrubber = ChunkScrubber(self.storage, bytes_per_second=scrub_bytes_per_second,
+                                                interval=int(self.config.get("scrub_interval",
+                                                                             ChunkScrubber.DEFAULT_INTERVAL)))
+            self.chunk_scrubber.start()
         self.broadcast_server = BroadcastServer(broadcast_address=self.broadcast_address, storage=self.storage)
-        self.data_node_server_thread = Thread(target=self.data_node_server.run, args=[])
-        self.data_node_server_thread.start()
         self.peer_controller_message_handler_thread = Thread(target=self.peer_controller_message_handler, args=[])
         self.peer_controller_message_handler_thread.start()
         print("data node server started")
         self.broadcast_server.start()
 
     def inform_modification(self, message):
-        self.peer_controller_pipe.send(message)
+        with self.peer_controller_pipe_lock:
+            self.peer_controller_pipe.send(message)
+
+    def start_data_node_workers(self):
+        for _ in range(self.data_node_process_count):
+            controller_side, worker_side = Pipe()
+            worker = DataNodeWorker(ip_address=self.ip_address, storage_path=self.storage_base_path,
+                                    config=self.config, accounting_pipe=worker_side,
+                                    identity_key_path=PeerController.IDENTITY_KEY_PATH)
+            worker.start()
+            self.data_node_workers.append(worker)
+            Thread(target=self.data_node_worker_message_handler, args=[controller_side]).start()
+
+    def data_node_worker_message_handler(self, worker_pipe):
+        db = MetaDatabase()
+        dispatcher = MessageDispatcher({
+            UPDATE_BYTE_SIZE: self.update_byte_size,
+        })
+        while True:
+            msg = worker_pipe.recv()
+            if not dispatcher.dispatch(msg, worker_pipe, db):
+                self.inform_modification(msg)
+
+    def update_byte_size(self, message, worker_pipe, db):
+        meta_data = MessageCodec.decode(UPDATE_BYTE_SIZE, message)
+        try:
+            self.storage.update_byte_size(int(meta_data.get("byte_size")), db=db)
+            worker_pipe.send(ACCEPT)
+        except NotEnoughSpace:
+            worker_pipe.send(OUT_OF_SPACE)
 
     def peer_controller_message_handler(self):
         db = MetaDatabase()
+        dispatcher = MessageDispatcher({
+            DELETE_CHUNK: self.delete_chunk,
+            NAME_NODE_STATUS: self.update_name_node_status,
+        })
         while True:
-            msg = self.peer_controller_pipe.recv()
-            command = msg.split(MESSAGE_SEPARATOR)[0]
-            if command == DELETE_CHUNK.split(MESSAGE_SEPARATOR)[0]:
-                meta_data = dict(parse.parse(DELETE_CHUNK, msg).named)
-                self.storage.remove_chunk_file(path=meta_data.get("path"), db=db)
-            if command == NAME_NODE_STATUS.split(MESSAGE_SEPARATOR)[0]:
-                meta_data = dict(parse.parse(NAME_NODE_STATUS, msg).named)
-                self.is_name_node = eval(meta_data.get("status"))
+            dispatcher.dispatch(self.peer_controller_pipe.recv(), db)
+
+    def delete_chunk(self, message, db):
+        meta_data = MessageCodec.decode(DELETE_CHUNK, message)
+        self.storage.remove_chunk_file(path=meta_data.get("path"), db=db)
+
+    def update_name_node_status(self, message, db):
+        meta_data = MessageCodec.decode(NAME_NODE_STATUS, message)
+        self.is_name_node = eval(meta_data.get("status"))
+        if self.broadcast_server.namespace_engine is not None:
+            self.broadcast_server.namespace_engine.reset()
@@ -0,0 +1,61 @@
+from multiprocessing import Process
+from multiprocessing.connection import Connection
+from threading import Lock
+
+from encryption.encryptors import RSAEncryption
+from meta_data.database import MetaDatabase
+from meta_data.models.data_node import DataNode
+from servers.async_data_node_server import AsyncDataNodeServer
+from servers.data_node_server import DataNodeServer
+from session.policies import PlainTransferPolicy
+from storage.storage import WorkerStorage
+from valid_messages import UPDATE_BYTE_SIZE, ACCEPT
+
+
+class DataNodeWorker(Process):
+    THREADED_SERVER_MODE = "threaded"
+    ASYNC_SERVER_MODE = "async"
+
+    def __init__(self, ip_address, storage_path, config: dict, accounting_pipe: Connection, identity_key_path,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ip_address = ip_address
+        self.storage_path = storage_path
+        self.config = config
+        self.accounting_pipe = accounting_pipe
+        self.identity_key_path = identity_key_path
+        self.accounting_lock = None
+        self.plain_transfer_policy = None
+        self.storage = None
+
+    @staticmethod
+    def create_data_node_server(config: dict, ip_address, storage, reuse_port=False):
+        if config.get("data_node_server_mode", DataNodeWorker.THREADED_SERVER_MODE) == DataNodeWorker.ASYNC_SERVER_MODE:
+            return AsyncDataNodeServer(
+                ip_address=ip_address, storage=storage,
+                accept_backlog=int(config.get("accept_backlog", AsyncDataNodeServer.DEFAULT_ACCEPT_BACKLOG)),
+                worker_count=int(config.get("data_node_workers", AsyncDataNodeServer.DEFAULT_WORKER_COUNT)),
+                connection_deadline=float(config.get("connection_deadline",
+                                                     DataNodeServer.MAXIMUM_CLIENT_HANDLE_TIME)),
+                reuse_port=reuse_port)
+        return DataNodeServer(ip_address=ip_address, storage=storage, reuse_port=reuse_port)
+
+    def inform_modification(self, message):
+        with self.accounting_lock:
+            self.accounting_pipe.send(message)
+
+    def reserve_byte_size(self, byte_size):
+        with self.accounting_lock:
+            self.accounting_pipe.send(UPDATE_BYTE_SIZE.format(byte_size=byte_size))
+            return self.accounting_pipe.recv() == ACCEPT
+
+    def run(self):
+        RSAEncryption.load_identity_key(self.identity_key_path)
+        self.accounting_lock = Lock()
+        self.plain_transfer_policy = PlainTransferPolicy.from_config(self.config)
+        db = MetaDatabase()
+        self.storage = WorkerStorage(storage_path=self.storage_path,
+                                     current_data_node=DataNode.fetch_by_ip(ip_address=self.ip_address, db=db),
+                                     controller=self)
+        db.close()
+        self.create_data_node_server(self.config, self.ip_address, self.storage, reuse_port=True).run()
@@ -1,24 +1,29 @@
 import ipaddress
+import os
 import socket
+import sqlite3
+import tempfile
 from multiprocessing import Process
 from multiprocessing.connection import Connection
 
 from threading import Thread, Event
 from time import monotonic, sleep
 
-import parse
-
 from broadcast.transmitters import SimpleTransmitter
+from codec.codec import MessageCodec
 from controllers.exceptions import InvalidDataNodeConfigFile, InvalidValueForConfigFiled
 from controllers.peer_recv_thread import PeerRecvThread
+from encryption.encryptors import RSAEncryption
 from meta_data.database import MetaDatabase
+from meta_data.event_log import EventLog
 from meta_data.models.data_node import DataNode
 from servers.peer_server import PeerBroadcastServer
 from valid_messages import (INTRODUCE_PEER, CONFIRM_HANDSHAKE, MESSAGE_SEPARATOR, NULL, RESPOND_TO_BROADCAST,
                             REJECT, JOIN_NETWORK, ACCEPT, RESPOND_TO_INTRODUCTION, BLOCK_QUEUEING,
                             UNBLOCK_QUEUEING, ABORT_JOIN, SEND_DB, START_CLIENT_SERVER, PEER_FAILURE,
-                            RESPOND_PEER_FAILURE, NAME_NODE_STATUS)
+                            RESPOND_PEER_FAILURE, NAME_NODE_STATUS, SEND_DB_PLAIN, SEND_EVENTS, SEQUENCED_EVENT)
 from session.exceptions import PeerTimeOutException
+from session.policies import PlainTransferPolicy
 from session.sessions import SimpleSession, FileSession
 from singleton.singleton import Singleton
 
@@ -26,8 +31,10 @@ from singleton.singleton import Singleton
 class PeerController(Process, metaclass=Singleton):
     PORT_NUMBER = 50502
     CONFIG_FILE_PATH = "dfs.conf"
+    IDENTITY_KEY_PATH = "node_key.pem"
     SOCKET_ACCEPT_TIMEOUT = 3
     JOIN_TRY_LIMIT = 3
+    SNAPSHOT_SUFFIX = ".snapshot"
     MANDATORY_FIELDS = ["ip_address", "network_id", "rack_number", "available_byte_size", "path", "priority"]
 
     def __init__(self, client_controller_pipe: Connection, *args, **kwargs):
@@ -43,6 +50,7 @@ class PeerController(Process, metaclass=Singleton):
             raise InvalidValueForConfigFiled("priority")
         self.available_byte_size = self.config.get("available_byte_size")
         self.broadcast_address = str(ipaddress.ip_network(self.network_id).broadcast_address)
+        self.plain_transfer_policy = PlainTransferPolicy.from_config(self.config)
         self.peer_transmitter = SimpleTransmitter(broadcast_address=self.broadcast_address,
                                                   port_number=PeerBroadcastServer.PORT_NUMBER)
 
@@ -50,6 +58,7 @@ class PeerController(Process, metaclass=Singleton):
         self.peers = []
         self.broadcast_server = PeerBroadcastServer(broadcast_address=self.broadcast_address, peer_controller=self)
         self.name_node_ip_address = None
+        self.event_log = EventLog(retention=int(self.config.get("event_log_retention", EventLog.DEFAULT_RETENTION)))
 
     def update_config_file(self):
         with open(self.CONFIG_FILE_PATH, "r") as config_file:
@@ -106,6 +115,7 @@ class PeerController(Process, metaclass=Singleton):
         self.activity_lock.set()
 
     def handle_storage_process_messages(self, activity_lock: Event):
+        db = MetaDatabase()
         i = -1
         while True:
             i += 1
@@ -113,9 +123,19 @@ class PeerController(Process, metaclass=Singleton):
             print(f"number: {i}")
             if self.client_controller_pipe.poll():
                 message = self.client_controller_pipe.recv()
-                self.inform_next_node(message)
+                self.inform_next_node(self.sequence_event(message, db=db))
             sleep(1)
 
+    def sequence_event(self, event, db: MetaDatabase):
+        sequence = self.event_log.stamp(self.ip_address, event, db=db)
+        return SEQUENCED_EVENT.format(origin=self.ip_address, sequence=sequence, event=event)
+
+    def applied_events(self):
+        try:
+            return EventLog.encode_sequences(self.event_log.applied_sequences(db=self.db_connection))
+        except sqlite3.Error:
+            return NULL
+
     def add_peer(self, ip_address):
         print(f"ready to add peer {ip_address}")
         try:
@@ -152,7 +172,7 @@ class PeerController(Process, metaclass=Singleton):
         thread = PeerRecvThread(session=new_peer_session, controller=self)
         thread.start()
 
-        meta_data = dict(parse.parse(CONFIRM_HANDSHAKE, handshake_confirmation).named)
+        meta_data = MessageCodec.decode(CONFIRM_HANDSHAKE, handshake_confirmation)
         data_node = DataNode(db=self.db_connection, ip_address=ip_address,
                              available_byte_size=meta_data.get("available_byte_size"),
                              rack_number=meta_data.get("rack_number"), priority=meta_data.get("priority"),
@@ -165,7 +185,7 @@ class PeerController(Process, metaclass=Singleton):
             lost_peer.join()
 
         self.peers.append(thread)
-        self.transfer_db(thread.session)
+        self.synchronize_peer(thread.session, meta_data.get("applied_events"))
         print([x.session.ip_address for x in self.peers])
 
     def inform_next_node(self, message, previous_signature: str = ""):
@@ -177,7 +197,8 @@ class PeerController(Process, metaclass=Singleton):
     def join_network(self) -> list:
         confirmation_message = CONFIRM_HANDSHAKE.format(available_byte_size=self.available_byte_size,
                                                         priority=self.priority,
-                                                        rack_number=self.rack_number)
+                                                        rack_number=self.rack_number,
+                                                        applied_events=self.applied_events())
 
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -208,7 +229,7 @@ class PeerController(Process, metaclass=Singleton):
         peer_session = session.convert_to_encrypted_session(is_server=True)
         print(f"got peer {peer_session.ip_address}!")
         suggested_peer = peer_session.receive_data()
-        suggested_peer_address = dict(parse.parse(INTRODUCE_PEER, suggested_peer).named)["ip_address"]
+        suggested_peer_address = MessageCodec.decode(INTRODUCE_PEER, suggested_peer)["ip_address"]
 
         print(f"got suggested {suggested_peer_address}")
         if suggested_peer_address == NULL:
@@ -241,7 +262,7 @@ class PeerController(Process, metaclass=Singleton):
         return [peer_session, suggested_peer_session]
 
     def respond_to_peer_failure(self, message):
-        meta_data = dict(parse.parse(PEER_FAILURE, message).named)
+        meta_data = MessageCodec.decode(PEER_FAILURE, message)
         failed_address = meta_data.get("failed_address")
         reporter_address = meta_data.get("reporter_address")
 
@@ -254,7 +275,7 @@ class PeerController(Process, metaclass=Singleton):
                 ))
 
     def handle_peer_failure_response(self, message):
-        meta_data = dict(parse.parse(RESPOND_PEER_FAILURE, message).named)
+        meta_data = MessageCodec.decode(RESPOND_PEER_FAILURE, message)
         failed_address = meta_data.get("failed_address")
         reporter_address = meta_data.get("reporter_address")
 
@@ -267,6 +288,7 @@ class PeerController(Process, metaclass=Singleton):
 
     # noinspection PyAttributeOutsideInit
     def run(self):
+        RSAEncryption.load_identity_key(self.IDENTITY_KEY_PATH)
         self.db_connection = MetaDatabase()
         self.activity_lock = Event()
         self.activity_lock.set()
@@ -292,9 +314,34 @@ class PeerController(Process, metaclass=Singleton):
         print("Storage communicator started")
         self.broadcast_server.start()
 
-    @staticmethod
-    def transfer_db(session):
-        session.transfer_data(SEND_DB)
+    def synchronize_peer(self, session, applied_events):
+        db = MetaDatabase(durable=False)
+        try:
+            events = self.event_log.tail(EventLog.decode_sequences(applied_events), db=db)
+            if events is None:
+                self.transfer_db(session, db)
+                return
+        finally:
+            db.close()
+
+        session.transfer_data(SEND_EVENTS.format(count=len(events)))
+        for origin, sequence, event in events:
+            session.transfer_data(SEQUENCED_EVENT.format(origin=origin, sequence=sequence, event=event))
+
+    def transfer_db(self, session, db: MetaDatabase):
+        file_descriptor, snapshot_path = tempfile.mkstemp(
+            suffix=self.SNAPSHOT_SUFFIX, prefix=os.path.basename(MetaDatabase.DATABASE_PATH),
+            dir=os.path.dirname(os.path.abspath(MetaDatabase.DATABASE_PATH)))
+        os.close(file_descriptor)
         file_session = FileSession()
-        file_session.transfer_file(MetaDatabase.DATABASE_PATH, session)
+        try:
+            db.snapshot(snapshot_path)
+            if self.plain_transfer_policy.is_trusted(self.ip_address, session.ip_address):
+                session.transfer_data(SEND_DB_PLAIN)
+                file_session.transfer_file_plain(snapshot_path, session.convert_to_simple_session())
+            else:
+                session.transfer_data(SEND_DB)
+                file_session.transfer_file(snapshot_path, session)
+        finally:
+            os.remove(snapshot_path)
         print("transfer database")
@@ -1,9 +1,9 @@
+import os
 import socket
-from threading import Thread, Lock, Event
+from threading import Thread, RLock, Event
 from time import monotonic
 
-import parse
-
+from codec.codec import MessageCodec, MessageDispatcher
 from meta_data.database import MetaDatabase
 from meta_data.models.chunk import Chunk
 from meta_data.models.data_node import DataNode
@@ -11,17 +11,21 @@ from meta_data.models.directory import Directory
 from meta_data.models.file import File
 from meta_data.models.permission import Permission
 from meta_data.models.user import User
+from meta_data.namespace import NamespaceEngine
 from valid_messages import (CONFIRM_HANDSHAKE, STOP_FRIENDSHIP, RESPOND_TO_INTRODUCTION, ACCEPT, INTRODUCE_PEER,
-                            MESSAGE_SEPARATOR, SEND_DB, UPDATE_DATA_NODE, UNBLOCK_QUEUEING, START_CLIENT_SERVER,
+                            SEND_DB, UPDATE_DATA_NODE, UNBLOCK_QUEUEING, START_CLIENT_SERVER,
                             NEW_USER, NEW_FILE, NEW_CHUNK, NEW_DIR, REMOVE_FILE, NEW_FILE_PERMISSION,
-                            NEW_DIR_PERMISSION, DELETE_CHUNK, REMOVE_DATA_NODE, PEER_FAILURE, NAME_NODE_DOWN)
+                            NEW_DIR_PERMISSION, DELETE_CHUNK, REMOVE_DATA_NODE, PEER_FAILURE, NAME_NODE_DOWN,
+                            SEND_DB_PLAIN, REMOVE_CHUNK, SEND_EVENTS, SEQUENCED_EVENT,
+                            REQUEST_EVENTS)
 from session.exceptions import PeerTimeOutException
 from session.sessions import SimpleSession, FileSession, EncryptedSession
 
 
 class PeerRecvThread(Thread):
-    DATABASE_LOCK = Lock()
+    DATABASE_LOCK = RLock()
     RECOVERY_DATA_NODE_CONNECTION_TIMEOUT = 8
+    RECEIVED_DATABASE_SUFFIX = ".received"
 
     def __init__(self, session: EncryptedSession, controller, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -33,6 +37,27 @@ class PeerRecvThread(Thread):
         self.thread_inbox = None
         self.failure_help_found = Event()
         self.failed = False
+        self.current_event = None
+        self.catching_up = False
+        self.dispatcher = MessageDispatcher({
+            INTRODUCE_PEER: self.add_peer,
+            SEND_DB: lambda message: self.receive_db(),
+            SEND_DB_PLAIN: lambda message: self.receive_db(plain=True),
+            SEND_EVENTS: self.receive_events,
+            SEQUENCED_EVENT: self.sequenced_event,
+            REQUEST_EVENTS: self.send_missing_events,
+            UPDATE_DATA_NODE: self.update_data_node,
+            NEW_USER: self.create_account,
+            NEW_FILE: self.create_file,
+            NEW_CHUNK: self.create_chunk,
+            NEW_DIR: self.create_dir,
+            REMOVE_FILE: self.delete_file,
+            NEW_DIR_PERMISSION: self.add_directory_permission,
+            NEW_FILE_PERMISSION: self.add_file_permission,
+            REMOVE_DATA_NODE: self.remove_data_node,
+            REMOVE_CHUNK: self.remove_chunk,
+            STOP_FRIENDSHIP: self.stop_friendship,
+        })
 
     def run(self):
         self.db = MetaDatabase()
@@ -49,39 +74,73 @@ class PeerRecvThread(Thread):
 
     def handle_message(self, message):
         print(message)
-        command = message.split(MESSAGE_SEPARATOR)[0]
-        if command == INTRODUCE_PEER.split(MESSAGE_SEPARATOR)[0]:
-            self.add_peer(message)
-        elif message == SEND_DB:
-            self.receive_db()
-        elif command == UPDATE_DATA_NODE.split(MESSAGE_SEPARATOR)[0]:
-            self.update_data_node(message)
-        elif command == NEW_USER.split(MESSAGE_SEPARATOR)[0]:
-            self.create_account(message)
-        elif command == NEW_FILE.split(MESSAGE_SEPARATOR)[0]:
-            self.create_file(message)
-        elif command == NEW_CHUNK.split(MESSAGE_SEPARATOR)[0]:
-            self.create_chunk(message)
-        elif command == NEW_DIR.split(MESSAGE_SEPARATOR)[0]:
-            self.create_dir(message)
-        elif command == REMOVE_FILE.split(MESSAGE_SEPARATOR)[0]:
-            self.delete_file(message)
-        elif command == NEW_DIR_PERMISSION.split(MESSAGE_SEPARATOR)[0]:
-            self.add_directory_permission(message)
-        elif command == NEW_FILE_PERMISSION.split(MESSAGE_SEPARATOR)[0]:
-            self.add_file_permission(message)
-        elif command == REMOVE_DATA_NODE.split(MESSAGE_SEPARATOR)[0]:
-            self.remove_data_node(message)
-        elif message == STOP_FRIENDSHIP:
-            self.session.close()
-            self.continues = False
+        self.dispatcher.dispatch(message)
+
+    def sequenced_event(self, message):
+        meta_data = MessageCodec.decode(SEQUENCED_EVENT, message)
+        origin = meta_data.get("origin")
+        with self.DATABASE_LOCK:
+            applied_sequence = self.controller.event_log.apply(origin, int(meta_data.get("sequence")),
+                                                               meta_data.get("event"), self.__apply_event, db=self.db)
+        if applied_sequence is not None:
+            self.session.transfer_data(REQUEST_EVENTS.format(origin=origin, sequence=applied_sequence))
+
+    def send_missing_events(self, message):
+        meta_data = MessageCodec.decode(REQUEST_EVENTS, message)
+        origin = meta_data.get("origin")
+        events = self.controller.event_log.missing(origin, int(meta_data.get("sequence")), db=self.db)
+        if events is None:
+            print(f"Events from {origin} requested by {self.session.ip_address} are no longer retained")
+            return
+
+        for sequence, event in events:
+            self.session.transfer_data(SEQUENCED_EVENT.format(origin=origin, sequence=sequence, event=event))
+
+    def __apply_event(self, origin, sequence, event):
+        self.current_event = (origin, sequence)
+        try:
+            self.dispatcher.dispatch(event)
+        finally:
+            self.current_event = None
+
+    def forward(self, message, previous_signature):
+        if self.catching_up:
+            return
+        if self.current_event is not None:
+            origin, sequence = self.current_event
+            message = SEQUENCED_EVENT.format(origin=origin, sequence=sequence, event=message)
+        self.controller.inform_next_node(message, previous_signature=previous_signature)
+
+    def stop_friendship(self, message):
+        self.session.close()
+        self.continues = False
+
+    def remove_chunk(self, message):
+        meta_data = MessageCodec.decode(REMOVE_CHUNK, message)
+        signature = meta_data.get("signature")
+
+        if self.controller.ip_address not in signature.split('-'):
+            self.forward(REMOVE_CHUNK.format(
+                ip_address=meta_data.get("ip_address"),
+                local_path=meta_data.get("local_path"),
+                signature=f"{signature}-{self.controller.ip_address}"
+            ), previous_signature=signature)
+
+            with self.DATABASE_LOCK:
+                data_node = DataNode.fetch_by_ip(ip_address=meta_data.get("ip_address"), db=self.db)
+                if data_node is not None:
+                    chunk = Chunk.fetch_by_data_node_id_local_path(data_node_id=data_node.id,
+                                                                   local_path=meta_data.get("local_path"),
+                                                                   db=self.db)
+                    if chunk is not None:
+                        chunk.delete()
 
     def remove_data_node(self, message):
-        meta_data = dict(parse.parse(REMOVE_DATA_NODE, message).named)
+        meta_data = MessageCodec.decode(REMOVE_DATA_NODE, message)
         signature = meta_data.get("signature")
 
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(REMOVE_DATA_NODE.format(
+            self.forward(REMOVE_DATA_NODE.format(
                 ip_address=meta_data.get("ip_address"),
                 signature=f"{signature}-{self.controller.ip_address}"
 
@@ -93,11 +152,11 @@ class PeerRecvThread(Thread):
                     data_node.delete()
 
     def add_file_permission(self, message):
-        meta_data = dict(parse.parse(NEW_FILE_PERMISSION, message).named)
+        meta_data = MessageCodec.decode(NEW_FILE_PERMISSION, message)
         signature = meta_data.get("signature")
 
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(NEW_FILE_PERMISSION.format(
+            self.forward(NEW_FILE_PERMISSION.format(
                 username=meta_data.get("username"),
                 path=meta_data.get("path"),
                 perm=meta_data.get("perm"),
@@ -116,8 +175,7 @@ class PeerRecvThread(Thread):
                 file_name = lst[-1].split(".")[0]
                 extension = None
 
-            directory = Directory.find_path_directory(
-                main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=dir_path)
+            directory = Directory.fetch_by_path(path_owner, dir_path, db=self.db)
 
             file = File.fetch_by_dir_title_extension(dir_id=directory.id, title=file_name, extension=extension,
                                                      db=self.db)
@@ -134,11 +192,11 @@ class PeerRecvThread(Thread):
                     permission.save()
 
     def add_directory_permission(self, message):
-        meta_data = dict(parse.parse(NEW_DIR_PERMISSION, message).named)
+        meta_data = MessageCodec.decode(NEW_DIR_PERMISSION, message)
         signature = meta_data.get("signature")
 
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(NEW_DIR_PERMISSION.format(
+            self.forward(NEW_DIR_PERMISSION.format(
                 username=meta_data.get("username"),
                 path=meta_data.get("path"),
                 perm=meta_data.get("perm"),
@@ -149,8 +207,7 @@ class PeerRecvThread(Thread):
             path_owner = lst[0]
             dir_path = "/".join(lst[1:])
 
-            directory = Directory.find_path_directory(
-                main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=dir_path)
+            directory = Directory.fetch_by_path(path_owner, dir_path, db=self.db)
 
             with self.DATABASE_LOCK:
                 permission = Permission.fetch_by_username_directory_id(username=meta_data.get("username"),
@@ -165,11 +222,11 @@ class PeerRecvThread(Thread):
                     permission.save()
 
     def delete_file(self, message):
-        meta_data = dict(parse.parse(REMOVE_FILE, message).named)
+        meta_data = MessageCodec.decode(REMOVE_FILE, message)
         signature = meta_data.get("signature")
 
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(REMOVE_FILE.format(
+            self.forward(REMOVE_FILE.format(
                 path=meta_data.get("path"),
                 signature=f"{signature}-{self.controller.ip_address}"
             ), previous_signature=signature)
@@ -186,8 +243,7 @@ class PeerRecvThread(Thread):
                 file_name = lst[-1].split(".")[0]
                 extension = None
 
-            directory = Directory.find_path_directory(
-                main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=dir_path)
+            directory = Directory.fetch_by_path(path_owner, dir_path, db=self.db)
 
             with self.DATABASE_LOCK:
                 possible_file = File.fetch_by_dir_title_extension(dir_id=directory.id, extension=extension,
@@ -198,12 +254,12 @@ class PeerRecvThread(Thread):
                     possible_file.delete()
 
     def create_dir(self, message):
-        meta_data = dict(parse.parse(NEW_DIR, message).named)
+        meta_data = MessageCodec.decode(NEW_DIR, message)
         signature = meta_data.get("signature")
 
         if self.controller.ip_address not in signature.split('-'):
             username = meta_data.get("username")
-            self.controller.inform_next_node(NEW_DIR.format(
+            self.forward(NEW_DIR.format(
                 path=meta_data.get("path"),
                 username=username,
                 signature=f"{signature}-{self.controller.ip_address}"
@@ -215,23 +271,22 @@ class PeerRecvThread(Thread):
             new_dir_name = lst[-1]
             dir_path = "/".join(lst[1:-1])
 
-            directory = Directory.find_path_directory(
-                main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=dir_path)
+            directory = Directory.fetch_by_path(path_owner, dir_path, db=self.db)
 
-            with self.DATABASE_LOCK:
-                if new_dir_name not in [x.title for x in directory.children]:
+            with self.DATABASE_LOCK, self.db.transaction():
+                if not directory.has_child(new_dir_name):
                     new_dir = Directory(db=self.db, title=new_dir_name, parent_directory_id=directory.id)
                     new_dir.save()
                     Permission(db=self.db, perm=Permission.OWNER, directory_id=new_dir.id,
                                user_id=User.fetch_by_username(username=username, db=self.db).id).save()
 
     def create_chunk(self, message):
-        meta_data = dict(parse.parse(NEW_CHUNK, message).named)
+        meta_data = MessageCodec.decode(NEW_CHUNK, message)
         path_owner = meta_data.get("path").split("/")[0]
         path = "/".join(meta_data.get("path").split("/")[1:])
         signature = meta_data.get("signature")
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(NEW_CHUNK.format(
+            self.forward(NEW_CHUNK.format(
                 ip_address=meta_data.get("ip_address"),
                 sequence=meta_data.get("sequence"),
                 chunk_size=meta_data.get("chunk_size"),
@@ -242,8 +297,7 @@ class PeerRecvThread(Thread):
                 signature=f"{signature}-{self.controller.ip_address}"
             ), previous_signature=signature)
 
-            requested_dir = Directory.find_path_directory(
-                main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=path)
+            requested_dir = Directory.fetch_by_path(path_owner, path, db=self.db)
             file = File.fetch_by_dir_title_extension(dir_id=requested_dir.id, title=meta_data.get("title"),
                                                      extension=meta_data.get("extension"), db=self.db)
             data_node = DataNode.fetch_by_ip(meta_data.get("ip_address"), db=self.db)
@@ -260,38 +314,37 @@ class PeerRecvThread(Thread):
                           file_id=file.id).save()
 
     def create_account(self, message):
-        meta_data = dict(parse.parse(NEW_USER, message).named)
+        meta_data = MessageCodec.decode(NEW_USER, message)
         username = meta_data.get("username")
         password = meta_data.get("password")
         signature = meta_data.get("signature")
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(NEW_USER.format(
+            self.forward(NEW_USER.format(
                 username=username,
                 password=password,
                 signature=f"{signature}-{self.controller.ip_address}"
             ), previous_signature=signature)
 
-            with self.DATABASE_LOCK:
+            with self.DATABASE_LOCK, self.db.transaction():
                 possible_user = User.fetch_by_username(username=username, db=self.db)
                 if possible_user is None:
                     user = User(db=self.db, username=username, password=password)
                     user.save()
-
-            if possible_user is None:
-                main_directory = Directory(db=self.db, title=Directory.MAIN_DIR_NAME, parent_directory_id=None)
-                main_directory.save()
-                permission = Permission(db=self.db, directory_id=main_directory.id, user_id=user.id,
-                                        perm=Permission.OWNER)
-                permission.save()
+                    main_directory = Directory(db=self.db, title=Directory.MAIN_DIR_NAME, parent_directory_id=None,
+                                               path=Directory.main_directory_path(username))
+                    main_directory.save()
+                    permission = Permission(db=self.db, directory_id=main_directory.id, user_id=user.id,
+                                            perm=Permission.OWNER)
+                    permission.save()
 
     def create_file(self, message):
-        meta_data = dict(parse.parse(NEW_FILE, message).named)
+        meta_data = MessageCodec.decode(NEW_FILE, message)
         path_owner = meta_data.get("path").split("/")[0]
         path = "/".join(meta_data.get("path").split("/")[1:])
         signature = meta_data.get("signature")
 
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(NEW_FILE.format(
+            self.forward(NEW_FILE.format(
                 title=meta_data.get("title"),
                 extension=meta_data.get("extension"),
                 username=meta_data.get("username"),
@@ -301,10 +354,9 @@ class PeerRecvThread(Thread):
             ), previous_signature=signature)
 
             user = User.fetch_by_username(username=meta_data.get("username"), db=self.db)
-            requested_dir = Directory.find_path_directory(
-                main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=path)
+            requested_dir = Directory.fetch_by_path(path_owner, path, db=self.db)
 
-            with self.DATABASE_LOCK:
+            with self.DATABASE_LOCK, self.db.transaction():
                 file = File.fetch_by_dir_title_extension(dir_id=requested_dir.id, extension=meta_data.get("extension"),
                                                          title=meta_data.get("title"), db=self.db)
 
@@ -315,26 +367,49 @@ class PeerRecvThread(Thread):
                     file.save()
                     Permission(db=self.db, perm=Permission.OWNER, file_id=file.id, user_id=user.id).save()
 
-    def receive_db(self):
+    def receive_db(self, plain=False):
+        received_path = MetaDatabase.DATABASE_PATH + self.RECEIVED_DATABASE_SUFFIX
         file_session = FileSession()
-        file_session.receive_file(MetaDatabase.DATABASE_PATH, self.session)
+        try:
+            if plain:
+                file_session.receive_file_plain(received_path, self.session.convert_to_simple_session())
+            else:
+                file_session.receive_file(received_path, self.session)
+            NamespaceEngine.discard_journal()
+            self.db.restore(received_path)
+        finally:
+            if os.path.exists(received_path):
+                os.remove(received_path)
+        self.finish_join()
+
+    def receive_events(self, message):
+        count = int(MessageCodec.decode(SEND_EVENTS, message).get("count"))
+        self.catching_up = True
+        try:
+            for _ in range(count):
+                self.handle_message(self.session.receive_data())
+        finally:
+            self.catching_up = False
+        self.finish_join()
+
+    def finish_join(self):
         self.controller.client_controller_pipe.send(START_CLIENT_SERVER)
-        self.controller.inform_next_node(UPDATE_DATA_NODE.format(
+        self.controller.inform_next_node(self.controller.sequence_event(UPDATE_DATA_NODE.format(
             ip_address=self.controller.ip_address,
             rack_number=self.controller.rack_number,
             priority=self.controller.priority,
             available_byte_size=self.controller.available_byte_size,
             signature=self.controller.ip_address
-        ))
+        ), db=self.db))
         self.controller.peer_transmitter.transmit(UNBLOCK_QUEUEING)
         self.controller.release_queue_lock()
         self.controller.update_name_node_ip_address(db=self.db)
 
     def update_data_node(self, message):
-        meta_data = dict(parse.parse(UPDATE_DATA_NODE, message).named)
+        meta_data = MessageCodec.decode(UPDATE_DATA_NODE, message)
         signature = meta_data.get("signature")
         if self.controller.ip_address not in signature.split('-'):
-            self.controller.inform_next_node(UPDATE_DATA_NODE.format(
+            self.forward(UPDATE_DATA_NODE.format(
                 ip_address=meta_data.get("ip_address"),
                 available_byte_size=meta_data.get("available_byte_size"),
                 rack_number=meta_data.get("rack_number"),
@@ -357,7 +432,7 @@ class PeerRecvThread(Thread):
                     data_node.save()
 
     def add_peer(self, message):
-        ip_address = dict(parse.parse(INTRODUCE_PEER, message).named)["ip_address"]
+        ip_address = MessageCodec.decode(INTRODUCE_PEER, message)["ip_address"]
         try:
             new_session = SimpleSession(ip_address=ip_address, port_number=self.controller.PORT_NUMBER)
             new_session.transfer_data(RESPOND_TO_INTRODUCTION)
@@ -371,7 +446,7 @@ class PeerRecvThread(Thread):
 
         handshake_confirmation = new_session.receive_data()
         print(f"Thread got handshake {handshake_confirmation}")
-        meta_data = dict(parse.parse(CONFIRM_HANDSHAKE, handshake_confirmation).named)
+        meta_data = MessageCodec.decode(CONFIRM_HANDSHAKE, handshake_confirmation)
         with self.DATABASE_LOCK:
             data_node = DataNode.fetch_by_ip(ip_address=ip_address, db=self.db)
             if data_node is None:
@@ -1,24 +1,194 @@
+import base64
 import hashlib
+import hmac
+import io
+import os
 import pickle
+import struct
 import threading
 
 import rsa
 
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-from encryption.exceptions import KeyHashMismatchException
+from encryption.exceptions import KeyHashMismatchException, InvalidFrameSize, InvalidHandshake
+from encryption.tickets import SessionTicketStore, SessionTicketCache
+
+
+class AEADEncryption:
+    PROTOCOL = "aes256gcm"
+    DEFAULT_FRAME_SIZE = 2 ** 20
+    MINIMUM_FRAME_SIZE = 64 * 2 ** 10
+    MAXIMUM_FRAME_SIZE = 8 * 2 ** 20
+    TAG_BYTE_NUMBER = 16
+    NONCE_COUNTER_BYTE_NUMBER = 8
+    NONCE_BYTE_ORDER = "big"
+    SERVER_NONCE_PREFIX = b"\x00\x00\x00\x01"
+    CLIENT_NONCE_PREFIX = b"\x00\x00\x00\x02"
+
+    def __init__(self, key, frame_size, is_server=False):
+        self.aead = AESGCM(key)
+        self.frame_size = self.validate_frame_size(frame_size)
+        self.maximum_encrypted_size = self.frame_size + self.TAG_BYTE_NUMBER
+        self.encrypt_nonce_prefix = self.SERVER_NONCE_PREFIX if is_server else self.CLIENT_NONCE_PREFIX
+        self.decrypt_nonce_prefix = self.CLIENT_NONCE_PREFIX if is_server else self.SERVER_NONCE_PREFIX
+        self.encrypt_counter = 0
+        self.decrypt_counter = 0
+
+    @staticmethod
+    def validate_frame_size(frame_size):
+        try:
+            frame_size = int(frame_size)
+        except (TypeError, ValueError):
+            raise InvalidFrameSize
+        if not AEADEncryption.MINIMUM_FRAME_SIZE <= frame_size <= AEADEncryption.MAXIMUM_FRAME_SIZE:
+            raise InvalidFrameSize
+        return frame_size
+
+    @staticmethod
+    def from_fernet_key(fernet_key, frame_size, is_server=False):
+        return AEADEncryption(base64.urlsafe_b64decode(fernet_key), frame_size, is_server=is_server)
+
+    def __nonce(self, prefix, counter):
+        return prefix + counter.to_bytes(length=self.NONCE_COUNTER_BYTE_NUMBER, byteorder=self.NONCE_BYTE_ORDER)
+
+    def decrypt(self, encrypted_data):
+        nonce = self.__nonce(self.decrypt_nonce_prefix, self.decrypt_counter)
+        self.decrypt_counter += 1
+        return self.aead.decrypt(nonce, encrypted_data, None)
+
+    def encrypt(self, raw_data):
+        nonce = self.__nonce(self.encrypt_nonce_prefix, self.encrypt_counter)
+        self.encrypt_counter += 1
+        return self.aead.encrypt(nonce, raw_data, None)
 
 
 class RSAEncryption:
     lock = threading.Lock()
+    RSA_KEY_SIZE = 2048
+    HANDSHAKE_NONCE_BYTE_NUMBER = 16
+    HANDSHAKE_HEADER = struct.Struct("!I")
+    MAXIMUM_HANDSHAKE_SIZE = 64 * 2 ** 10
+    identity_key = None
+    TICKET_STORE = SessionTicketStore()
+    TICKET_CACHE = SessionTicketCache()
 
     def __init__(self, fernet):
         self.fernet = fernet
         self.lock = threading.Lock()
 
+    @staticmethod
+    def load_identity_key(path):
+        with RSAEncryption.lock:
+            if os.path.isfile(path):
+                with open(path, "rb") as key_file:
+                    RSAEncryption.identity_key = rsa.PrivateKey.load_pkcs1(key_file.read())
+                return
+
+            private_key = rsa.newkeys(RSAEncryption.RSA_KEY_SIZE)[1]
+            temp_path = path + ".tmp"
+            with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as key_file:
+                key_file.write(private_key.save_pkcs1())
+            os.replace(temp_path, path)
+            RSAEncryption.identity_key = private_key
+
+    @staticmethod
+    def get_identity_key():
+        with RSAEncryption.lock:
+            if RSAEncryption.identity_key is None:
+                RSAEncryption.identity_key = rsa.newkeys(RSAEncryption.RSA_KEY_SIZE)[1]
+            return RSAEncryption.identity_key
+
+    @staticmethod
+    def derive_resumed_key(secret, client_nonce, server_nonce):
+        return base64.urlsafe_b64encode(hmac.new(secret, client_nonce + server_nonce, hashlib.sha256).digest())
+
+    @staticmethod
+    def __send_handshake(socket, *messages):
+        handshake = b"".join(pickle.dumps(message) for message in messages)
+        socket.sendall(RSAEncryption.HANDSHAKE_HEADER.pack(len(handshake)) + handshake)
+
+    @staticmethod
+    def __receive_exactly(socket, length):
+        data = bytearray()
+        while len(data) < length:
+            received = socket.recv(length - len(data))
+            if not received:
+                raise InvalidHandshake
+            data += received
+        return bytes(data)
+
+    @staticmethod
+    def __receive_handshake(socket):
+        length = RSAEncryption.HANDSHAKE_HEADER.unpack(
+            RSAEncryption.__receive_exactly(socket, RSAEncryption.HANDSHAKE_HEADER.size))[0]
+        if length > RSAEncryption.MAXIMUM_HANDSHAKE_SIZE:
+            raise InvalidHandshake
+        return pickle.Unpickler(io.BytesIO(RSAEncryption.__receive_exactly(socket, length)))
+
+    @staticmethod
+    def __accepted_frame_size(offer):
+        try:
+            frame_size = int(offer.get("frame_size"))
+        except (TypeError, ValueError):
+            return None
+        return max(AEADEncryption.MINIMUM_FRAME_SIZE, min(frame_size, AEADEncryption.MAXIMUM_FRAME_SIZE))
+
+    @staticmethod
+    def __load_extension(handshake):
+        try:
+            return handshake.load()
+        except EOFError:
+            return None
+
+    @staticmethod
+    def __complete_server_handshake(socket, response, sym_key, offer, ticket=None):
+        accepted = {}
+        if ticket is not None:
+            accepted["ticket"] = ticket
+        if offer is not None and offer.get("protocol") == AEADEncryption.PROTOCOL:
+            frame_size = RSAEncryption.__accepted_frame_size(offer)
+            if frame_size is not None:
+                accepted["protocol"] = AEADEncryption.PROTOCOL
+                accepted["frame_size"] = frame_size
+
+        if offer is not None:
+            RSAEncryption.__send_handshake(socket, response, accepted)
+        else:
+            RSAEncryption.__send_handshake(socket, response)
+
+        if accepted.get("protocol") == AEADEncryption.PROTOCOL:
+            return AEADEncryption.from_fernet_key(sym_key, accepted.get("frame_size"), is_server=True)
+        return RSAEncryption(Fernet(sym_key))
+
+    @staticmethod
+    def __complete_client_handshake(handshake, sym_key):
+        accepted = RSAEncryption.__load_extension(handshake)
+
+        if accepted is not None and accepted.get("protocol") == AEADEncryption.PROTOCOL:
+            return accepted, AEADEncryption.from_fernet_key(sym_key, accepted.get("frame_size"))
+        return accepted, RSAEncryption(Fernet(sym_key))
+
     @staticmethod
     def create_server_encryption(socket):
-        public_key_pk, pub_key_sha256 = pickle.loads(socket.recv(1024))
+        handshake = RSAEncryption.__receive_handshake(socket)
+        request = handshake.load()
+        offer = RSAEncryption.__load_extension(handshake)
+
+        if isinstance(request, dict):
+            secret = RSAEncryption.TICKET_STORE.redeem(request.get("ticket"))
+            if secret is not None:
+                server_nonce = os.urandom(RSAEncryption.HANDSHAKE_NONCE_BYTE_NUMBER)
+                sym_key = RSAEncryption.derive_resumed_key(secret, request.get("nonce"), server_nonce)
+                return RSAEncryption.__complete_server_handshake(socket, {"nonce": server_nonce}, sym_key, offer)
+
+            RSAEncryption.__send_handshake(socket, {"nonce": None})
+            handshake = RSAEncryption.__receive_handshake(socket)
+            request = handshake.load()
+            offer = RSAEncryption.__load_extension(handshake)
+
+        public_key_pk, pub_key_sha256 = request
         if hashlib.sha256(public_key_pk).hexdigest() != pub_key_sha256:
             raise KeyHashMismatchException()
         else:
@@ -27,32 +197,56 @@ class RSAEncryption:
         sym_key = Fernet.generate_key()
         encrypted_sym_key = rsa.encrypt(pickle.dumps(sym_key), public_key)
         encrypted_sym_key_sha256 = hashlib.sha256(encrypted_sym_key).hexdigest()
-        socket.send(pickle.dumps((encrypted_sym_key, encrypted_sym_key_sha256)))
+        response = (encrypted_sym_key, encrypted_sym_key_sha256)
+
+        ticket = None
+        if offer is not None and offer.get("resumption"):
+            ticket = RSAEncryption.TICKET_STORE.issue(sym_key)
 
-        fernet = Fernet(sym_key)
-        return RSAEncryption(fernet)
+        return RSAEncryption.__complete_server_handshake(socket, response, sym_key, offer, ticket=ticket)
 
     @staticmethod
-    def create_client_encryption(socket):
-        asymmetric_key = rsa.newkeys(2048)
-        public_key = asymmetric_key[0]
-        private_key = asymmetric_key[1]
+    def create_client_encryption(socket, frame_size=None):
+        address = socket.getpeername()
+        offer = {"resumption": True}
+        if frame_size is not None:
+            offer["protocol"] = AEADEncryption.PROTOCOL
+            offer["frame_size"] = frame_size
+
+        cached_ticket = RSAEncryption.TICKET_CACHE.lookup(address)
+        if cached_ticket is not None:
+            ticket, secret = cached_ticket
+            client_nonce = os.urandom(RSAEncryption.HANDSHAKE_NONCE_BYTE_NUMBER)
+            RSAEncryption.__send_handshake(socket, {"ticket": ticket, "nonce": client_nonce}, offer)
+
+            handshake = RSAEncryption.__receive_handshake(socket)
+            server_nonce = handshake.load().get("nonce")
+            if server_nonce is not None:
+                sym_key = RSAEncryption.derive_resumed_key(secret, client_nonce, server_nonce)
+                return RSAEncryption.__complete_client_handshake(handshake, sym_key)[1]
+            RSAEncryption.TICKET_CACHE.forget(address)
+
+        private_key = RSAEncryption.get_identity_key()
+        public_key = rsa.PublicKey(private_key.n, private_key.e)
 
         send_key = pickle.dumps(public_key)
         send_key_sha256 = hashlib.sha256(send_key).hexdigest()
-        socket.send(pickle.dumps((send_key, send_key_sha256)))
+        RSAEncryption.__send_handshake(socket, (send_key, send_key_sha256), offer)
 
-        sym_key, sym_key_sha256 = pickle.loads(socket.recv(1024))
+        handshake = RSAEncryption.__receive_handshake(socket)
+        sym_key, sym_key_sha256 = handshake.load()
         if hashlib.sha256(sym_key).hexdigest() != sym_key_sha256:
             raise KeyHashMismatchException()
         else:
             sym_key = pickle.loads(rsa.decrypt(sym_key, private_key))
 
-        fernet = Fernet(sym_key)
-        return RSAEncryption(fernet)
+        accepted, encryption = RSAEncryption.__complete_client_handshake(handshake, sym_key)
+        if accepted is not None and accepted.get("ticket") is not None:
+            RSAEncryption.TICKET_CACHE.remember(address, accepted.get("ticket"), sym_key)
+        return encryption
 
     def decrypt(self, encrypted_data):
-        return self.fernet.decrypt(encrypted_data)
+        return self.fernet.decrypt(bytes(encrypted_data))
 
     def encrypt(self, raw_data):
         return self.fernet.encrypt(raw_data)
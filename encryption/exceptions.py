@@ -1,2 +1,16 @@
 class KeyHashMismatchException(Exception):
     message = "The key has been modified"
+
+
+class InvalidFrameSize(Exception):
+    MESSAGE = "The peer negotiated an invalid frame size"
+
+    def __init__(self):
+        super().__init__(InvalidFrameSize.MESSAGE)
+
+
+class InvalidHandshake(ConnectionResetError):
+    MESSAGE = "The peer sent a truncated or oversized handshake"
+
+    def __init__(self):
+        super().__init__(InvalidHandshake.MESSAGE)
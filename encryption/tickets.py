@@ -0,0 +1,60 @@
+import os
+from threading import Lock
+from time import monotonic
+
+
+class SessionTicketStore:
+    TICKET_LIFETIME = 60 * 60
+    MAXIMUM_TICKETS = 4096
+    TICKET_BYTE_NUMBER = 16
+
+    def __init__(self):
+        self.tickets = {}
+        self.lock = Lock()
+
+    def issue(self, secret):
+        ticket = os.urandom(self.TICKET_BYTE_NUMBER)
+        with self.lock:
+            if len(self.tickets) >= self.MAXIMUM_TICKETS:
+                self.tickets.pop(next(iter(self.tickets)))
+            self.tickets[ticket] = (secret, monotonic() + self.TICKET_LIFETIME)
+        return ticket
+
+    def redeem(self, ticket):
+        with self.lock:
+            entry = self.tickets.get(ticket)
+            if entry is None:
+                return None
+            if entry[1] < monotonic():
+                self.tickets.pop(ticket)
+                return None
+            return entry[0]
+
+
+class SessionTicketCache:
+    MAXIMUM_ENTRIES = 1024
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = Lock()
+
+    def remember(self, address, ticket, secret):
+        with self.lock:
+            self.entries.pop(address, None)
+            if len(self.entries) >= self.MAXIMUM_ENTRIES:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[address] = (ticket, secret, monotonic() + SessionTicketStore.TICKET_LIFETIME)
+
+    def lookup(self, address):
+        with self.lock:
+            entry = self.entries.get(address)
+            if entry is None:
+                return None
+            if entry[2] < monotonic():
+                self.entries.pop(address)
+                return None
+            return entry[0], entry[1]
+
+    def forget(self, address):
+        with self.lock:
+            self.entries.pop(address, None)
@@ -1,13 +1,81 @@
+import os
 import sqlite3
+from contextlib import contextmanager
+from threading import Condition
+
+from meta_data.migrations import SchemaMigrator
+
+
+class GroupCommit:
+    def __init__(self, wal_path):
+        self.wal_path = wal_path
+        self.condition = Condition()
+        self.requested = 0
+        self.synced = 0
+        self.syncing = False
+        self.sync_count = 0
+
+    def sync(self):
+        with self.condition:
+            self.requested += 1
+            ticket = self.requested
+            while self.synced < ticket:
+                if self.syncing:
+                    self.condition.wait()
+                    continue
+
+                self.syncing = True
+                target = self.requested
+                self.condition.release()
+                try:
+                    self.__fsync_wal()
+                finally:
+                    self.condition.acquire()
+                    self.syncing = False
+                    self.synced = max(self.synced, target)
+                    self.sync_count += 1
+                    self.condition.notify_all()
+
+    def __fsync_wal(self):
+        try:
+            file_descriptor = os.open(self.wal_path, os.O_RDWR)
+        except FileNotFoundError:
+            return
+        try:
+            os.fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
 
 
 class MetaDatabase:
     DATABASE_PATH = "meta_data.db"
+    BUSY_TIMEOUT = 30
+    CACHED_STATEMENTS = 256
+    CONNECTION_PRAGMAS = [
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA mmap_size = 268435456",
+    ]
+    GROUP_COMMIT = True
+    GROUP_COMMITS = {}
 
-    def __init__(self):
-        self.connection = sqlite3.connect(MetaDatabase.DATABASE_PATH)
+    def __init__(self, durable=True, check_same_thread=True):
+        self.connection = sqlite3.connect(MetaDatabase.DATABASE_PATH, timeout=self.BUSY_TIMEOUT,
+                                          cached_statements=self.CACHED_STATEMENTS,
+                                          check_same_thread=check_same_thread)
         self.cursor = self.connection.cursor()
-        self.cursor.execute("PRAGMA foreign_keys = ON")
+        for pragma in self.CONNECTION_PRAGMAS:
+            self.cursor.execute(pragma)
+        self.transaction_depth = 0
+        self.group_commit = None
+        if durable and self.GROUP_COMMIT:
+            self.group_commit = MetaDatabase.GROUP_COMMITS.setdefault(
+                os.path.abspath(MetaDatabase.DATABASE_PATH),
+                GroupCommit(os.path.abspath(MetaDatabase.DATABASE_PATH) + "-wal"))
+        elif durable:
+            self.cursor.execute("PRAGMA synchronous = FULL")
 
     @staticmethod
     def initialize_tables():
@@ -24,6 +92,7 @@ class MetaDatabase:
                                                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                                                     title VARCHAR(200) NOT NULL,
                                                     parent_directory_id INTEGER,
+                                                    path VARCHAR(1000),
                                                     FOREIGN KEY (parent_directory_id) REFERENCES directory (id) 
                                                     ON DELETE CASCADE
                                                         );""")
@@ -67,23 +136,67 @@ class MetaDatabase:
                             chunk_size INTEGER NOT NULL,
                             data_node_id INTEGER NOT NULL,
                             file_id INTEGER NOT NULL,
+                            checksums BLOB,
                             FOREIGN KEY (data_node_id) REFERENCES data_node (id) ON DELETE CASCADE,
                             FOREIGN KEY (file_id) REFERENCES file (id) ON DELETE CASCADE
                                 );""")
 
+        connection.commit()
+        SchemaMigrator(connection).migrate()
+        connection.execute("PRAGMA journal_mode = WAL;")
         connection.close()
 
-    def create(self, command, *args):
-        row_id = self.cursor.execute(command, args).lastrowid
+    @contextmanager
+    def transaction(self):
+        if self.transaction_depth == 0:
+            self.cursor.execute("BEGIN IMMEDIATE")
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                self.connection.rollback()
+            raise
+
+        self.transaction_depth -= 1
+        if self.transaction_depth == 0:
+            self.__commit()
+
+    def __commit(self):
         self.connection.commit()
-        return row_id
+        if self.group_commit is not None:
+            self.group_commit.sync()
+
+    def create(self, command, *args):
+        with self.transaction():
+            return self.cursor.execute(command, args).lastrowid
 
     def execute(self, command, *args):
-        self.cursor.execute(command, args)
-        self.connection.commit()
+        with self.transaction():
+            self.cursor.execute(command, args)
 
     def fetch(self, command, *args):
         return self.cursor.execute(command, args).fetchall()
 
+    def fetch_as(self, row_factory, command, *args):
+        cursor = self.connection.cursor()
+        cursor.row_factory = row_factory
+        return cursor.execute(command, args).fetchall()
+
+    def snapshot(self, path):
+        target = sqlite3.connect(path)
+        try:
+            self.connection.backup(target)
+        finally:
+            target.close()
+
+    def restore(self, path):
+        source = sqlite3.connect(path)
+        try:
+            source.backup(self.connection)
+        finally:
+            source.close()
+
     def close(self):
         self.connection.close()
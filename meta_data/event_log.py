@@ -0,0 +1,123 @@
+from threading import Lock
+from time import monotonic
+
+from codec.codec import MessageCodec
+from meta_data.database import MetaDatabase
+from valid_messages import UPDATE_DATA_NODE, NULL
+
+
+class EventLog:
+    DEFAULT_RETENTION = 10000
+    REQUEST_INTERVAL = 5
+    SEQUENCE_SEPARATOR = ","
+    ORIGIN_SEPARATOR = ":"
+
+    def __init__(self, retention=DEFAULT_RETENTION):
+        self.retention = retention
+        self.lock = Lock()
+        self.pending = {}
+        self.requested_at = {}
+        self.compaction_keys = {
+            MessageCodec.command(UPDATE_DATA_NODE): lambda event: "data_node:" + MessageCodec.decode(
+                UPDATE_DATA_NODE, event).get("ip_address"),
+        }
+
+    def stamp(self, origin, event, db: MetaDatabase):
+        with self.lock, db.transaction():
+            sequence = self.__applied_sequence(origin, db) + 1
+            self.__append(origin, sequence, event, db)
+        return sequence
+
+    def apply(self, origin, sequence, event, handler, db: MetaDatabase):
+        with self.lock:
+            applied_sequence = self.__applied_sequence(origin, db)
+            if sequence <= applied_sequence:
+                return None
+            if sequence > applied_sequence + 1:
+                return self.__hold(origin, sequence, event, applied_sequence)
+
+            pending = self.pending.get(origin, {})
+            while event is not None:
+                with db.transaction():
+                    handler(origin, sequence, event)
+                    self.__append(origin, sequence, event, db)
+                sequence += 1
+                event = pending.pop(sequence, None)
+
+            if len(pending) == 0:
+                self.pending.pop(origin, None)
+                self.requested_at.pop(origin, None)
+            return None
+
+    def __hold(self, origin, sequence, event, applied_sequence):
+        self.pending.setdefault(origin, {})[sequence] = event
+        if monotonic() - self.requested_at.get(origin, -self.REQUEST_INTERVAL) < self.REQUEST_INTERVAL:
+            return None
+        self.requested_at[origin] = monotonic()
+        return applied_sequence
+
+    def missing(self, origin, applied_sequence, db: MetaDatabase):
+        result = db.fetch("SELECT truncated_sequence FROM event_origin WHERE origin=?;", origin)
+        if len(result) != 0 and applied_sequence < result[0][0]:
+            return None
+        return db.fetch("SELECT sequence, event FROM event_log WHERE origin=? AND sequence>? ORDER BY sequence;",
+                        origin, applied_sequence)
+
+    def applied_sequences(self, db: MetaDatabase):
+        return dict(db.fetch("SELECT origin, applied_sequence FROM event_origin;"))
+
+    def tail(self, applied_sequences, db: MetaDatabase):
+        if len(applied_sequences) == 0:
+            return None
+
+        for origin, truncated_sequence in db.fetch("SELECT origin, truncated_sequence FROM event_origin;"):
+            if applied_sequences.get(origin, 0) < truncated_sequence:
+                return None
+
+        return [(origin, sequence, event) for origin, sequence, event in
+                db.fetch("SELECT origin, sequence, event FROM event_log ORDER BY id;")
+                if sequence > applied_sequences.get(origin, 0)]
+
+    def __applied_sequence(self, origin, db: MetaDatabase):
+        result = db.fetch("SELECT applied_sequence FROM event_origin WHERE origin=?;", origin)
+        if len(result) == 0:
+            return 0
+        return result[0][0]
+
+    def __append(self, origin, sequence, event, db: MetaDatabase):
+        compaction_key = self.__compaction_key(event)
+        if compaction_key is not None:
+            db.execute("UPDATE event_log SET event=?, compaction_key=NULL WHERE compaction_key=?;", NULL,
+                       compaction_key)
+        db.execute("INSERT OR IGNORE INTO event_log (origin, sequence, compaction_key, event) VALUES (?, ?, ?, ?);",
+                   origin, sequence, compaction_key, event)
+
+        truncated_sequence = max(sequence - self.retention, 0)
+        db.execute("""INSERT INTO event_origin (origin, applied_sequence, truncated_sequence) VALUES (?, ?, ?)
+                   ON CONFLICT (origin) DO UPDATE SET applied_sequence=excluded.applied_sequence,
+                   truncated_sequence=max(truncated_sequence, excluded.truncated_sequence);""",
+                   origin, sequence, truncated_sequence)
+        db.execute("DELETE FROM event_log WHERE origin=? AND sequence<=?;", origin, truncated_sequence)
+
+    def __compaction_key(self, event):
+        compaction_key = self.compaction_keys.get(MessageCodec.command(event))
+        if compaction_key is None:
+            return None
+        return compaction_key(event)
+
+    @staticmethod
+    def encode_sequences(applied_sequences):
+        if len(applied_sequences) == 0:
+            return NULL
+        return EventLog.SEQUENCE_SEPARATOR.join(f"{origin}{EventLog.ORIGIN_SEPARATOR}{sequence}"
+                                                for origin, sequence in applied_sequences.items())
+
+    @staticmethod
+    def decode_sequences(encoded):
+        if encoded == NULL:
+            return {}
+        applied_sequences = {}
+        for item in encoded.split(EventLog.SEQUENCE_SEPARATOR):
+            origin, sequence = item.split(EventLog.ORIGIN_SEPARATOR)
+            applied_sequences[origin] = int(sequence)
+        return applied_sequences
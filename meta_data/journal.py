@@ -0,0 +1,57 @@
+import os
+import pickle
+import struct
+import zlib
+from threading import Lock
+
+from meta_data.database import GroupCommit
+
+
+class OperationJournal:
+    HEADER = struct.Struct("!II")
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.file = None
+        self.group_commit = GroupCommit(self.path)
+
+    def open(self):
+        self.file = open(self.path, "ab", buffering=0)
+
+    @property
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def append(self, operations):
+        record = pickle.dumps(operations)
+        with self.lock:
+            self.file.write(self.HEADER.pack(len(record), zlib.crc32(record)) + record)
+        self.group_commit.sync()
+
+    def replay(self):
+        operations = []
+        if not os.path.exists(self.path):
+            return operations
+        with open(self.path, "rb") as journal:
+            while True:
+                header = journal.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                length, checksum = self.HEADER.unpack(header)
+                record = journal.read(length)
+                if len(record) < length or zlib.crc32(record) != checksum:
+                    break
+                operations.extend(pickle.loads(record))
+        return operations
+
+    def truncate_after(self, checkpoint):
+        with self.lock:
+            if not checkpoint():
+                return False
+            self.file.truncate(0)
+            os.fsync(self.file.fileno())
+            return True
+
+    def close(self):
+        self.file.close()
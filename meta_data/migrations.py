@@ -0,0 +1,91 @@
+class SchemaMigrator:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.migrations = [
+            self.add_chunk_checksums,
+            self.materialize_directory_paths,
+            self.add_lookup_indexes,
+            self.add_event_log,
+        ]
+
+    @property
+    def version(self):
+        return self.cursor.execute("PRAGMA user_version;").fetchone()[0]
+
+    def migrate(self):
+        isolation_level = self.connection.isolation_level
+        self.connection.isolation_level = None
+        try:
+            for version, migration in enumerate(self.migrations, start=1):
+                if version <= self.version:
+                    continue
+
+                self.cursor.execute("BEGIN;")
+                try:
+                    migration()
+                    self.cursor.execute(f"PRAGMA user_version = {version};")
+                except BaseException:
+                    self.cursor.execute("ROLLBACK;")
+                    raise
+                self.cursor.execute("COMMIT;")
+                print(f"Metadata schema migrated to version {version}: {migration.__name__}")
+        finally:
+            self.connection.isolation_level = isolation_level
+
+    def __columns(self, table):
+        return [column[1] for column in self.cursor.execute(f"PRAGMA table_info({table});").fetchall()]
+
+    def add_chunk_checksums(self):
+        if "checksums" not in self.__columns("chunk"):
+            self.cursor.execute("ALTER TABLE chunk ADD COLUMN checksums BLOB;")
+
+    def materialize_directory_paths(self):
+        from meta_data.models.directory import Directory
+        from meta_data.models.permission import Permission
+
+        if "path" not in self.__columns("directory"):
+            self.cursor.execute("ALTER TABLE directory ADD COLUMN path VARCHAR(1000);")
+
+        self.cursor.execute("""UPDATE directory SET path = (SELECT u.username || ? || directory.title FROM permission p
+                               INNER JOIN users u ON p.user_id = u.id WHERE p.directory_id = directory.id AND
+                               p.perm = ?) WHERE path IS NULL AND parent_directory_id IS NULL;""",
+                            (Directory.PATH_SEPARATOR, Permission.OWNER))
+        while True:
+            self.cursor.execute("""UPDATE directory SET path = (SELECT parent.path || ? || directory.title FROM
+                                   directory parent WHERE parent.id = directory.parent_directory_id) WHERE path IS NULL
+                                   AND parent_directory_id IN (SELECT id FROM directory WHERE path IS NOT NULL);""",
+                                (Directory.PATH_SEPARATOR,))
+            if self.cursor.rowcount == 0:
+                break
+
+        self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS directory_path ON directory (path);")
+
+    def add_lookup_indexes(self):
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS chunk_file_data_node_sequence
+                               ON chunk (file_id, data_node_id, sequence);""")
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS chunk_data_node_local_path
+                               ON chunk (data_node_id, local_path);""")
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS file_directory_title_extension
+                               ON file (directory_id, title, extension);""")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS directory_parent ON directory (parent_directory_id);")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS permission_file_user ON permission (file_id, user_id, perm);")
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS permission_directory_user
+                               ON permission (directory_id, user_id, perm);""")
+        self.cursor.execute("ANALYZE;")
+
+    def add_event_log(self):
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS event_log (
+                               id INTEGER PRIMARY KEY AUTOINCREMENT,
+                               origin VARCHAR(15) NOT NULL,
+                               sequence INTEGER NOT NULL,
+                               compaction_key VARCHAR(100),
+                               event TEXT NOT NULL,
+                               UNIQUE (origin, sequence)
+                                   );""")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS event_log_compaction_key ON event_log (compaction_key);")
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS event_origin (
+                               origin VARCHAR(15) PRIMARY KEY,
+                               applied_sequence INTEGER NOT NULL DEFAULT 0,
+                               truncated_sequence INTEGER NOT NULL DEFAULT 0
+                                   );""")
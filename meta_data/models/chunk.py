@@ -3,7 +3,26 @@ from meta_data.models.data_node import DataNode
 from meta_data.models.file import File
 
 
+class ChunkLocation:
+    __slots__ = ("sequence", "chunk_size", "local_path", "data_node_id", "ip_address", "rack_number", "checksums")
+
+    def __init__(self, sequence, chunk_size, local_path, data_node_id, ip_address, rack_number, checksums):
+        self.sequence = sequence
+        self.chunk_size = chunk_size
+        self.local_path = local_path
+        self.data_node_id = data_node_id
+        self.ip_address = ip_address
+        self.rack_number = rack_number
+        self.checksums = checksums
+
+    @staticmethod
+    def from_row(cursor, row):
+        return ChunkLocation(*row)
+
+
 class Chunk:
+    __slots__ = ("db", "id", "sequence", "local_path", "chunk_size", "data_node_id", "file_id", "checksums")
+
     def __init__(self, db: MetaDatabase, **kwargs):
         self.db = db
         self.id = kwargs.get("id")
@@ -12,20 +31,23 @@ class Chunk:
         self.chunk_size = kwargs.get("chunk_size")
         self.data_node_id = kwargs.get("data_node_id")
         self.file_id = kwargs.get("file_id")
+        self.checksums = kwargs.get("checksums")
 
     def __create(self):
         self.id = self.db.create(
-            "INSERT INTO chunk (sequence, local_path, chunk_size, data_node_id, file_id) VALUES (?,?,?,?,?);",
-            self.sequence, self.local_path, self.chunk_size, self.data_node_id, self.file_id)
+            "INSERT INTO chunk (sequence, local_path, chunk_size, data_node_id, file_id, checksums) VALUES "
+            "(?,?,?,?,?,?);",
+            self.sequence, self.local_path, self.chunk_size, self.data_node_id, self.file_id, self.checksums)
 
     def __update(self):
         pass
 
     def save(self):
-        if self.id is None:
-            self.__create()
-        else:
-            self.__update()
+        with self.db.transaction():
+            if self.id is None:
+                self.__create()
+            else:
+                self.__update()
 
     def delete(self):
         self.db.execute("DELETE FROM chunk WHERE id = ?;", self.id)
@@ -49,11 +71,22 @@ class Chunk:
         for data in result:
             chunks.append(
                 Chunk(db=db, id=data[0], sequence=int(data[1]), local_path=data[2], chunk_size=data[3],
-                      data_node_id=data[4], file_id=data[5])
+                      data_node_id=data[4], file_id=data[5], checksums=data[6])
             )
 
         return chunks
 
+    @staticmethod
+    def fetch_locations_by_file_id(file_id, db: MetaDatabase):
+        return db.fetch_as(ChunkLocation.from_row,
+                           """SELECT chunk.sequence, chunk.chunk_size, chunk.local_path, chunk.data_node_id,
+                           d.ip_address, d.rack_number, chunk.checksums FROM chunk INNER JOIN data_node d ON chunk.data_node_id = d.id
+                           WHERE chunk.file_id=? ORDER BY chunk.sequence;""", file_id)
+
+    @staticmethod
+    def fetch_version_by_file_id(file_id, db: MetaDatabase):
+        return db.fetch("SELECT count(*), max(id) FROM chunk WHERE file_id=?;", file_id)[0]
+
     @staticmethod
     def fetch_by_file_id_data_node_id_sequence(file_id, data_node_id, sequence, db: MetaDatabase):
         result = db.fetch("SELECT * FROM chunk WHERE file_id=? AND data_node_id=? AND sequence=?;", file_id,
@@ -64,4 +97,22 @@ class Chunk:
 
         data = result[0]
         return Chunk(db=db, id=data[0], sequence=int(data[1]), local_path=data[2], chunk_size=data[3],
-                     data_node_id=data[4], file_id=data[5])
+                     data_node_id=data[4], file_id=data[5], checksums=data[6])
+
+    @staticmethod
+    def fetch_by_data_node_id(data_node_id, db: MetaDatabase):
+        result = db.fetch("SELECT * FROM chunk WHERE data_node_id=?;", data_node_id)
+
+        return [Chunk(db=db, id=data[0], sequence=int(data[1]), local_path=data[2], chunk_size=data[3],
+                      data_node_id=data[4], file_id=data[5], checksums=data[6]) for data in result]
+
+    @staticmethod
+    def fetch_by_data_node_id_local_path(data_node_id, local_path, db: MetaDatabase):
+        result = db.fetch("SELECT * FROM chunk WHERE data_node_id=? AND local_path=?;", data_node_id, local_path)
+
+        if len(result) == 0:
+            return None
+
+        data = result[0]
+        return Chunk(db=db, id=data[0], sequence=int(data[1]), local_path=data[2], chunk_size=data[3],
+                     data_node_id=data[4], file_id=data[5], checksums=data[6])
@@ -2,6 +2,8 @@ from meta_data.database import MetaDatabase
 
 
 class DataNode:
+    __slots__ = ("db", "id", "ip_address", "rack_number", "available_byte_size", "last_seen", "priority")
+
     def __init__(self, db: MetaDatabase, **kwargs):
         self.db = db
         self.id = kwargs.get("id")
@@ -22,10 +24,11 @@ class DataNode:
                         self.available_byte_size, self.last_seen, self.id)
 
     def save(self):
-        if self.id is None:
-            self.__create()
-        else:
-            self.__update()
+        with self.db.transaction():
+            if self.id is None:
+                self.__create()
+            else:
+                self.__update()
 
     def delete(self):
         self.db.execute("DELETE FROM data_node WHERE id = ?;", self.id)
@@ -4,26 +4,38 @@ from meta_data.models.file import File
 
 class Directory:
     MAIN_DIR_NAME = "main"
+    PATH_SEPARATOR = "/"
 
     def __init__(self, db: MetaDatabase, **kwargs):
         self.db = db
         self.id = kwargs.get("id")
         self.title = kwargs.get("title")
         self.parent_directory_id = kwargs.get("parent_directory_id")
+        self.path = kwargs.get("path")
 
     def save(self):
-        if self.id is None:
-            self.__create()
-        else:
-            self.__update()
+        with self.db.transaction():
+            if self.id is None:
+                self.__create()
+            else:
+                self.__update()
 
     def __create(self):
-        self.id = self.db.create("INSERT INTO directory (title, parent_directory_id) VALUES (?, ?);", self.title,
-                                 self.parent_directory_id)
+        if self.path is None and self.parent_directory_id is not None:
+            self.path = self.parent_directory.path + self.PATH_SEPARATOR + self.title
+        self.id = self.db.create("INSERT INTO directory (title, parent_directory_id, path) VALUES (?, ?, ?);",
+                                 self.title, self.parent_directory_id, self.path)
 
     def __update(self):
-        self.db.execute("UPDATE directory SET title=?, parent_directory_id=? WHERE id=?;", self.title,
-                        self.parent_directory_id, self.id)
+        previous_path = self.path
+        if self.parent_directory_id is not None:
+            self.path = self.parent_directory.path + self.PATH_SEPARATOR + self.title
+        self.db.execute("UPDATE directory SET title=?, parent_directory_id=?, path=? WHERE id=?;", self.title,
+                        self.parent_directory_id, self.path, self.id)
+        if previous_path is not None and previous_path != self.path:
+            self.db.execute("UPDATE directory SET path=? || substr(path, ?) WHERE substr(path, 1, ?)=?;",
+                            self.path, len(previous_path) + 1, len(previous_path) + 1,
+                            previous_path + self.PATH_SEPARATOR)
 
     def delete(self):
         self.db.execute("DELETE FROM directory WHERE id=?;", self.id)
@@ -44,15 +56,20 @@ class Directory:
 
     @property
     def children(self):
-        result = self.db.fetch("SELECT * FROM directory WHERE parent_directory_id=?;", self.id)
+        result = self.db.fetch(
+            "SELECT id, title, parent_directory_id, path FROM directory WHERE parent_directory_id=?;", self.id)
 
         directories = []
         for data in result:
             directories.append(
-                Directory(db=self.db, id=data[0], title=data[1], parent_directory_id=data[2])
+                Directory(db=self.db, id=data[0], title=data[1], parent_directory_id=data[2], path=data[3])
             )
         return directories
 
+    def has_child(self, title):
+        return len(self.db.fetch("SELECT id FROM directory WHERE path=?;",
+                                 self.path + self.PATH_SEPARATOR + title)) != 0
+
     @property
     def files(self):
         if self.id is None:
@@ -61,15 +78,33 @@ class Directory:
 
     @staticmethod
     def fetch_by_id(dir_id, db: MetaDatabase):
-        result = db.fetch("SELECT * FROM directory WHERE id=?;", dir_id)[0]
-        return Directory(db=db, id=result[0], title=result[1], parent_directory_id=result[2])
+        result = db.fetch("SELECT id, title, parent_directory_id, path FROM directory WHERE id=?;", dir_id)[0]
+        return Directory(db=db, id=result[0], title=result[1], parent_directory_id=result[2], path=result[3])
+
+    @staticmethod
+    def fetch_by_path(path_owner, path, db: MetaDatabase):
+        return Directory.fetch_by_full_path(path_owner + Directory.PATH_SEPARATOR + path, db)
+
+    @staticmethod
+    def fetch_by_full_path(full_path, db: MetaDatabase):
+        result = db.fetch("SELECT id, title, parent_directory_id, path FROM directory WHERE path=?;", full_path)
+
+        if len(result) == 0:
+            return None
+
+        result = result[0]
+        return Directory(db=db, id=result[0], title=result[1], parent_directory_id=result[2], path=result[3])
+
+    @staticmethod
+    def main_directory_path(username):
+        return username + Directory.PATH_SEPARATOR + Directory.MAIN_DIR_NAME
 
     @staticmethod
     def fetch_by_username(username, db: MetaDatabase):
         result = db.fetch(
-            """SELECT directory.id, directory.title, directory.parent_directory_id, p.perm FROM directory INNER JOIN 
-            permission p ON directory.id = p.directory_id INNER JOIN users u on p.user_id = u.id WHERE u.username=?;""",
-            username)
+            """SELECT directory.id, directory.title, directory.parent_directory_id, directory.path, p.perm FROM
+            directory INNER JOIN permission p ON directory.id = p.directory_id INNER JOIN users u on p.user_id = u.id
+            WHERE u.username=?;""", username)
 
         if len(result) == 0:
             return None
@@ -77,40 +112,25 @@ class Directory:
         directories = []
         for data in result:
             directories.append(
-                Directory(db=db, id=data[0], title=data[1], parent_directory_id=data[2])
+                Directory(db=db, id=data[0], title=data[1], parent_directory_id=data[2], path=data[3])
             )
         return directories
 
     @staticmethod
     def fetch_user_main_directory(username, db: MetaDatabase):
-        result = db.fetch("""SELECT directory.id, directory.title, directory.parent_directory_id, p.perm FROM directory
-                            INNER JOIN permission p ON directory.id = p.directory_id INNER JOIN 
-                            users u on p.user_id = u.id WHERE u.username=? AND directory.title=?;""", username,
-                          Directory.MAIN_DIR_NAME)
-
-        if len(result) == 0:
-            return None
-
-        result = result[0]
-        return Directory(db=db, id=result[0], title=result[1], parent_directory_id=result[2])
+        return Directory.fetch_by_path(username, Directory.MAIN_DIR_NAME, db)
 
     @staticmethod
     def find_path_directory(main_dir, path):
         if main_dir is None:
             return None
 
-        path_dirs = path.split("/")
+        path_dirs = path.split(Directory.PATH_SEPARATOR)
 
         if path_dirs[0] != Directory.MAIN_DIR_NAME:
             return
 
-        path_dirs = path_dirs[1:]
-
-        parent = main_dir
-        for directory_name in path_dirs:
-            child = list(filter(lambda x: x.title == directory_name, parent.children))
-            if len(child) == 0:
-                return
-            parent = child[0]
-
-        return parent
+        if len(path_dirs) == 1:
+            return main_dir
+        return Directory.fetch_by_full_path(Directory.PATH_SEPARATOR.join([main_dir.path] + path_dirs[1:]),
+                                            main_dir.db)
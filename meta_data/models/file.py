@@ -12,10 +12,11 @@ class File:
         self.sequence_num = kwargs.get("sequence_num")
 
     def save(self):
-        if self.id is None:
-            self.__create()
-        else:
-            self.__update()
+        with self.db.transaction():
+            if self.id is None:
+                self.__create()
+            else:
+                self.__update()
 
     def __create(self):
         temp = 1 if self.is_complete else 0
@@ -44,6 +45,11 @@ class File:
             return []
         return result
 
+    @property
+    def chunk_locations(self):
+        from meta_data.models.chunk import Chunk
+        return Chunk.fetch_locations_by_file_id(file_id=self.id, db=self.db)
+
     def get_user_permission(self, username):
         result = self.db.fetch("""SELECT permission.perm FROM permission INNER JOIN file f ON 
                                 permission.file_id = f.id INNER JOIN users u ON permission.user_id = u.id
@@ -20,10 +20,11 @@ class Permission:
         self.file_id = kwargs.get("file_id")
 
     def save(self):
-        if self.id is None:
-            self.__create()
-        else:
-            self.__update()
+        with self.db.transaction():
+            if self.id is None:
+                self.__create()
+            else:
+                self.__update()
 
     def __create(self):
         self.id = self.db.create("INSERT INTO permission (perm, file_id, directory_id, user_id) VALUES (?, ?, ?, ?);",
@@ -16,10 +16,11 @@ class User:
         self.db.execute("UPDATE users SET password=? WHERE id=?;", self.password, self.id)
 
     def save(self):
-        if self.id is None:
-            self.__create()
-        else:
-            self.__update()
+        with self.db.transaction():
+            if self.id is None:
+                self.__create()
+            else:
+                self.__update()
 
     def delete(self):
         self.db.execute("DELETE FROM users WHERE id=?", self.id)
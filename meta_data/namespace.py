@@ -0,0 +1,292 @@
+import os
+from threading import Lock, Thread
+from time import sleep
+
+from meta_data.database import MetaDatabase
+from meta_data.journal import OperationJournal
+from meta_data.models.chunk import Chunk
+
+
+class UserEntry:
+    __slots__ = ("id", "username", "password")
+
+    def __init__(self, id, username, password):
+        self.id = id
+        self.username = username
+        self.password = password
+
+
+class DirectoryEntry:
+    __slots__ = ("id", "title", "parent_directory_id", "path", "children", "permissions")
+
+    def __init__(self, id, title, parent_directory_id, path):
+        self.id = id
+        self.title = title
+        self.parent_directory_id = parent_directory_id
+        self.path = path
+        self.children = set()
+        self.permissions = {}
+
+    def has_child(self, title):
+        return title in self.children
+
+    def get_user_permission(self, username):
+        return self.permissions.get(username)
+
+
+class FileEntry:
+    __slots__ = ("id", "title", "extension", "directory_id", "sequence_num", "is_complete", "permissions")
+
+    def __init__(self, id, title, extension, directory_id, sequence_num, is_complete):
+        self.id = id
+        self.title = title
+        self.extension = extension
+        self.directory_id = directory_id
+        self.sequence_num = sequence_num
+        self.is_complete = is_complete
+        self.permissions = {}
+
+    def get_user_permission(self, username):
+        return self.permissions.get(username)
+
+
+class Namespace:
+    NEW_USER = "new_user"
+    NEW_DIRECTORY = "new_directory"
+    NEW_FILE = "new_file"
+    DIRECTORY_PERMISSION = "directory_permission"
+    FILE_PERMISSION = "file_permission"
+    REMOVE_FILE = "remove_file"
+
+    def __init__(self):
+        self.users = {}
+        self.directories = {}
+        self.directories_by_id = {}
+        self.files = {}
+        self.files_by_id = {}
+        self.chunk_maps = {}
+        self.operations = {
+            self.NEW_USER: self.__new_user,
+            self.NEW_DIRECTORY: self.__new_directory,
+            self.NEW_FILE: self.__new_file,
+            self.DIRECTORY_PERMISSION: self.__directory_permission,
+            self.FILE_PERMISSION: self.__file_permission,
+            self.REMOVE_FILE: self.__remove_file,
+        }
+
+    @staticmethod
+    def load(db: MetaDatabase):
+        namespace = Namespace()
+        for data in db.fetch("SELECT id, username, password FROM users;"):
+            namespace.__new_user(*data)
+        for data in db.fetch("SELECT id, title, parent_directory_id, path FROM directory;"):
+            namespace.__new_directory(*data)
+        for directory in namespace.directories_by_id.values():
+            parent = namespace.directories_by_id.get(directory.parent_directory_id)
+            if parent is not None:
+                parent.children.add(directory.title)
+        for data in db.fetch("SELECT id, title, extension, directory_id, sequence_num, is_complete FROM file;"):
+            namespace.__new_file(*data)
+        for perm, file_id, directory_id, username in db.fetch(
+                """SELECT permission.perm, permission.file_id, permission.directory_id, u.username FROM permission
+                INNER JOIN users u ON permission.user_id = u.id;"""):
+            if file_id is not None:
+                namespace.__file_permission(file_id, None, username, perm)
+            else:
+                namespace.__directory_permission(directory_id, None, username, perm)
+        return namespace
+
+    def apply(self, operation):
+        self.operations[operation[0]](*operation[1:])
+
+    def fetch_user(self, username):
+        return self.users.get(username)
+
+    def fetch_directory(self, path_owner, path):
+        return self.directories.get(path_owner + "/" + path)
+
+    def fetch_file(self, directory_id, title, extension):
+        return self.files.get((directory_id, title, extension))
+
+    def chunk_locations(self, file, db: MetaDatabase, data_version):
+        cached = self.chunk_maps.get(file.id)
+        if cached is not None and cached[0] == data_version:
+            return cached[2]
+
+        version = Chunk.fetch_version_by_file_id(file_id=file.id, db=db)
+        if cached is not None and cached[1] == version:
+            self.chunk_maps[file.id] = (data_version, version, cached[2])
+            return cached[2]
+
+        locations = Chunk.fetch_locations_by_file_id(file_id=file.id, db=db)
+        if len({location.sequence for location in locations}) == file.sequence_num:
+            self.chunk_maps[file.id] = (data_version, version, locations)
+        return locations
+
+    def invalidate_chunks(self, file_id):
+        self.chunk_maps.pop(file_id, None)
+
+    def __new_user(self, user_id, username, password):
+        self.users[username] = UserEntry(user_id, username, password)
+
+    def __new_directory(self, directory_id, title, parent_directory_id, path):
+        directory = DirectoryEntry(directory_id, title, parent_directory_id, path)
+        self.directories[path] = directory
+        self.directories_by_id[directory_id] = directory
+        parent = self.directories_by_id.get(parent_directory_id)
+        if parent is not None:
+            parent.children.add(title)
+
+    def __new_file(self, file_id, title, extension, directory_id, sequence_num, is_complete=False):
+        file = FileEntry(file_id, title, extension, directory_id, int(sequence_num), bool(is_complete))
+        self.files[(directory_id, title, extension)] = file
+        self.files_by_id[file_id] = file
+
+    def __directory_permission(self, directory_id, user_id, username, perm):
+        directory = self.directories_by_id.get(directory_id)
+        if directory is not None:
+            directory.permissions[username] = perm
+
+    def __file_permission(self, file_id, user_id, username, perm):
+        file = self.files_by_id.get(file_id)
+        if file is not None:
+            file.permissions[username] = perm
+
+    def __remove_file(self, file_id):
+        file = self.files_by_id.pop(file_id, None)
+        if file is not None:
+            del self.files[(file.directory_id, file.title, file.extension)]
+        self.invalidate_chunks(file_id)
+
+
+class NamespaceEngine:
+    SQLITE_MODE = "sqlite"
+    MEMORY_MODE = "memory"
+    JOURNAL_SUFFIX = ".oplog"
+    DEFAULT_CHECKPOINT_INTERVAL = 60
+    CHECKPOINT_BYTES = 16 * (2 ** 20)
+    CONNECTION_PRAGMAS = [
+        "PRAGMA synchronous = OFF",
+        "PRAGMA wal_autocheckpoint = 0",
+    ]
+
+    def __init__(self, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = checkpoint_interval
+        self.lock = Lock()
+        self.namespace = None
+        self.checkpoint_thread = None
+        self.journal = OperationJournal(self.journal_path())
+        self.version_watcher = None
+        self.version_lock = Lock()
+        self.statements = {
+            Namespace.NEW_USER: lambda user_id, username, password: (
+                "INSERT OR IGNORE INTO users (id, username, password) VALUES (?, ?, ?);",
+                user_id, username, password),
+            Namespace.NEW_DIRECTORY: lambda directory_id, title, parent_directory_id, path: (
+                "INSERT OR IGNORE INTO directory (id, title, parent_directory_id, path) VALUES (?, ?, ?, ?);",
+                directory_id, title, parent_directory_id, path),
+            Namespace.NEW_FILE: lambda file_id, title, extension, directory_id, sequence_num: (
+                """INSERT OR IGNORE INTO file (id, title, extension, is_complete, directory_id, sequence_num)
+                VALUES (?, ?, ?, 0, ?, ?);""", file_id, title, extension, directory_id, sequence_num),
+            Namespace.DIRECTORY_PERMISSION: lambda directory_id, user_id, username, perm: (
+                """INSERT INTO permission (perm, directory_id, user_id) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, directory_id) DO UPDATE SET perm=excluded.perm;""",
+                perm, directory_id, user_id),
+            Namespace.FILE_PERMISSION: lambda file_id, user_id, username, perm: (
+                """INSERT INTO permission (perm, file_id, user_id) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, file_id) DO UPDATE SET perm=excluded.perm;""", perm, file_id, user_id),
+            Namespace.REMOVE_FILE: lambda file_id: ("DELETE FROM file WHERE id=?;", file_id),
+        }
+
+    @staticmethod
+    def journal_path():
+        return MetaDatabase.DATABASE_PATH + NamespaceEngine.JOURNAL_SUFFIX
+
+    @staticmethod
+    def discard_journal():
+        if os.path.exists(NamespaceEngine.journal_path()):
+            os.remove(NamespaceEngine.journal_path())
+
+    def connect(self):
+        db = MetaDatabase(durable=False)
+        for pragma in self.CONNECTION_PRAGMAS:
+            db.cursor.execute(pragma)
+        return db
+
+    def open(self):
+        db = self.connect()
+        operations = self.journal.replay()
+        if len(operations) != 0:
+            with db.transaction():
+                for operation in operations:
+                    db.execute(*self.statements[operation[0]](*operation[1:]))
+        self.journal.open()
+        self.checkpoint(db)
+        db.close()
+        self.version_watcher = MetaDatabase(durable=False, check_same_thread=False)
+
+    def image(self, db: MetaDatabase):
+        with self.lock:
+            if self.namespace is None:
+                self.namespace = Namespace.load(db)
+            return self.namespace
+
+    def reset(self):
+        with self.lock:
+            self.namespace = None
+
+    def data_version(self):
+        with self.version_lock:
+            return self.version_watcher.fetch("PRAGMA data_version;")[0][0]
+
+    def write(self, db: MetaDatabase, *operations):
+        self.journal.append(operations)
+        with db.transaction():
+            for operation in operations:
+                db.execute(*self.statements[operation[0]](*operation[1:]))
+        self.__apply(db, operations)
+
+    def record(self, db: MetaDatabase, *operations):
+        self.journal.append(operations)
+        self.__apply(db, operations)
+
+    def __apply(self, db: MetaDatabase, operations):
+        with self.lock:
+            if self.namespace is not None:
+                for operation in operations:
+                    self.namespace.apply(operation)
+
+        if self.journal.size >= self.CHECKPOINT_BYTES:
+            self.checkpoint(db)
+
+    def invalidate_chunks(self, file_id):
+        with self.lock:
+            if self.namespace is not None:
+                self.namespace.invalidate_chunks(file_id)
+
+    def checkpoint(self, db: MetaDatabase):
+        return self.journal.truncate_after(lambda: self.__checkpoint_database(db))
+
+    @staticmethod
+    def __checkpoint_database(db: MetaDatabase):
+        busy, log_frames, checkpointed_frames = db.fetch("PRAGMA wal_checkpoint(PASSIVE);")[0]
+        if busy != 0 or log_frames != checkpointed_frames:
+            return False
+
+        file_descriptor = os.open(MetaDatabase.DATABASE_PATH, os.O_RDWR)
+        try:
+            os.fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
+        return True
+
+    def start(self):
+        self.open()
+        self.checkpoint_thread = Thread(target=self.__checkpoint_thread, args=[], daemon=True)
+        self.checkpoint_thread.start()
+
+    def __checkpoint_thread(self):
+        db = self.connect()
+        while True:
+            sleep(self.checkpoint_interval)
+            self.checkpoint(db)
@@ -0,0 +1,83 @@
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+from servers.data_node_server import DataNodeServer, ClientThread
+from singleton.singleton import Singleton
+
+
+class AsyncDataNodeServer(metaclass=Singleton):
+    DEFAULT_ACCEPT_BACKLOG = 128
+    DEFAULT_WORKER_COUNT = 32
+    DEFAULT_MAXIMUM_CONNECTIONS = 1024
+
+    def __init__(self, ip_address, storage, accept_backlog=DEFAULT_ACCEPT_BACKLOG, worker_count=DEFAULT_WORKER_COUNT,
+                 connection_deadline=DataNodeServer.MAXIMUM_CLIENT_HANDLE_TIME,
+                 maximum_connections=DEFAULT_MAXIMUM_CONNECTIONS, reuse_port=False):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((ip_address, DataNodeServer.DATA_NODE_PORT_NUMBER))
+        self.server_socket.setblocking(False)
+        self.storage = storage
+        self.accept_backlog = accept_backlog
+        self.connection_deadline = connection_deadline
+        self.maximum_connections = maximum_connections
+        self.executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="data_node_worker")
+        self.connection_slots = None
+        self.loop = None
+
+    def run(self):
+        print("Async data node server started")
+        asyncio.run(self.__serve())
+
+    async def __serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.connection_slots = asyncio.Semaphore(self.maximum_connections)
+        self.server_socket.listen(self.accept_backlog)
+
+        while True:
+            await self.connection_slots.acquire()
+            client_socket, addr = await self.loop.sock_accept(self.server_socket)
+            client_socket.setblocking(True)
+            self.loop.create_task(self.__handle_connection(client_socket, addr))
+
+    @staticmethod
+    def __abort(client_socket):
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    async def __handle_connection(self, client_socket, addr):
+        client_data = {
+            "ip_address": addr[0],
+            "start_time": time(),
+            "socket": client_socket
+        }
+        handler = ClientThread(client_data, self.storage, detach_channel=True, stream_runner=self.__submit_stream)
+        await self.__run_handler(handler, lambda: self.__abort(client_socket))
+
+    def __submit_stream(self, handler):
+        asyncio.run_coroutine_threadsafe(self.__handle_stream(handler), self.loop)
+
+    async def __handle_stream(self, handler):
+        await self.connection_slots.acquire()
+        await self.__run_handler(handler, handler.session.close)
+
+    async def __run_handler(self, handler, abort):
+        ip_address = handler.client_data["ip_address"]
+        future = self.loop.run_in_executor(self.executor, handler.run)
+
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.connection_deadline)
+            except asyncio.TimeoutError:
+                print(f"Connection from {ip_address} exceeded its deadline")
+                abort()
+                await future
+        except Exception as error:
+            print(f"Connection from {ip_address} failed: {error!r}")
+        finally:
+            self.connection_slots.release()
@@ -1,25 +1,27 @@
+import hashlib
 import pickle
 from threading import Thread, Lock
 from time import sleep
 from time import time
 
-import parse
-
 from broadcast.servers import SimpleBroadcastServer
+from codec.codec import MessageCodec, MessageDispatcher
 from meta_data.database import MetaDatabase
 from meta_data.models.directory import Directory
 from meta_data.models.file import File
 from meta_data.models.permission import Permission
 from meta_data.models.user import User
-from valid_messages import (CREATE_FILE, MESSAGE_SEPARATOR, OUT_OF_SPACE, ACCEPT, DUPLICATE_FILE_FOR_USER,
+from meta_data.namespace import Namespace, NamespaceEngine
+from valid_messages import (CREATE_FILE, OUT_OF_SPACE, ACCEPT, DUPLICATE_FILE_FOR_USER,
                             NEW_FILE, NO_PERMISSION, INVALID_PATH, LOGIN, CREDENTIALS, USER_NOT_FOUND, AUTH_FAILED,
                             CREATE_ACCOUNT, DUPLICATE_ACCOUNT, NEW_USER, GET_FILE, FILE_DOES_NOT_EXIST, CORRUPTED_FILE,
                             CREATE_DIR, DUPLICATE_DIR_NAME, NEW_DIR, DELETE_FILE, REMOVE_FILE, ADD_DIR_PERM,
                             INVALID_USERNAME, INVALID_PERMISSION_VALUE, ADD_FILE_PERM, NEW_DIR_PERMISSION,
-                            NEW_FILE_PERMISSION)
+                            NEW_FILE_PERMISSION, GET_FILE_RANGE, INVALID_METADATA)
 from session.exceptions import PeerTimeOutException
 from session.sessions import EncryptedSession
 from singleton.singleton import Singleton
+from storage.load import ReadLoadTracker
 
 
 class BroadcastServer(SimpleBroadcastServer, metaclass=Singleton):
@@ -34,6 +36,10 @@ class BroadcastServer(SimpleBroadcastServer, metaclass=Singleton):
         self.active_clients_lock = Lock()
         self.controller_thread = None
         self.storage = storage
+        self.namespace_engine = None
+        if storage.controller.config.get("namespace_mode", NamespaceEngine.SQLITE_MODE) == NamespaceEngine.MEMORY_MODE:
+            self.namespace_engine = NamespaceEngine(checkpoint_interval=int(storage.controller.config.get(
+                "namespace_checkpoint_interval", NamespaceEngine.DEFAULT_CHECKPOINT_INTERVAL)))
 
     def on_receive(self, source_address, data):
         if self.storage.controller.is_name_node:
@@ -48,7 +54,7 @@ class BroadcastServer(SimpleBroadcastServer, metaclass=Singleton):
                 "command": data.decode()
             }
 
-            client_data["thread"] = ClientThread(client_data, self.storage)
+            client_data["thread"] = ClientThread(client_data, self.storage, namespace_engine=self.namespace_engine)
             client_data["thread"].start()
 
             with self.active_clients_lock:
@@ -69,51 +75,78 @@ class BroadcastServer(SimpleBroadcastServer, metaclass=Singleton):
         print("broadcast server started")
         self.controller_thread = Thread(target=self.__active_client_controller_thread, args=[])
         self.controller_thread.start()
+        if self.namespace_engine is not None:
+            self.namespace_engine.start()
         self._start()
 
 
 class ClientThread(Thread):
     DATABASE_LOCK = Lock()
+    READ_LOAD = ReadLoadTracker()
     DATA_NODE_ASSIGNMENT_LOCK = Lock()
 
-    def __init__(self, client_data, storage, *args, **kwargs):
+    def __init__(self, client_data, storage, namespace_engine=None, *args, **kwargs):
         super(ClientThread, self).__init__(*args, **kwargs)
         self.client_data = client_data
         self.storage = storage
+        self.namespace_engine = namespace_engine
+        self.namespace = None
         self.db_connection = None
         self.session = None
         self.ip_address = self.storage.current_data_node.ip_address
+        self.dispatcher = MessageDispatcher({
+            CREATE_FILE: self.create_file,
+            LOGIN: lambda message: self.login(),
+            CREATE_ACCOUNT: lambda message: self.create_account(),
+            GET_FILE: self.get_file,
+            GET_FILE_RANGE: self.get_file_range,
+            CREATE_DIR: self.create_directory,
+            DELETE_FILE: self.delete_file,
+            ADD_DIR_PERM: self.add_directory_permission,
+            ADD_FILE_PERM: self.add_file_permission,
+        })
 
     def run(self):
-        self.db_connection = MetaDatabase()
+        if self.namespace_engine is None:
+            self.db_connection = MetaDatabase()
+        else:
+            self.db_connection = self.namespace_engine.connect()
+            self.namespace = self.namespace_engine.image(self.db_connection)
         try:
             self.session = EncryptedSession(ip_address=self.client_data.get("ip_address"),
                                             port_number=BroadcastServer.CLIENT_PORT_NUMBER)
         except (PeerTimeOutException, ConnectionResetError, BrokenPipeError):
             return
 
-        message = self.client_data.get("command")
-        command = message.split(MESSAGE_SEPARATOR)[0]
-
-        if command == CREATE_FILE.split(MESSAGE_SEPARATOR)[0]:
-            self.create_file(message)
-        elif message == LOGIN:
-            self.login()
-        elif message == CREATE_ACCOUNT:
-            self.create_account()
-        elif command == GET_FILE.split(MESSAGE_SEPARATOR)[0]:
-            self.get_file(message)
-        elif command == CREATE_DIR.split(MESSAGE_SEPARATOR)[0]:
-            self.create_directory(message)
-        elif command == DELETE_FILE.split(MESSAGE_SEPARATOR)[0]:
-            self.delete_file(message)
-        elif command == ADD_DIR_PERM.split(MESSAGE_SEPARATOR)[0]:
-            self.add_directory_permission(message)
-        elif command == ADD_FILE_PERM.split(MESSAGE_SEPARATOR)[0]:
-            self.add_file_permission(message)
+        self.dispatcher.dispatch(self.client_data.get("command"))
+
+    def __fetch_directory(self, path_owner, path):
+        if self.namespace is not None:
+            return self.namespace.fetch_directory(path_owner, path)
+        return Directory.fetch_by_path(path_owner, path, db=self.db_connection)
+
+    def __fetch_file(self, directory, title, extension):
+        if self.namespace is not None:
+            return self.namespace.fetch_file(directory.id, title, extension)
+        return File.fetch_by_dir_title_extension(dir_id=directory.id, title=title, extension=extension,
+                                                 db=self.db_connection)
+
+    def __fetch_user(self, username):
+        if self.namespace is not None:
+            return self.namespace.fetch_user(username)
+        return User.fetch_by_username(username=username, db=self.db_connection)
+
+    def __chunk_locations(self, file):
+        if self.namespace is not None:
+            return self.namespace.chunk_locations(file, self.db_connection, self.namespace_engine.data_version())
+        return file.chunk_locations
+
+    def __record(self, *operations):
+        if self.namespace_engine is not None:
+            self.namespace_engine.record(self.db_connection, *operations)
 
     def add_file_permission(self, message):
-        meta_data = dict(parse.parse(ADD_FILE_PERM, message).named)
+        meta_data = MessageCodec.decode(ADD_FILE_PERM, message)
         username = meta_data.get("owner_username")
         permission_username = meta_data.get("perm_username")
         permission = meta_data.get("perm")
@@ -133,16 +166,14 @@ class ClientThread(Thread):
             self.session.close()
             return
 
-        directory = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db_connection), path=dir_path)
+        directory = self.__fetch_directory(path_owner, dir_path)
 
         if directory is None:
             self.session.transfer_data(INVALID_PATH)
             self.session.close()
             return
 
-        file = File.fetch_by_dir_title_extension(dir_id=directory.id, title=file_name, extension=extension,
-                                                 db=self.db_connection)
+        file = self.__fetch_file(directory, title=file_name, extension=extension)
         if file is None:
             self.session.transfer_data(FILE_DOES_NOT_EXIST)
             self.session.close()
@@ -153,19 +184,23 @@ class ClientThread(Thread):
             self.session.close()
             return
 
-        user = User.fetch_by_username(username=permission_username, db=self.db_connection)
+        user = self.__fetch_user(permission_username)
         if user is None:
             self.session.transfer_data(INVALID_USERNAME)
             self.session.close()
             return
 
-        permission_instance = Permission.fetch_by_username_file_id(username=permission_username, file_id=file.id,
-                                                                   db=self.db_connection)
-        if permission_instance is None:
-            Permission(db=self.db_connection, user_id=user.id, file_id=file.id, perm=permission).save()
+        if self.namespace_engine is not None:
+            self.namespace_engine.write(self.db_connection,
+                                        (Namespace.FILE_PERMISSION, file.id, user.id, permission_username, permission))
         else:
-            permission_instance.perm = permission
-            permission_instance.save()
+            permission_instance = Permission.fetch_by_username_file_id(username=permission_username,
+                                                                       file_id=file.id, db=self.db_connection)
+            if permission_instance is None:
+                Permission(db=self.db_connection, user_id=user.id, file_id=file.id, perm=permission).save()
+            else:
+                permission_instance.perm = permission
+                permission_instance.save()
 
         self.session.transfer_data(ACCEPT)
         self.session.close()
@@ -178,7 +213,7 @@ class ClientThread(Thread):
         ))
 
     def add_directory_permission(self, message):
-        meta_data = dict(parse.parse(ADD_DIR_PERM, message).named)
+        meta_data = MessageCodec.decode(ADD_DIR_PERM, message)
         owner_username = meta_data.get("owner_username")
         permission_username = meta_data.get("perm_username")
         permission = meta_data.get("perm")
@@ -191,8 +226,7 @@ class ClientThread(Thread):
             self.session.close()
             return
 
-        directory = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db_connection), path=dir_path)
+        directory = self.__fetch_directory(path_owner, dir_path)
 
         if directory is None:
             self.session.transfer_data(INVALID_PATH)
@@ -204,20 +238,25 @@ class ClientThread(Thread):
             self.session.close()
             return
 
-        user = User.fetch_by_username(username=permission_username, db=self.db_connection)
+        user = self.__fetch_user(permission_username)
         if user is None:
             self.session.transfer_data(INVALID_USERNAME)
             self.session.close()
             return
 
-        permission_instance = Permission.fetch_by_username_directory_id(username=permission_username,
-                                                                        directory_id=directory.id,
-                                                                        db=self.db_connection)
-        if permission_instance is None:
-            Permission(db=self.db_connection, user_id=user.id, directory_id=directory.id, perm=permission).save()
+        if self.namespace_engine is not None:
+            self.namespace_engine.write(self.db_connection, (Namespace.DIRECTORY_PERMISSION, directory.id, user.id,
+                                                             permission_username, permission))
         else:
-            permission_instance.perm = permission
-            permission_instance.save()
+            permission_instance = Permission.fetch_by_username_directory_id(username=permission_username,
+                                                                            directory_id=directory.id,
+                                                                            db=self.db_connection)
+            if permission_instance is None:
+                Permission(db=self.db_connection, user_id=user.id, directory_id=directory.id,
+                           perm=permission).save()
+            else:
+                permission_instance.perm = permission
+                permission_instance.save()
 
         self.session.transfer_data(ACCEPT)
         self.session.close()
@@ -230,7 +269,7 @@ class ClientThread(Thread):
         ))
 
     def delete_file(self, message):
-        meta_data = dict(parse.parse(DELETE_FILE, message).named)
+        meta_data = MessageCodec.decode(DELETE_FILE, message)
         username = meta_data.get("username")
         logical_path = meta_data.get("path")
         lst = logical_path.split("/")
@@ -244,16 +283,14 @@ class ClientThread(Thread):
             file_name = lst[-1].split(".")[0]
             extension = None
 
-        directory = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db_connection), path=dir_path)
+        directory = self.__fetch_directory(path_owner, dir_path)
 
         if directory is None:
             self.session.transfer_data(INVALID_PATH)
             self.session.close()
             return
 
-        file = File.fetch_by_dir_title_extension(title=file_name, extension=extension, dir_id=directory.id,
-                                                 db=self.db_connection)
+        file = self.__fetch_file(directory, title=file_name, extension=extension)
         if file is None:
             self.session.transfer_data(FILE_DOES_NOT_EXIST)
             self.session.close()
@@ -264,9 +301,11 @@ class ClientThread(Thread):
             self.session.close()
             return
 
-        for chunk in file.chunks:
+        stored_file = File(db=self.db_connection, id=file.id)
+        for chunk in stored_file.chunks:
             self.storage.remove_chunk_file(chunk.local_path, db=self.db_connection)
-        file.delete()
+        stored_file.delete()
+        self.__record((Namespace.REMOVE_FILE, file.id))
         self.session.transfer_data(ACCEPT)
         self.session.close()
 
@@ -276,22 +315,21 @@ class ClientThread(Thread):
         ))
 
     def create_directory(self, message):
-        meta_data = dict(parse.parse(CREATE_DIR, message).named)
+        meta_data = MessageCodec.decode(CREATE_DIR, message)
         username = meta_data.get("username")
         lst = meta_data.get("path").split("/")
         path_owner = lst[0]
         new_dir_name = lst[-1]
         dir_path = "/".join(lst[1:-1])
 
-        directory = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db_connection), path=dir_path)
+        directory = self.__fetch_directory(path_owner, dir_path)
 
         if directory is None:
             self.session.transfer_data(INVALID_PATH)
             self.session.close()
             return
 
-        if new_dir_name in [x.title for x in directory.children]:
+        if directory.has_child(new_dir_name):
             self.session.transfer_data(DUPLICATE_DIR_NAME)
             self.session.close()
             return
@@ -305,18 +343,108 @@ class ClientThread(Thread):
         self.session.transfer_data(ACCEPT)
         self.session.close()
 
-        new_dir = Directory(db=self.db_connection, title=new_dir_name, parent_directory_id=directory.id)
-        new_dir.save()
-        Permission(db=self.db_connection, perm=Permission.OWNER, directory_id=new_dir.id,
-                   user_id=User.fetch_by_username(username=username, db=self.db_connection).id).save()
+        user = self.__fetch_user(username)
+        with self.db_connection.transaction():
+            new_dir = Directory(db=self.db_connection, title=new_dir_name, parent_directory_id=directory.id)
+            new_dir.save()
+            Permission(db=self.db_connection, perm=Permission.OWNER, directory_id=new_dir.id, user_id=user.id).save()
+        self.__record((Namespace.NEW_DIRECTORY, new_dir.id, new_dir.title, new_dir.parent_directory_id, new_dir.path),
+                      (Namespace.DIRECTORY_PERMISSION, new_dir.id, user.id, username, Permission.OWNER))
 
         self.storage.controller.inform_modification(NEW_DIR.format(path=meta_data.get("path"), username=username,
                                                                    signature=self.ip_address))
 
     def get_file(self, message):
-        meta_data = dict(parse.parse(GET_FILE, message).named)
-        username = meta_data.get("username")
-        logical_path = meta_data.get("path")
+        meta_data = MessageCodec.decode(GET_FILE, message)
+        file = self.__fetch_readable_file(username=meta_data.get("username"), logical_path=meta_data.get("path"))
+        if file is None:
+            return
+
+        replicas = self.__collect_replicas(file)
+        if len(replicas) != file.sequence_num:
+            self.session.transfer_data(CORRUPTED_FILE)
+            self.session.close()
+            return
+
+        """
+        result structure is as followed:
+        result = [(sequence, chunk_size, [(ip_address, rack_number, load), ...], file_id, version), ...]
+        """
+        result = []
+        for sequence in sorted(replicas):
+            chunk_size, chunk_replicas, checksums = replicas[sequence]
+            self.__record_read(chunk_replicas, chunk_size)
+            result.append((sequence, chunk_size, chunk_replicas, file.id, self.__chunk_version(checksums)))
+
+        self.session.transfer_data(pickle.dumps(result), encode=False)
+        self.session.close()
+
+    def get_file_range(self, message):
+        meta_data = MessageCodec.decode(GET_FILE_RANGE, message)
+        try:
+            offset = int(meta_data.get("offset"))
+            length = int(meta_data.get("length"))
+        except ValueError:
+            offset, length = -1, -1
+        if offset < 0 or length < 0:
+            self.session.transfer_data(INVALID_METADATA)
+            self.session.close()
+            return
+
+        file = self.__fetch_readable_file(username=meta_data.get("username"), logical_path=meta_data.get("path"))
+        if file is None:
+            return
+
+        replicas = self.__collect_replicas(file)
+        if len(replicas) != file.sequence_num:
+            self.session.transfer_data(CORRUPTED_FILE)
+            self.session.close()
+            return
+
+        """
+        range structure is as followed:
+        result = [(sequence, [(ip_address, rack_number, load), ...], offset_in_chunk, length), ...]
+        """
+        result = []
+        chunk_start = 0
+        for sequence in sorted(replicas):
+            chunk_size, chunk_replicas, checksums = replicas[sequence]
+            start = max(offset, chunk_start)
+            stop = min(offset + length, chunk_start + chunk_size)
+            if start < stop:
+                self.__record_read(chunk_replicas, stop - start)
+                result.append((sequence, chunk_replicas, start - chunk_start, stop - start))
+            chunk_start += chunk_size
+
+        self.session.transfer_data(pickle.dumps(result), encode=False)
+        self.session.close()
+
+    def __collect_replicas(self, file: File):
+        replicas = {}
+        for location in self.__chunk_locations(file):
+            chunk_size, chunk_replicas, checksums = replicas.setdefault(int(location.sequence),
+                                                                        (int(location.chunk_size), [], set()))
+            checksums.add(location.checksums)
+            if location.ip_address not in [x[0] for x in chunk_replicas]:
+                chunk_replicas.append((location.ip_address, location.rack_number,
+                                       round(self.READ_LOAD.load(location.ip_address), 3)))
+
+        for chunk_size, chunk_replicas, checksums in replicas.values():
+            chunk_replicas.sort(key=lambda x: x[2])
+        return replicas
+
+    @staticmethod
+    def __chunk_version(checksums):
+        if len(checksums) != 1 or None in checksums:
+            return None
+        return hashlib.blake2b(next(iter(checksums)), digest_size=8).hexdigest()
+
+    def __record_read(self, chunk_replicas, byte_size):
+        for ip_address, rack_number, load in chunk_replicas:
+            self.READ_LOAD.record(ip_address, byte_size,
+                                  weight=byte_size / self.storage.CHUNK_SIZE / len(chunk_replicas))
+
+    def __fetch_readable_file(self, username, logical_path):
         lst = logical_path.split("/")
         path_owner = lst[0]
         dir_path = "/".join(lst[1:-1])
@@ -328,56 +456,48 @@ class ClientThread(Thread):
             file_name = lst[-1].split(".")[0]
             extension = None
 
-        directory = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db_connection), path=dir_path)
+        directory = self.__fetch_directory(path_owner, dir_path)
 
         if directory is None:
             self.session.transfer_data(INVALID_PATH)
             self.session.close()
-            return
+            return None
 
-        file = File.fetch_by_dir_title_extension(dir_id=directory.id, title=file_name, extension=extension,
-                                                 db=self.db_connection)
+        file = self.__fetch_file(directory, title=file_name, extension=extension)
         if file is None:
             self.session.transfer_data(FILE_DOES_NOT_EXIST)
             self.session.close()
-            return
+            return None
 
         if file.get_user_permission(username) not in [Permission.READ_WRITE, Permission.READ_ONLY, Permission.OWNER]:
             self.session.transfer_data(NO_PERMISSION)
             self.session.close()
-            return
-
-        chunks = file.chunks
-        result = []
-        for chunk in chunks:
-            if chunk.sequence not in [x[0] for x in result]:
-                result.append((chunk.sequence, chunk.data_node.ip_address))
+            return None
 
-        if len(result) != file.sequence_num:
-            self.session.transfer_data(CORRUPTED_FILE)
-            self.session.close()
-            return
-
-        self.session.transfer_data(pickle.dumps(result), encode=False)
-        self.session.close()
+        return file
 
     def create_account(self):
         credentials = self.session.receive_data()
-        meta_data = dict(parse.parse(CREDENTIALS, credentials).named)
+        meta_data = MessageCodec.decode(CREDENTIALS, credentials)
         username = meta_data.get("username")
         password = meta_data.get("password")
 
         with self.DATABASE_LOCK:
-            user = User.fetch_by_username(username=username, db=self.db_connection)
+            user = self.__fetch_user(username)
             if user is None:
-                user = User(db=self.db_connection, username=username, password=password)
-                user.save()
-                main_directory = Directory(db=self.db_connection, title=Directory.MAIN_DIR_NAME)
-                main_directory.save()
-                permission = Permission(db=self.db_connection, directory_id=main_directory.id, user_id=user.id,
-                                        perm=Permission.OWNER)
-                permission.save()
+                with self.db_connection.transaction():
+                    user = User(db=self.db_connection, username=username, password=password)
+                    user.save()
+                    main_directory = Directory(db=self.db_connection, title=Directory.MAIN_DIR_NAME,
+                                               path=Directory.main_directory_path(username))
+                    main_directory.save()
+                    permission = Permission(db=self.db_connection, directory_id=main_directory.id, user_id=user.id,
+                                            perm=Permission.OWNER)
+                    permission.save()
+                self.__record((Namespace.NEW_USER, user.id, username, password),
+                              (Namespace.NEW_DIRECTORY, main_directory.id, main_directory.title, None,
+                               main_directory.path),
+                              (Namespace.DIRECTORY_PERMISSION, main_directory.id, user.id, username, Permission.OWNER))
                 self.storage.controller.inform_modification(NEW_USER.format(username=username, password=password,
                                                                             signature=self.ip_address))
                 self.session.transfer_data(ACCEPT)
@@ -388,11 +508,11 @@ class ClientThread(Thread):
 
     def login(self):
         credentials = self.session.receive_data()
-        meta_data = dict(parse.parse(CREDENTIALS, credentials).named)
+        meta_data = MessageCodec.decode(CREDENTIALS, credentials)
         username = meta_data.get("username")
         password = meta_data.get("password")
 
-        user = User.fetch_by_username(username=username, db=self.db_connection)
+        user = self.__fetch_user(username)
         if user is None:
             self.session.transfer_data(USER_NOT_FOUND)
             self.session.close()
@@ -405,13 +525,12 @@ class ClientThread(Thread):
         self.session.close()
 
     def create_file(self, command):
-        meta_data = dict(parse.parse(CREATE_FILE, command).named)
+        meta_data = MessageCodec.decode(CREATE_FILE, command)
         username = meta_data.get("username")
         path_owner = meta_data.get("path").split("/")[0]
         path = "/".join(meta_data.get("path").split("/")[1:])
 
-        requested_dir = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db_connection), path=path)
+        requested_dir = self.__fetch_directory(path_owner, path)
 
         if requested_dir is None:
             self.session.transfer_data(INVALID_PATH)
@@ -424,8 +543,8 @@ class ClientThread(Thread):
             self.session.close()
             return
 
-        if File.fetch_by_dir_title_extension(dir_id=requested_dir.id, title=meta_data.get("title"),
-                                             extension=meta_data.get("extension"), db=self.db_connection) is not None:
+        if self.__fetch_file(requested_dir, title=meta_data.get("title"),
+                             extension=meta_data.get("extension")) is not None:
             self.session.transfer_data(DUPLICATE_FILE_FOR_USER)
             self.session.close()
             return
@@ -448,9 +567,13 @@ class ClientThread(Thread):
             self.session.transfer_data(ACCEPT)
             self.session.transfer_data(pickle.dumps(data_nodes), encode=False)
             self.session.close()
-            user = User.fetch_by_username(username=username, db=self.db_connection)
-            file = File(db=self.db_connection, title=meta_data.get("title"), is_complete=False,
-                        extension=meta_data.get("extension"), directory_id=requested_dir.id,
-                        sequence_num=len(data_nodes))
-            file.save()
-            Permission(db=self.db_connection, perm=Permission.OWNER, file_id=file.id, user_id=user.id).save()
+            user = self.__fetch_user(username)
+            with self.db_connection.transaction():
+                file = File(db=self.db_connection, title=meta_data.get("title"), is_complete=False,
+                            extension=meta_data.get("extension"), directory_id=requested_dir.id,
+                            sequence_num=len(data_nodes))
+                file.save()
+                Permission(db=self.db_connection, perm=Permission.OWNER, file_id=file.id, user_id=user.id).save()
+            self.__record((Namespace.NEW_FILE, file.id, file.title, file.extension, file.directory_id,
+                           file.sequence_num),
+                          (Namespace.FILE_PERMISSION, file.id, user.id, username, Permission.OWNER))
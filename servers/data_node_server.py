@@ -1,22 +1,25 @@
 import os
 
+from codec.codec import MessageCodec, MessageDispatcher
 from meta_data.database import MetaDatabase
 from meta_data.models.chunk import Chunk
 from meta_data.models.data_node import DataNode
 from meta_data.models.directory import Directory
 from meta_data.models.file import File
 from meta_data.models.permission import Permission
-from valid_messages import (CREATE_CHUNK, INVALID_METADATA, MESSAGE_SEPARATOR, OUT_OF_SPACE,
+from valid_messages import (CREATE_CHUNK, INVALID_METADATA, OUT_OF_SPACE,
                             ACCEPT, REJECT, NEW_CHUNK, NO_PERMISSION, DUPLICATE_CHUNK_FOR_FILE, GET_CHUNK,
-                            CHUNK_NOT_FOUND, INVALID_PATH, REPLICATE_CHUNK)
+                            CHUNK_NOT_FOUND, INVALID_PATH, REPLICATE_CHUNK, GET_CHUNK_PLAIN, ACCEPT_PLAIN,
+                            OPEN_CHANNEL, REPLICATE_CHUNK_PIPELINE, REPLICATION_ACK, NULL, GET_CHUNK_RANGE,
+                            RESUME_REPLICATION)
+from session.channels import MultiplexedChannel
 from session.sessions import EncryptedSession, FileSession
 from singleton.singleton import Singleton
 from threading import Thread, Lock
 from time import time, sleep
 import socket
-import parse
 
-from storage.exceptions import NotEnoughSpace
+from storage.exceptions import NotEnoughSpace, CorruptedChunk
 
 
 class DataNodeServer(metaclass=Singleton):
@@ -24,8 +27,10 @@ class DataNodeServer(metaclass=Singleton):
     MAXIMUM_CLIENT_HANDLE_TIME = 5 * 60
     CONTROLLER_INTERVAL = 10
 
-    def __init__(self, ip_address, storage):
+    def __init__(self, ip_address, storage, reuse_port=False):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((ip_address, self.DATA_NODE_PORT_NUMBER))
         self.active_clients = []
         self.active_clients_lock = Lock()
@@ -65,64 +70,129 @@ class DataNodeServer(metaclass=Singleton):
 
 
 class ClientThread(Thread):
-    def __init__(self, client_data, storage, *args, **kwargs):
+    def __init__(self, client_data, storage, session=None, detach_channel=False, stream_runner=None, *args, **kwargs):
         super(ClientThread, self).__init__(*args, **kwargs)
         self.client_data = client_data
         self.storage = storage
-        self.session = None
+        self.session = session
+        self.multiplexed = session is not None
+        self.detach_channel = detach_channel
+        self.stream_runner = stream_runner
         self.db = None
         self.ip_address = self.storage.current_data_node.ip_address
+        self.dispatcher = MessageDispatcher({
+            CREATE_CHUNK: self.create_chunk,
+            GET_CHUNK: lambda message: self.get_chunk(MessageCodec.decode(GET_CHUNK, message)),
+            GET_CHUNK_PLAIN: lambda message: self.get_chunk(MessageCodec.decode(GET_CHUNK_PLAIN, message), plain=True),
+            GET_CHUNK_RANGE: lambda message: self.get_chunk(MessageCodec.decode(GET_CHUNK_RANGE, message)),
+            REPLICATE_CHUNK: lambda message: self.replicate(
+                MessageCodec.decode(REPLICATE_CHUNK, message).get("create_chunk_message")),
+            REPLICATE_CHUNK_PIPELINE: self.replicate_pipeline,
+        })
+        if not self.multiplexed:
+            self.dispatcher.register(OPEN_CHANNEL, lambda message: self.serve_channel())
 
     def run(self):
         self.db = MetaDatabase()
-        self.session = EncryptedSession(input_socket=self.client_data.get("socket"), is_server=True)
+        if self.session is None:
+            self.session = EncryptedSession(input_socket=self.client_data.get("socket"), is_server=True)
         message = self.session.receive_data()
-        command = message.split(MESSAGE_SEPARATOR)[0]
+        if message is None:
+            self.session.close()
+            return
+        self.dispatcher.dispatch(message)
+
+    def serve_channel(self):
+        self.session.transfer_data(ACCEPT)
+        if self.detach_channel:
+            channel_thread = Thread(target=self.__serve_channel, args=[])
+            channel_thread.daemon = True
+            channel_thread.start()
+        else:
+            self.__serve_channel()
+
+    def __serve_channel(self):
+        channel = MultiplexedChannel(self.session, on_new_stream=self.__handle_stream)
+        channel.serve()
+        self.session.close()
 
-        if command == CREATE_CHUNK.split(MESSAGE_SEPARATOR)[0]:
-            self.create_chunk(message)
-        elif command == GET_CHUNK.split(MESSAGE_SEPARATOR)[0]:
-            self.get_chunk(message)
-        elif command == REPLICATE_CHUNK.split(MESSAGE_SEPARATOR)[0]:
-            self.replicate(MESSAGE_SEPARATOR.join(message.split(MESSAGE_SEPARATOR)[1:]))
+    def __handle_stream(self, stream):
+        handler = ClientThread(self.client_data, self.storage, session=stream)
+        if self.stream_runner is not None:
+            self.stream_runner(handler)
+        else:
+            handler.start()
+
+    def replicate_pipeline(self, message):
+        meta_data = MessageCodec.decode(REPLICATE_CHUNK_PIPELINE, message)
+        pipeline = meta_data.get("pipeline")
+        self.replicate(meta_data.get("create_chunk_message"),
+                       pipeline=[] if pipeline == NULL else pipeline.split(FileSession.PIPELINE_SEPARATOR))
 
-    def replicate(self, message):
+    def replicate(self, message, pipeline=None):
         if self.client_data["ip_address"] not in [x.ip_address for x in DataNode.fetch_all(db=self.db)]:
             self.session.transfer_data(REJECT)
             self.session.close()
             return
 
-        meta_data = dict(parse.parse(CREATE_CHUNK, message).named)
-
-        try:
-            self.storage.update_byte_size(-int(meta_data.get("chunk_size")), self.db)
-        except NotEnoughSpace:
-            self.session.transfer_data(OUT_OF_SPACE)
-            self.session.close()
-            return
+        meta_data = MessageCodec.decode(CREATE_CHUNK, message)
 
         path_owner = meta_data.get("path").split("/")[0]
         path = "/".join(meta_data.get("path").split("/")[1:])
 
-        requested_dir = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=path)
+        requested_dir = Directory.fetch_by_path(path_owner, path, db=self.db)
 
         file = File.fetch_by_dir_title_extension(dir_id=requested_dir.id, title=meta_data.get("title"),
                                                  extension=meta_data.get("extension"), db=self.db)
         if file is None:
             self.session.transfer_data(REJECT)
             self.session.close()
+            return
 
-        self.session.transfer_data(ACCEPT)
+        if Chunk.fetch_by_file_id_data_node_id_sequence(file_id=file.id, data_node_id=self.storage.current_data_node.id,
+                                                        sequence=meta_data.get("sequence"), db=self.db) is not None:
+            self.session.transfer_data(DUPLICATE_CHUNK_FOR_FILE)
+            self.session.close()
+            return
 
-        destination_file_path = self.storage.get_new_file_path()
-        file_session = FileSession()
-        file_session.receive_file(destination_file_path, session=self.session)
+        try:
+            self.storage.update_byte_size(-int(meta_data.get("chunk_size")), self.db)
+        except NotEnoughSpace:
+            self.session.transfer_data(OUT_OF_SPACE)
+            self.session.close()
+            return
+
+        if pipeline is None:
+            receive_path, offset = self.storage.get_new_file_path(), 0
+            self.session.transfer_data(ACCEPT)
+        else:
+            receive_path, offset = self.storage.get_resumable_file(file.id, meta_data.get("sequence"))
+            self.session.transfer_data(RESUME_REPLICATION.format(offset=offset) if offset else ACCEPT)
+
+        file_session = FileSession(replication_pool=self.storage.replication_pool,
+                                   replication_window_size=self.storage.replication_window_size)
+        try:
+            file_session.receive_file(receive_path, session=self.session, replication_list=pipeline,
+                                      create_chunk_message=message, pipeline=True, offset=offset)
+        except ConnectionResetError:
+            self.session.close()
+            if pipeline is None and os.path.isfile(receive_path):
+                os.remove(receive_path)
+            self.storage.update_byte_size(int(meta_data.get("chunk_size")), self.db)
+            return
+
+        destination_file_path = receive_path
+        if pipeline is not None:
+            destination_file_path = self.storage.get_new_file_path()
+            os.replace(receive_path, destination_file_path)
+
+            self.session.transfer_data(REPLICATION_ACK.format(replicas=FileSession.PIPELINE_SEPARATOR.join(
+                [self.ip_address] + file_session.replicated_addresses)))
         self.session.close()
 
         Chunk(db=self.db, sequence=meta_data.get("sequence"), local_path=destination_file_path,
               chunk_size=meta_data.get("chunk_size"), data_node_id=self.storage.current_data_node.id,
-              file_id=file.id).save()
+              file_id=file.id, checksums=file_session.checksums).save()
 
         self.storage.controller.inform_modification(
             NEW_CHUNK.format(ip_address=self.storage.current_data_node.ip_address,
@@ -135,8 +205,7 @@ class ClientThread(Thread):
                              signature=self.ip_address
                              ))
 
-    def get_chunk(self, message):
-        meta_data = dict(parse.parse(GET_CHUNK, message).named)
+    def get_chunk(self, meta_data, plain=False):
         username = meta_data.get("username")
         logical_path = meta_data.get("path")
         sequence = meta_data.get("sequence")
@@ -151,15 +220,19 @@ class ClientThread(Thread):
             file_name = lst[-1].split(".")[0]
             extension = None
 
-        directory = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=dir_path)
+        directory = Directory.fetch_by_path(path_owner, dir_path, db=self.db)
 
         if directory is None:
             self.session.transfer_data(INVALID_PATH)
             self.session.close()
             return
 
-        file = list(filter(lambda x: x.title == file_name and x.extension == extension, directory.files))[0]
+        file = File.fetch_by_dir_title_extension(dir_id=directory.id, title=file_name, extension=extension, db=self.db)
+        if file is None:
+            self.session.transfer_data(CHUNK_NOT_FOUND)
+            self.session.close()
+            return
+
         if file.get_user_permission(username) not in [Permission.READ_WRITE, Permission.READ_ONLY, Permission.OWNER]:
             self.session.transfer_data(NO_PERMISSION)
             self.session.close()
@@ -173,14 +246,38 @@ class ClientThread(Thread):
             self.session.close()
             return
 
+        try:
+            offset = int(meta_data.get("offset", 0))
+            length = int(meta_data.get("length", int(requested_chunk.chunk_size) - offset))
+        except ValueError:
+            offset, length = -1, -1
+        if offset < 0 or length < 0 or offset + length > int(requested_chunk.chunk_size):
+            self.session.transfer_data(INVALID_METADATA)
+            self.session.close()
+            return
+
+        if plain and not self.multiplexed and self.storage.controller.plain_transfer_policy.is_trusted(self.ip_address,
+                                                                              self.client_data["ip_address"]):
+            self.session.transfer_data(ACCEPT_PLAIN)
+            plain_session = self.session.convert_to_simple_session()
+            file_session = FileSession()
+            file_session.transfer_file_plain(requested_chunk.local_path, session=plain_session, offset=offset,
+                                             size=length)
+            plain_session.close()
+            return
+
         self.session.transfer_data(ACCEPT)
-        file_session = FileSession()
-        file_session.transfer_file(requested_chunk.local_path, session=self.session)
+        file_session = FileSession(block_cache=self.storage.block_cache)
+        try:
+            file_session.transfer_file(requested_chunk.local_path, session=self.session, offset=offset,
+                                       size=length, checksums=requested_chunk.checksums)
+        except CorruptedChunk:
+            self.storage.report_corrupted_chunk(requested_chunk, self.db)
         self.session.close()
 
     def create_chunk(self, message):
         try:
-            meta_data = dict(parse.parse(CREATE_CHUNK, message).named)
+            meta_data = MessageCodec.decode(CREATE_CHUNK, message)
         except ValueError:
             self.session.transfer_data(INVALID_METADATA)
             self.session.close()
@@ -197,8 +294,7 @@ class ClientThread(Thread):
         path_owner = meta_data.get("path").split("/")[0]
         path = "/".join(meta_data.get("path").split("/")[1:])
 
-        requested_dir = Directory.find_path_directory(
-            main_dir=Directory.fetch_user_main_directory(username=path_owner, db=self.db), path=path)
+        requested_dir = Directory.fetch_by_path(path_owner, path, db=self.db)
 
         if requested_dir is None:
             self.session.transfer_data(INVALID_PATH)
@@ -225,16 +321,25 @@ class ClientThread(Thread):
         self.session.transfer_data(ACCEPT)
 
         destination_file_path = self.storage.get_new_file_path()
-        file_session = FileSession()
-        file_session.receive_file(destination_file_path, session=self.session,
-                                  replication_list=self.storage.get_replication_data_nodes(
-                                      chunk_size=int(meta_data.get("chunk_size")), db=self.db),
-                                  create_chunk_message=message)
+        file_session = FileSession(replication_pool=self.storage.replication_pool,
+                                   replication_window_size=self.storage.replication_window_size)
+        try:
+            file_session.receive_file(destination_file_path, session=self.session,
+                                      replication_list=self.storage.get_replication_data_nodes(
+                                          chunk_size=int(meta_data.get("chunk_size")), db=self.db),
+                                      create_chunk_message=message,
+                                      pipeline=self.storage.pipeline_replication)
+        except ConnectionResetError:
+            self.session.close()
+            if os.path.isfile(destination_file_path):
+                os.remove(destination_file_path)
+            self.storage.update_byte_size(int(meta_data.get("chunk_size")), self.db)
+            return
         self.session.close()
 
         Chunk(db=self.db, sequence=meta_data.get("sequence"), local_path=destination_file_path,
               chunk_size=meta_data.get("chunk_size"), data_node_id=self.storage.current_data_node.id,
-              file_id=file.id).save()
+              file_id=file.id, checksums=file_session.checksums).save()
 
         self.storage.controller.inform_modification(
             NEW_CHUNK.format(ip_address=self.storage.current_data_node.ip_address,
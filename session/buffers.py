@@ -0,0 +1,157 @@
+import bisect
+import socket
+from threading import Lock, Condition
+
+
+class BufferPool:
+    GRANULARITY = 64 * 1024
+    MAXIMUM_IDLE_BUFFERS = 16
+    MAXIMUM_IDLE_BYTES = 64 * 2 ** 20
+
+    def __init__(self):
+        self.idle_buffers = {}
+        self.idle_bytes = 0
+        self.lock = Lock()
+
+    def size_class(self, size):
+        return max(1, -(-size // self.GRANULARITY)) * self.GRANULARITY
+
+    def acquire(self, size):
+        capacity = self.size_class(size)
+        with self.lock:
+            buffers = self.idle_buffers.get(capacity)
+            if buffers:
+                self.idle_bytes -= capacity
+                return buffers.pop()
+        return bytearray(capacity)
+
+    def release(self, buffer):
+        capacity = len(buffer)
+        with self.lock:
+            buffers = self.idle_buffers.setdefault(capacity, [])
+            if len(buffers) < self.MAXIMUM_IDLE_BUFFERS and self.idle_bytes + capacity <= self.MAXIMUM_IDLE_BYTES:
+                buffers.append(buffer)
+                self.idle_bytes += capacity
+
+
+class SocketIO:
+    HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+    @staticmethod
+    def receive_exactly(sock, view):
+        bytes_read = 0
+        while bytes_read < len(view):
+            received = sock.recv_into(view[bytes_read:])
+            if received == 0:
+                break
+            bytes_read += received
+        return bytes_read
+
+    @staticmethod
+    def send_vectored(sock, *buffers):
+        if not SocketIO.HAS_SENDMSG:
+            sock.sendall(b"".join(buffers))
+            return
+
+        views = [memoryview(buffer).cast("B") for buffer in buffers if len(buffer) != 0]
+        while views:
+            sent = sock.sendmsg(views)
+            while sent > 0:
+                if sent >= len(views[0]):
+                    sent -= len(views[0])
+                    views.pop(0)
+                else:
+                    views[0] = views[0][sent:]
+                    sent = 0
+
+
+class ReplicationWindow:
+    DEFAULT_CAPACITY = 8 * 2 ** 20
+
+    def __init__(self, backing_path, capacity=DEFAULT_CAPACITY, start_offset=0):
+        self.backing_path = backing_path
+        self.capacity = capacity
+        self.frames = []
+        self.frame_offsets = []
+        self.head = 0
+        self.base_offset = start_offset
+        self.end_offset = start_offset
+        self.reader_offsets = {}
+        self.next_reader = 0
+        self.closed = False
+        self.condition = Condition(Lock())
+
+    def register_reader(self):
+        with self.condition:
+            reader = self.next_reader
+            self.next_reader += 1
+            self.reader_offsets[reader] = 0
+            return reader
+
+    def release_reader(self, reader):
+        with self.condition:
+            self.reader_offsets.pop(reader, None)
+            self.__trim()
+            self.condition.notify_all()
+
+    def rewind(self, reader, offset=0):
+        with self.condition:
+            self.reader_offsets[reader] = offset
+
+    def append(self, data):
+        with self.condition:
+            while self.reader_offsets and self.end_offset - min(self.reader_offsets.values()) >= self.capacity:
+                self.condition.wait()
+            self.frames.append(data)
+            self.frame_offsets.append(self.end_offset)
+            self.end_offset += len(data)
+            self.__trim()
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def read(self, reader, size):
+        with self.condition:
+            offset = self.reader_offsets[reader]
+            while offset >= self.end_offset and not self.closed:
+                self.condition.wait()
+            if offset >= self.end_offset:
+                return None
+
+            if offset < self.base_offset:
+                size = min(size, self.base_offset - offset)
+                data = None
+            else:
+                index = bisect.bisect_right(self.frame_offsets, offset, lo=self.head) - 1
+                start = offset - self.frame_offsets[index]
+                data = self.frames[index][start:start + size]
+                self.reader_offsets[reader] = offset + len(data)
+                self.__trim()
+                self.condition.notify_all()
+                return data
+
+        with open(self.backing_path, "rb") as backing_file:
+            backing_file.seek(offset)
+            data = backing_file.read(size)
+        with self.condition:
+            if reader in self.reader_offsets:
+                self.reader_offsets[reader] = offset + len(data)
+                self.__trim()
+                self.condition.notify_all()
+        return data
+
+    def __trim(self):
+        minimum_offset = min(self.reader_offsets.values()) if self.reader_offsets else self.end_offset
+        while self.head < len(self.frames) and self.frame_offsets[self.head] + len(
+                self.frames[self.head]) <= minimum_offset:
+            self.frames[self.head] = None
+            self.head += 1
+            self.base_offset = self.frame_offsets[self.head] if self.head < len(self.frames) else self.end_offset
+
+        if self.head > 1024 and self.head * 2 > len(self.frames):
+            del self.frames[:self.head]
+            del self.frame_offsets[:self.head]
+            self.head = 0
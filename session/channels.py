@@ -0,0 +1,352 @@
+import queue
+import socket
+from threading import Thread, Lock, Event, Condition
+from time import monotonic, sleep
+
+from session.sessions import EncryptedSession
+from valid_messages import OPEN_CHANNEL, ACCEPT
+
+
+class ChannelStream:
+    def __init__(self, channel, stream_id):
+        self.channel = channel
+        self.stream_id = stream_id
+        self.inbox = queue.Queue()
+        self.ip_address = channel.session.ip_address
+        self.port_number = channel.session.port_number
+        self.MDU = channel.session.MDU - channel.HEADER_BYTE_NUMBER
+        self.closed = False
+        self.remote_closed = False
+        self.send_credit = channel.STREAM_WINDOW
+        self.credit_condition = Condition()
+        self.consumed_frames = 0
+
+    def transfer_data(self, data, encode=True):
+        with self.credit_condition:
+            while self.send_credit == 0 and not self.closed and not self.remote_closed:
+                self.credit_condition.wait()
+            if self.closed or self.remote_closed:
+                raise ConnectionResetError
+            self.send_credit -= 1
+
+        if encode:
+            data = data.encode()
+
+        self.channel.send_frame(self.stream_id, MultiplexedChannel.DATA, data)
+
+    def grant_credit(self, frames):
+        with self.credit_condition:
+            self.send_credit += frames
+            self.credit_condition.notify_all()
+
+    def __next_frame(self):
+        data = self.inbox.get()
+        if data is None:
+            self.inbox.put(None)
+            return None
+
+        self.consumed_frames += 1
+        if self.consumed_frames >= self.channel.WINDOW_UPDATE_THRESHOLD and not self.closed:
+            self.channel.send_window_update(self, self.consumed_frames)
+            self.consumed_frames = 0
+        return data
+
+    def receive_data(self, decode=True):
+        data = self.__next_frame()
+
+        if data is None:
+            return None
+
+        if decode:
+            return data.decode()
+        return data
+
+    def receive_data_into(self, buffer):
+        data = self.__next_frame()
+
+        if data is None:
+            return 0
+
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        with self.credit_condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.credit_condition.notify_all()
+
+        self.channel.close_stream(self)
+        self.inbox.put(None)
+
+    def end(self):
+        with self.credit_condition:
+            self.remote_closed = True
+            self.credit_condition.notify_all()
+        self.inbox.put(None)
+
+
+class MultiplexedChannel:
+    STREAM_ID_BYTE_NUMBER = 4
+    HEADER_BYTE_NUMBER = STREAM_ID_BYTE_NUMBER + 1
+    STREAM_ID_BYTE_ORDER = "big"
+    STREAM_WINDOW = 16
+    WINDOW_UPDATE_THRESHOLD = STREAM_WINDOW // 2
+    WINDOW_UPDATE_BYTE_NUMBER = 4
+    CONTROL_STREAM_ID = 0
+    DATA = 0
+    END = 1
+    PING = 2
+    PONG = 3
+    WINDOW_UPDATE = 4
+
+    def __init__(self, session: EncryptedSession, on_new_stream=None):
+        self.session = session
+        self.on_new_stream = on_new_stream
+        self.streams = {}
+        self.streams_lock = Lock()
+        self.send_lock = Lock()
+        self.pong_received = Event()
+        self.next_stream_id = 1
+        self.highest_remote_stream_id = 0
+        self.is_alive = True
+        self.last_used = monotonic()
+        self.reader_thread = None
+
+    def start(self):
+        self.reader_thread = Thread(target=self.serve, args=[])
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def open_stream(self):
+        with self.streams_lock:
+            if not self.is_alive:
+                raise ConnectionResetError
+
+            stream = ChannelStream(self, self.next_stream_id)
+            self.streams[stream.stream_id] = stream
+            self.next_stream_id += 1
+            self.last_used = monotonic()
+        return stream
+
+    @property
+    def is_idle(self):
+        with self.streams_lock:
+            return len(self.streams) == 0
+
+    def ping(self, timeout):
+        self.pong_received.clear()
+        try:
+            self.send_frame(self.CONTROL_STREAM_ID, self.PING)
+        except OSError:
+            return False
+        return self.pong_received.wait(timeout)
+
+    def send_frame(self, stream_id, frame_type, payload=b""):
+        header = stream_id.to_bytes(length=self.STREAM_ID_BYTE_NUMBER, byteorder=self.STREAM_ID_BYTE_ORDER,
+                                    signed=False) + bytes([frame_type])
+        with self.send_lock:
+            self.session.transfer_data(header + payload, encode=False)
+
+    def send_window_update(self, stream, frames):
+        try:
+            self.send_frame(stream.stream_id, self.WINDOW_UPDATE,
+                            frames.to_bytes(length=self.WINDOW_UPDATE_BYTE_NUMBER,
+                                            byteorder=self.STREAM_ID_BYTE_ORDER, signed=False))
+        except OSError:
+            pass
+
+    def close_stream(self, stream):
+        with self.streams_lock:
+            self.streams.pop(stream.stream_id, None)
+            self.last_used = monotonic()
+
+        try:
+            self.send_frame(stream.stream_id, self.END)
+        except OSError:
+            pass
+
+    def close(self):
+        self.is_alive = False
+        self.session.close()
+
+    def __route_frame(self, frame):
+        stream_id = int.from_bytes(frame[:self.STREAM_ID_BYTE_NUMBER], byteorder=self.STREAM_ID_BYTE_ORDER,
+                                   signed=False)
+        frame_type = frame[self.STREAM_ID_BYTE_NUMBER]
+        is_new_stream = False
+
+        if frame_type == self.PING:
+            self.send_frame(self.CONTROL_STREAM_ID, self.PONG)
+            return
+        if frame_type == self.PONG:
+            self.pong_received.set()
+            return
+
+        with self.streams_lock:
+            stream = self.streams.get(stream_id)
+            if stream is None and self.on_new_stream is not None and stream_id > self.highest_remote_stream_id:
+                self.highest_remote_stream_id = stream_id
+                stream = ChannelStream(self, stream_id)
+                self.streams[stream_id] = stream
+                is_new_stream = True
+
+        if stream is None:
+            return
+
+        if is_new_stream:
+            self.on_new_stream(stream)
+
+        if frame_type == self.END:
+            stream.end()
+        elif frame_type == self.WINDOW_UPDATE:
+            stream.grant_credit(int.from_bytes(frame[self.HEADER_BYTE_NUMBER:], byteorder=self.STREAM_ID_BYTE_ORDER,
+                                               signed=False))
+        elif stream.inbox.qsize() >= self.STREAM_WINDOW:
+            stream.close()
+        else:
+            stream.inbox.put(frame[self.HEADER_BYTE_NUMBER:])
+
+    def serve(self):
+        try:
+            while True:
+                frame = self.session.receive_data(decode=False)
+                if frame is None:
+                    break
+                self.__route_frame(frame)
+        except Exception as error:
+            if not isinstance(error, OSError):
+                print(f"Channel to {self.session.ip_address} failed: {error!r}")
+        finally:
+            with self.streams_lock:
+                self.is_alive = False
+                streams = list(self.streams.values())
+                self.streams.clear()
+
+            for stream in streams:
+                stream.end()
+
+
+class ChannelPool:
+    CHANNEL_OPEN_TIMEOUT = 5
+    UNSUPPORTED_RETRY_INTERVAL = 60
+    IDLE_TIMEOUT = 2 * 60
+    HEALTH_CHECK_TIMEOUT = 5
+    MAINTENANCE_INTERVAL = 30
+
+    def __init__(self, port_number):
+        self.port_number = port_number
+        self.channels = {}
+        self.opening_channels = {}
+        self.unsupported_addresses = {}
+        self.lock = Lock()
+        self.maintenance_thread = None
+
+    def __open_channel(self, ip_address):
+        session = EncryptedSession(ip_address=ip_address, port_number=self.port_number)
+        session.transfer_data(OPEN_CHANNEL)
+        session.socket.settimeout(self.CHANNEL_OPEN_TIMEOUT)
+        try:
+            response = session.receive_data()
+        except socket.timeout:
+            response = None
+        session.socket.settimeout(None)
+
+        if response != ACCEPT:
+            session.close()
+            return None
+
+        channel = MultiplexedChannel(session)
+        channel.start()
+        return channel
+
+    def __is_unsupported(self, ip_address):
+        marked_at = self.unsupported_addresses.get(ip_address)
+        if marked_at is None:
+            return False
+        if monotonic() - marked_at >= self.UNSUPPORTED_RETRY_INTERVAL:
+            self.unsupported_addresses.pop(ip_address)
+            return False
+        return True
+
+    def __acquire_channel(self, ip_address):
+        while True:
+            with self.lock:
+                if self.__is_unsupported(ip_address):
+                    return None
+                channel = self.channels.get(ip_address)
+                if channel is not None and channel.is_alive:
+                    return channel
+                self.channels.pop(ip_address, None)
+
+                opening = self.opening_channels.get(ip_address)
+                if opening is None:
+                    self.opening_channels[ip_address] = Event()
+                    break
+
+            if not opening.wait(self.CHANNEL_OPEN_TIMEOUT):
+                return None
+
+        channel = None
+        unsupported = False
+        try:
+            channel = self.__open_channel(ip_address)
+            unsupported = channel is None
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            with self.lock:
+                self.opening_channels.pop(ip_address).set()
+                if unsupported:
+                    self.unsupported_addresses[ip_address] = monotonic()
+                elif channel is not None:
+                    self.channels[ip_address] = channel
+        return channel
+
+    def open_session(self, ip_address):
+        channel = self.__acquire_channel(ip_address)
+        if channel is not None:
+            try:
+                return channel.open_stream()
+            except ConnectionResetError:
+                with self.lock:
+                    if self.channels.get(ip_address) is channel:
+                        self.channels.pop(ip_address)
+
+        return EncryptedSession(ip_address=ip_address, port_number=self.port_number)
+
+    def evict_idle_channels(self):
+        with self.lock:
+            for ip_address, channel in list(self.channels.items()):
+                if not channel.is_alive or (channel.is_idle and monotonic() - channel.last_used >= self.IDLE_TIMEOUT):
+                    self.channels.pop(ip_address)
+                    channel.close()
+
+    def check_health(self):
+        with self.lock:
+            channels = [(ip_address, channel) for ip_address, channel in self.channels.items() if channel.is_idle]
+
+        for ip_address, channel in channels:
+            if not channel.ping(self.HEALTH_CHECK_TIMEOUT):
+                with self.lock:
+                    if self.channels.get(ip_address) is channel:
+                        self.channels.pop(ip_address)
+                channel.close()
+
+    def __maintenance_thread(self):
+        while True:
+            sleep(self.MAINTENANCE_INTERVAL)
+            self.evict_idle_channels()
+            self.check_health()
+
+    def start_maintenance(self):
+        self.maintenance_thread = Thread(target=self.__maintenance_thread, args=[])
+        self.maintenance_thread.daemon = True
+        self.maintenance_thread.start()
+
+    def close(self):
+        with self.lock:
+            for channel in self.channels.values():
+                channel.close()
+            self.channels.clear()
@@ -3,3 +3,17 @@ class PeerTimeOutException(Exception):
 
     def __init__(self):
         super().__init__(PeerTimeOutException.MESSAGE)
+
+
+class OversizedFrame(ConnectionResetError):
+    MESSAGE = "The peer sent a frame larger than the negotiated frame size"
+
+    def __init__(self):
+        super().__init__(OversizedFrame.MESSAGE)
+
+
+class DuplicateReplica(Exception):
+    MESSAGE = "The peer already stores this chunk"
+
+    def __init__(self):
+        super().__init__(DuplicateReplica.MESSAGE)
@@ -0,0 +1,29 @@
+import ipaddress
+
+
+class PlainTransferPolicy:
+    CONFIG_FIELD = "plain_transfer_networks"
+    NETWORK_SEPARATOR = ";"
+    DISABLED = "none"
+
+    def __init__(self, trusted_networks=None):
+        self.trusted_networks = []
+        if trusted_networks is not None and trusted_networks != self.DISABLED:
+            for network in trusted_networks.split(self.NETWORK_SEPARATOR):
+                if network != "":
+                    self.trusted_networks.append(ipaddress.ip_network(network))
+
+    @staticmethod
+    def from_config(config: dict):
+        return PlainTransferPolicy(config.get(PlainTransferPolicy.CONFIG_FIELD))
+
+    def is_trusted(self, local_ip_address, remote_ip_address):
+        if local_ip_address is None or remote_ip_address is None:
+            return False
+
+        local_ip_address = ipaddress.ip_address(local_ip_address)
+        remote_ip_address = ipaddress.ip_address(remote_ip_address)
+        for network in self.trusted_networks:
+            if local_ip_address in network and remote_ip_address in network:
+                return True
+        return False
@@ -1,20 +1,31 @@
+import mmap
 import os
 import socket
-from threading import Thread, Lock, Condition
+from threading import Thread, Lock
 
-from encryption.encryptors import RSAEncryption
-from session.exceptions import PeerTimeOutException
-from valid_messages import REPLICATE_CHUNK, ACCEPT
+from codec.codec import MessageCodec
+from encryption.encryptors import RSAEncryption, AEADEncryption
+from session.buffers import BufferPool, SocketIO, ReplicationWindow
+from session.exceptions import PeerTimeOutException, OversizedFrame, DuplicateReplica
+from storage.checksums import ChunkChecksum
+from storage.exceptions import CorruptedChunk
+from valid_messages import (REPLICATE_CHUNK, REPLICATE_CHUNK_PIPELINE, REPLICATION_ACK, ACCEPT, NULL,
+                            DUPLICATE_CHUNK_FOR_FILE, RESUME_REPLICATION)
 
 
 class EncryptedSession:
     MTU = 4096
     DATA_LENGTH_BYTE_NUMBER = 2
     MDU = MTU - DATA_LENGTH_BYTE_NUMBER
+    AEAD_DATA_LENGTH_BYTE_NUMBER = 4
     DATA_LENGTH_BYTE_ORDER = "big"
+    BUFFER_POOL = BufferPool()
 
     def __init__(self, is_server=False, **kwargs):
         self.is_server = is_server
+        self.send_lock = Lock()
+        self.maximum_data_length = None
+        self.data_length_buffer = bytearray(self.AEAD_DATA_LENGTH_BYTE_NUMBER)
         self.ip_address = kwargs.get("ip_address")
         self.port_number = kwargs.get("port_number")
 
@@ -33,52 +44,92 @@ class EncryptedSession:
             if is_server:
                 self.encryption_class = RSAEncryption.create_server_encryption(self.socket)
             else:
-                self.encryption_class = RSAEncryption.create_client_encryption(self.socket)
+                self.encryption_class = RSAEncryption.create_client_encryption(
+                    self.socket, frame_size=kwargs.get("frame_size", AEADEncryption.DEFAULT_FRAME_SIZE))
+
+        if isinstance(self.encryption_class, AEADEncryption):
+            self.DATA_LENGTH_BYTE_NUMBER = self.AEAD_DATA_LENGTH_BYTE_NUMBER
+            self.MDU = self.encryption_class.frame_size
+            self.maximum_data_length = self.encryption_class.maximum_encrypted_size
 
     def transfer_data(self, data, encode=True):
         if encode:
             data = data.encode()
 
-        encrypted_data = self.encryption_class.encrypt(data)
+        with self.send_lock:
+            encrypted_data = self.encryption_class.encrypt(data)
 
-        data_length = int(len(encrypted_data)).to_bytes(byteorder=self.DATA_LENGTH_BYTE_ORDER,
-                                                        length=self.DATA_LENGTH_BYTE_NUMBER,
-                                                        signed=False)
-        self.socket.sendall(data_length + encrypted_data)
+            data_length = int(len(encrypted_data)).to_bytes(byteorder=self.DATA_LENGTH_BYTE_ORDER,
+                                                            length=self.DATA_LENGTH_BYTE_NUMBER,
+                                                            signed=False)
+            SocketIO.send_vectored(self.socket, data_length, encrypted_data)
 
-    def receive_data(self, decode=True):
-        data_length = self.socket.recv(self.DATA_LENGTH_BYTE_NUMBER)
+    def __receive_data_length(self):
+        header = memoryview(self.data_length_buffer)[:self.DATA_LENGTH_BYTE_NUMBER]
+        bytes_read = SocketIO.receive_exactly(self.socket, header)
 
-        if len(data_length) == 0:
+        if bytes_read == 0:
             return None
+        if bytes_read < len(header):
+            raise ConnectionResetError
 
-        data_length = int.from_bytes(data_length,
-                                     byteorder=self.DATA_LENGTH_BYTE_ORDER,
-                                     signed=False)
-        bytes_read = 0
-        encrypted_data = b''
-        while bytes_read < data_length:
-            temp_encrypted_data = self.socket.recv(data_length - bytes_read)
-            encrypted_data += temp_encrypted_data
-            bytes_read += len(temp_encrypted_data)
+        data_length = int.from_bytes(header, byteorder=self.DATA_LENGTH_BYTE_ORDER, signed=False)
+        if self.maximum_data_length is not None and data_length > self.maximum_data_length:
+            raise OversizedFrame
+        return data_length
 
-        received_data = self.encryption_class.decrypt(encrypted_data)
+    def __receive_decrypted(self):
+        data_length = self.__receive_data_length()
+
+        if data_length is None:
+            return None
+
+        buffer = self.BUFFER_POOL.acquire(data_length)
+        view = memoryview(buffer)[:data_length]
+        try:
+            if SocketIO.receive_exactly(self.socket, view) < data_length:
+                raise ConnectionResetError
+            return self.encryption_class.decrypt(view)
+        finally:
+            view.release()
+            self.BUFFER_POOL.release(buffer)
+
+    def receive_data(self, decode=True):
+        received_data = self.__receive_decrypted()
+
+        if received_data is None:
+            return None
 
         if decode:
             return received_data.decode()
         return received_data
 
+    def receive_data_into(self, buffer):
+        received_data = self.__receive_decrypted()
+
+        if received_data is None:
+            return 0
+
+        buffer[:len(received_data)] = received_data
+        return len(received_data)
+
     def close(self):
         self.socket.close()
 
+    def convert_to_simple_session(self):
+        return SimpleSession(input_socket=self.socket, ip_address=self.ip_address, port_number=self.port_number)
+
 
 class SimpleSession:
     MTU = 4096
     DATA_LENGTH_BYTE_NUMBER = 2
     MDU = MTU - DATA_LENGTH_BYTE_NUMBER
     DATA_LENGTH_BYTE_ORDER = "big"
+    RAW_SLICE_SIZE = 2 ** 20
+    BUFFER_POOL = BufferPool()
 
     def __init__(self, **kwargs):
+        self.data_length_buffer = bytearray(self.DATA_LENGTH_BYTE_NUMBER)
         self.ip_address = kwargs.get("ip_address")
         self.port_number = kwargs.get("port_number")
 
@@ -98,27 +149,82 @@ class SimpleSession:
         data_length = int(len(data)).to_bytes(byteorder=self.DATA_LENGTH_BYTE_ORDER,
                                               length=self.DATA_LENGTH_BYTE_NUMBER,
                                               signed=False)
-        self.socket.sendall(data_length + data)
+        SocketIO.send_vectored(self.socket, data_length, data)
 
-    def receive_data(self, decode=True):
-        data_length = self.socket.recv(self.DATA_LENGTH_BYTE_NUMBER)
+    def __receive_data_length(self):
+        header = memoryview(self.data_length_buffer)
+        bytes_read = SocketIO.receive_exactly(self.socket, header)
 
-        if len(data_length) == 0:
+        if bytes_read == 0:
             return None
+        if bytes_read < len(header):
+            raise ConnectionResetError
 
-        data_length = int.from_bytes(data_length,
-                                     byteorder=self.DATA_LENGTH_BYTE_ORDER,
-                                     signed=False)
-        bytes_read = 0
-        data = b''
-        while bytes_read < data_length:
-            temp_data = self.socket.recv(data_length - bytes_read)
-            data += temp_data
-            bytes_read += len(temp_data)
+        return int.from_bytes(header, byteorder=self.DATA_LENGTH_BYTE_ORDER, signed=False)
 
-        if decode:
-            return data.decode()
-        return data
+    def receive_data(self, decode=True):
+        data_length = self.__receive_data_length()
+
+        if data_length is None:
+            return None
+
+        buffer = self.BUFFER_POOL.acquire(data_length)
+        view = memoryview(buffer)[:data_length]
+        try:
+            if SocketIO.receive_exactly(self.socket, view) < data_length:
+                raise ConnectionResetError
+            if decode:
+                return str(view, "utf-8")
+            return bytes(view)
+        finally:
+            view.release()
+            self.BUFFER_POOL.release(buffer)
+
+    def receive_data_into(self, buffer):
+        data_length = self.__receive_data_length()
+
+        if data_length is None:
+            return 0
+
+        view = memoryview(buffer)[:data_length]
+        if SocketIO.receive_exactly(self.socket, view) < data_length:
+            raise ConnectionResetError
+        return data_length
+
+    def transfer_raw_file(self, source_file_path, offset=0, size=None):
+        with open(source_file_path, "rb") as file:
+            self.socket.sendfile(file, offset=offset, count=size)
+
+    def receive_raw_into(self, buffer):
+        return SocketIO.receive_exactly(self.socket, memoryview(buffer))
+
+    def receive_raw_file(self, dest_path, size):
+        with open(dest_path, "w+b") as file:
+            if size == 0:
+                return
+            file.truncate(size)
+            with mmap.mmap(file.fileno(), size) as mapped_file:
+                view = memoryview(mapped_file)
+                bytes_read = SocketIO.receive_exactly(self.socket, view)
+                view.release()
+
+        if bytes_read < size:
+            raise ConnectionResetError
+
+    def receive_raw_to_file(self, file_descriptor, offset, size):
+        buffer = self.BUFFER_POOL.acquire(min(size, self.RAW_SLICE_SIZE))
+        view = memoryview(buffer)
+        received = 0
+        try:
+            while received < size:
+                data_length = self.socket.recv_into(view[:min(len(view), size - received)])
+                if data_length == 0:
+                    raise ConnectionResetError
+                os.pwrite(file_descriptor, view[:data_length], offset + received)
+                received += data_length
+        finally:
+            view.release()
+            self.BUFFER_POOL.release(buffer)
 
     def close(self):
         self.socket.close()
@@ -129,88 +235,260 @@ class SimpleSession:
 
 
 class FileSession:
+    PIPELINE_SEPARATOR = ","
+
     def __init__(self, **kwargs):
         self.source_ip_address = kwargs.get("source_ip_address")
         self.destination_ip_address = kwargs.get("destination_ip_address")
-        self.replication_storage = []
-        self.replication_storage_lock = Lock()
-        self.replicate_thread_condition = Condition(self.replication_storage_lock)
-
-    def transfer_file(self, source_file_path, session, offset=0, size=None):
+        self.replication_pool = kwargs.get("replication_pool")
+        self.block_cache = kwargs.get("block_cache")
+        self.replication_window_size = kwargs.get("replication_window_size", ReplicationWindow.DEFAULT_CAPACITY)
+        self.replication_window = None
+        self.checksums = None
+        self.replicated_addresses = []
+        self.replication_aborted = False
+
+    def transfer_file(self, source_file_path, session, offset=0, size=None, checksums=None):
         if size is None:
             size = os.path.getsize(source_file_path)
 
         session.transfer_data(str(size))
 
+        if checksums is not None:
+            self.__transfer_verified_file(source_file_path, session, offset, size, checksums)
+            return
+
         with open(source_file_path, "rb") as file:
             file.seek(offset)
             bytes_read = 0
             while bytes_read < size:
-                if bytes_read + EncryptedSession.MDU <= size:
-                    data = file.read(EncryptedSession.MDU)
+                if bytes_read + session.MDU <= size:
+                    data = file.read(session.MDU)
                 else:
                     data = file.read(size - bytes_read)
                 session.transfer_data(data, encode=False)
                 bytes_read += len(data)
 
-    def replicate_chunk(self, ip_address, create_chunk_message, chunk_size):
-        from servers.data_node_server import DataNodeServer
-        session = EncryptedSession(ip_address=ip_address, port_number=DataNodeServer.DATA_NODE_PORT_NUMBER)
-        session.transfer_data(REPLICATE_CHUNK.format(create_chunk_message=create_chunk_message))
-        response = session.receive_data()
-        if response == ACCEPT:
+    def __transfer_verified_file(self, source_file_path, session, offset, size, checksums):
+        block_size = ChunkChecksum.BLOCK_SIZE
+        end = offset + size
+
+        with open(source_file_path, "rb") as file:
+            for block in range(offset // block_size, -(-end // block_size)):
+                if self.block_cache is None:
+                    data = self.__read_verified_block(file, block, checksums)
+                else:
+                    data = self.block_cache.get((source_file_path, block),
+                                                lambda: self.__read_verified_block(file, block, checksums))
+
+                position = block * block_size
+                if len(data) < block_size and position + len(data) < end:
+                    raise CorruptedChunk
+
+                start = max(offset - position, 0)
+                stop = min(end - position, len(data))
+                for frame_start in range(start, stop, session.MDU):
+                    session.transfer_data(data[frame_start:min(frame_start + session.MDU, stop)], encode=False)
+
+    @staticmethod
+    def __read_verified_block(file, block, checksums):
+        if block >= ChunkChecksum.block_count(checksums):
+            raise CorruptedChunk
+
+        data = os.pread(file.fileno(), ChunkChecksum.BLOCK_SIZE, block * ChunkChecksum.BLOCK_SIZE)
+        if block + 1 < ChunkChecksum.block_count(checksums) and len(data) < ChunkChecksum.BLOCK_SIZE:
+            raise CorruptedChunk
+        if not ChunkChecksum.verify(checksums, block, data):
+            raise CorruptedChunk
+        return data
+
+    def transfer_file_plain(self, source_file_path, session, offset=0, size=None):
+        if size is None:
+            size = os.path.getsize(source_file_path)
+
+        session.transfer_data(str(size))
+        session.transfer_raw_file(source_file_path, offset=offset, size=size)
+
+    def replicate_chunk(self, ip_address, create_chunk_message, chunk_size, reader):
+        try:
+            self.__stream_replica(ip_address, REPLICATE_CHUNK.format(create_chunk_message=create_chunk_message),
+                                  chunk_size, reader)
+        finally:
+            self.replication_window.release_reader(reader)
+
+    def replicate_chunk_pipeline(self, pipeline, create_chunk_message, chunk_size, reader):
+        duplicates = []
+        try:
+            for hop in range(len(pipeline)):
+                if self.replication_aborted:
+                    return
+                message = REPLICATE_CHUNK_PIPELINE.format(
+                    pipeline=self.PIPELINE_SEPARATOR.join(pipeline[hop + 1:]) or NULL,
+                    create_chunk_message=create_chunk_message)
+                try:
+                    replicas = self.__stream_replica(pipeline[hop], message, chunk_size, reader, wait_for_ack=True)
+                except DuplicateReplica:
+                    duplicates.append(pipeline[hop])
+                    continue
+                except (PeerTimeOutException, OSError, ValueError):
+                    replicas = None
+
+                if replicas is not None:
+                    self.replicated_addresses = duplicates + replicas
+                    return
+            self.replicated_addresses = duplicates
+        finally:
+            self.replication_window.release_reader(reader)
+
+    def __stream_replica(self, ip_address, message, chunk_size, reader, wait_for_ack=False):
+        if self.replication_pool is not None:
+            session = self.replication_pool.open_session(ip_address)
+        else:
+            from servers.data_node_server import DataNodeServer
+            session = EncryptedSession(ip_address=ip_address, port_number=DataNodeServer.DATA_NODE_PORT_NUMBER)
+
+        try:
+            session.transfer_data(message)
+            response = session.receive_data()
+            if response == DUPLICATE_CHUNK_FOR_FILE and wait_for_ack:
+                raise DuplicateReplica
+            if response == ACCEPT:
+                offset = 0
+            elif MessageCodec.command(response) == MessageCodec.command(RESUME_REPLICATION):
+                offset = int(MessageCodec.decode(RESUME_REPLICATION, response).get("offset"))
+            else:
+                return None
+            self.replication_window.rewind(reader, offset)
             session.transfer_data(str(chunk_size))
-            current_sequence = 0
-            data = "start"
+            data = self.replication_window.read(reader, session.MDU)
             while data is not None:
-                with self.replicate_thread_condition:
-                    while len(self.replication_storage) <= current_sequence:
-                        self.replicate_thread_condition.wait()
-                    data = self.replication_storage[current_sequence]
-
-                if data is None:
-                    break
-                current_sequence += 1
                 session.transfer_data(data, encode=False)
-
-    def receive_file(self, dest_path, session, replication_list=None, create_chunk_message=None):
-        self.replication_storage = []
+                data = self.replication_window.read(reader, session.MDU)
+
+            if not wait_for_ack or self.replication_aborted:
+                return None
+            ack = session.receive_data()
+            if ack is None:
+                raise ConnectionResetError
+            return MessageCodec.decode(REPLICATION_ACK, ack).get("replicas").split(self.PIPELINE_SEPARATOR)
+        finally:
+            session.close()
+
+    def receive_file(self, dest_path, session, replication_list=None, create_chunk_message=None, pipeline=False,
+                     offset=0):
+        self.replication_window = ReplicationWindow(dest_path, capacity=self.replication_window_size,
+                                                    start_offset=offset)
+        self.replicated_addresses = []
+        checksum = self.__prefix_checksum(dest_path, offset)
+        self.replication_aborted = False
         replicate = replication_list is not None and len(replication_list) != 0 and create_chunk_message is not None
         file_size = int(session.receive_data())
-        received = 0
+        received = offset
         replication_threads = []
 
         if replicate:
-            print("Replication list is: ", replication_list)
-            for ip_address in replication_list:
-                replication_threads.append(Thread(target=self.replicate_chunk,
-                                                  args=[ip_address, create_chunk_message, file_size]))
-                replication_threads[-1].start()
-
-        with open(dest_path, "wb") as file:
-            while received < file_size:
-                data = session.receive_data(decode=False)
-                file.write(data)
-                if replicate:
-                    with self.replication_storage_lock:
-                        self.replication_storage.append(data)
-                        self.replicate_thread_condition.notifyAll()
-                received += len(data)
+            if pipeline:
+                replication_threads.append(Thread(target=self.replicate_chunk_pipeline,
+                                                  args=[replication_list, create_chunk_message, file_size,
+                                                        self.replication_window.register_reader()]))
+            else:
+                for ip_address in replication_list:
+                    replication_threads.append(Thread(target=self.replicate_chunk,
+                                                      args=[ip_address, create_chunk_message, file_size,
+                                                            self.replication_window.register_reader()]))
+            for thread in replication_threads:
+                thread.start()
+
+        try:
+            with open(dest_path, "r+b" if offset else "wb") as file:
+                file.seek(offset)
+                file.truncate()
+                while received < file_size:
+                    data = session.receive_data(decode=False)
+                    if data is None:
+                        raise ConnectionResetError
+                    file.write(data)
+                    checksum.update(data)
+                    if replicate:
+                        file.flush()
+                        self.replication_window.append(data)
+                    received += len(data)
+        except ConnectionResetError:
+            self.replication_aborted = True
+            raise
+        finally:
+            self.replication_window.close()
+            for thread in replication_threads:
+                thread.join()
+
+        self.checksums = checksum.digest()
+
+    @staticmethod
+    def __prefix_checksum(path, size):
+        checksum = ChunkChecksum()
+        if size == 0:
+            return checksum
+        with open(path, "rb") as file:
+            while size > 0:
+                data = file.read(min(ChunkChecksum.BLOCK_SIZE, size))
+                if len(data) == 0:
+                    raise EOFError
+                checksum.update(data)
+                size -= len(data)
+        return checksum
+
+    def receive_file_plain(self, dest_path, session):
+        file_size = int(session.receive_data())
+        session.receive_raw_file(dest_path, file_size)
 
-        with self.replication_storage_lock:
-            self.replication_storage.append(None)  # EOF
-            self.replicate_thread_condition.notifyAll()
+    def receive_chunk_plain(self, session):
+        chunk_size = int(session.receive_data())
+        result = bytearray(chunk_size)
+        if session.receive_raw_into(result) < chunk_size:
+            raise ConnectionResetError
+        return result
 
-        for thread in replication_threads:
-            thread.join()
+    @staticmethod
+    def __receive_chunk_size(session, expected_size):
+        chunk_size = int(session.receive_data())
+        if expected_size is not None and chunk_size != expected_size:
+            raise ValueError(f"expected {expected_size} bytes but the data node is sending {chunk_size}")
+        return chunk_size
+
+    def receive_chunk_to_file(self, session, dest_path, offset, expected_size=None):
+        chunk_size = self.__receive_chunk_size(session, expected_size)
+        file_descriptor = os.open(dest_path, os.O_WRONLY)
+        try:
+            received = 0
+            while received < chunk_size:
+                data = session.receive_data(decode=False)
+                if data is None:
+                    raise ConnectionResetError
+                os.pwrite(file_descriptor, data, offset + received)
+                received += len(data)
+        finally:
+            os.close(file_descriptor)
+        return chunk_size
+
+    def receive_chunk_plain_to_file(self, session, dest_path, offset, expected_size=None):
+        chunk_size = self.__receive_chunk_size(session, expected_size)
+        file_descriptor = os.open(dest_path, os.O_WRONLY)
+        try:
+            session.receive_raw_to_file(file_descriptor, offset, chunk_size)
+        finally:
+            os.close(file_descriptor)
+        return chunk_size
 
     def receive_chunk(self, session):
         chunk_size = int(session.receive_data())
         received = 0
-        result = b''
+        result = bytearray(chunk_size)
+        view = memoryview(result)
         while received < chunk_size:
-            data = session.receive_data(decode=False)
-            result += data
-            received += len(data)
+            data_length = session.receive_data_into(view[received:])
+            if data_length == 0:
+                raise ConnectionResetError
+            received += data_length
 
+        view.release()
         return result
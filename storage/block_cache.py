@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from threading import Lock, Event
+
+
+class PendingLoad:
+    def __init__(self):
+        self.done = Event()
+        self.data = None
+        self.error = None
+
+
+class BlockCache:
+    DEFAULT_CAPACITY = 64 * 2 ** 20
+    PROBATION_FRACTION = 0.25
+    GHOST_FRACTION = 0.5
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, block_size=64 * 1024):
+        self.capacity = capacity
+        self.probation_capacity = int(capacity * self.PROBATION_FRACTION)
+        self.ghost_capacity = max(1, int(capacity * self.GHOST_FRACTION) // block_size)
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.ghosts = OrderedDict()
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.pending = {}
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        with self.lock:
+            data = self.__lookup(key)
+            if data is not None:
+                self.hits += 1
+                return data
+
+            pending_load = self.pending.get(key)
+            if pending_load is None:
+                pending_load = PendingLoad()
+                self.pending[key] = pending_load
+                self.misses += 1
+                is_loader = True
+            else:
+                self.coalesced += 1
+                is_loader = False
+
+        if not is_loader:
+            pending_load.done.wait()
+            if pending_load.error is not None:
+                raise pending_load.error
+            return pending_load.data
+
+        try:
+            pending_load.data = loader()
+        except BaseException as error:
+            pending_load.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+                if pending_load.error is None:
+                    self.__insert(key, pending_load.data)
+            pending_load.done.set()
+
+        return pending_load.data
+
+    def invalidate(self, path):
+        with self.lock:
+            for key in [x for x in self.probation if x[0] == path]:
+                self.probation_bytes -= len(self.probation.pop(key))
+            for key in [x for x in self.protected if x[0] == path]:
+                self.protected_bytes -= len(self.protected.pop(key))
+            for key in [x for x in self.ghosts if x[0] == path]:
+                del self.ghosts[key]
+
+    def statistics(self):
+        with self.lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.coalesced) / requests if requests != 0 else 0.0,
+                "cached_bytes": self.probation_bytes + self.protected_bytes,
+            }
+
+    def __lookup(self, key):
+        data = self.protected.get(key)
+        if data is not None:
+            self.protected.move_to_end(key)
+            return data
+
+        data = self.probation.pop(key, None)
+        if data is not None:
+            self.probation_bytes -= len(data)
+            self.protected[key] = data
+            self.protected_bytes += len(data)
+        return data
+
+    def __insert(self, key, data):
+        if len(data) > self.capacity or key in self.probation or key in self.protected:
+            return
+
+        if key in self.ghosts:
+            del self.ghosts[key]
+            self.protected[key] = data
+            self.protected_bytes += len(data)
+        else:
+            self.probation[key] = data
+            self.probation_bytes += len(data)
+        self.__reclaim()
+
+    def __reclaim(self):
+        while self.probation_bytes + self.protected_bytes > self.capacity:
+            if self.probation_bytes > self.probation_capacity or len(self.protected) == 0:
+                key, data = self.probation.popitem(last=False)
+                self.probation_bytes -= len(data)
+                self.ghosts[key] = None
+                if len(self.ghosts) > self.ghost_capacity:
+                    self.ghosts.popitem(last=False)
+            else:
+                key, data = self.protected.popitem(last=False)
+                self.protected_bytes -= len(data)
+            self.evictions += 1
@@ -0,0 +1,48 @@
+import zlib
+
+
+class ChunkChecksum:
+    BLOCK_SIZE = 64 * 1024
+    CHECKSUM_BYTE_NUMBER = 4
+    BYTE_ORDER = "big"
+
+    def __init__(self):
+        self.block_checksums = bytearray()
+        self.current_checksum = 0
+        self.current_block_size = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while len(view) != 0:
+            length = min(len(view), self.BLOCK_SIZE - self.current_block_size)
+            self.current_checksum = zlib.crc32(view[:length], self.current_checksum)
+            self.current_block_size += length
+            view = view[length:]
+            if self.current_block_size == self.BLOCK_SIZE:
+                self.__finish_block()
+
+    def digest(self):
+        if self.current_block_size != 0:
+            self.__finish_block()
+        return bytes(self.block_checksums)
+
+    def __finish_block(self):
+        self.block_checksums += self.current_checksum.to_bytes(self.CHECKSUM_BYTE_NUMBER, self.BYTE_ORDER)
+        self.current_checksum = 0
+        self.current_block_size = 0
+
+    @staticmethod
+    def block_count(checksums):
+        return len(checksums) // ChunkChecksum.CHECKSUM_BYTE_NUMBER
+
+    @staticmethod
+    def verify(checksums, first_block, data):
+        view = memoryview(data)
+        for start in range(0, len(view), ChunkChecksum.BLOCK_SIZE):
+            index = (first_block + start // ChunkChecksum.BLOCK_SIZE) * ChunkChecksum.CHECKSUM_BYTE_NUMBER
+            expected = checksums[index:index + ChunkChecksum.CHECKSUM_BYTE_NUMBER]
+            actual = zlib.crc32(view[start:start + ChunkChecksum.BLOCK_SIZE]).to_bytes(
+                ChunkChecksum.CHECKSUM_BYTE_NUMBER, ChunkChecksum.BYTE_ORDER)
+            if expected != actual:
+                return False
+        return True
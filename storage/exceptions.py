@@ -16,3 +16,7 @@ class DataNodeNotSaved(Exception):
 
 class NotEnoughSpace(Exception):
     message = "Not enough space in the data node"
+
+
+class CorruptedChunk(Exception):
+    message = "Chunk data does not match its checksums"
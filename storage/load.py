@@ -0,0 +1,35 @@
+import heapq
+from threading import Lock
+from time import monotonic
+
+
+class ReadLoadTracker:
+    EXPECTED_READ_RATE = 32 * (2 ** 20)
+    MINIMUM_READ_TIME = 0.5
+
+    def __init__(self, expected_read_rate=EXPECTED_READ_RATE):
+        self.expected_read_rate = expected_read_rate
+        self.reads = {}
+        self.loads = {}
+        self.lock = Lock()
+
+    def __release_finished(self, ip_address, now):
+        reads = self.reads.get(ip_address)
+        while reads and reads[0][0] <= now:
+            self.loads[ip_address] -= heapq.heappop(reads)[1]
+        if not reads:
+            self.reads.pop(ip_address, None)
+            self.loads.pop(ip_address, None)
+
+    def record(self, ip_address, byte_size, weight=1.0):
+        now = monotonic()
+        finish = now + max(self.MINIMUM_READ_TIME, byte_size / self.expected_read_rate)
+        with self.lock:
+            self.__release_finished(ip_address, now)
+            heapq.heappush(self.reads.setdefault(ip_address, []), (finish, weight))
+            self.loads[ip_address] = self.loads.get(ip_address, 0.0) + weight
+
+    def load(self, ip_address):
+        with self.lock:
+            self.__release_finished(ip_address, monotonic())
+            return max(0.0, self.loads.get(ip_address, 0.0))
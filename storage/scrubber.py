@@ -0,0 +1,62 @@
+import os
+from threading import Thread
+from time import monotonic, sleep
+
+from meta_data.database import MetaDatabase
+from meta_data.models.chunk import Chunk
+from storage.checksums import ChunkChecksum
+
+
+class ChunkScrubber(Thread):
+    READ_SIZE = 16 * ChunkChecksum.BLOCK_SIZE
+    DEFAULT_BYTES_PER_SECOND = 4 * 2 ** 20
+    DEFAULT_INTERVAL = 6 * 3600
+
+    def __init__(self, storage, bytes_per_second=DEFAULT_BYTES_PER_SECOND, interval=DEFAULT_INTERVAL, *args,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.daemon = True
+        self.storage = storage
+        self.bytes_per_second = bytes_per_second
+        self.interval = interval
+        self.db = None
+        self.budget_start = None
+        self.budget_bytes = 0
+
+    def run(self):
+        self.db = MetaDatabase()
+        while True:
+            self.scrub()
+            sleep(self.interval)
+
+    def scrub(self):
+        self.budget_start = monotonic()
+        self.budget_bytes = 0
+        corrupted = 0
+        for chunk in Chunk.fetch_by_data_node_id(self.storage.current_data_node.id, db=self.db):
+            if chunk.checksums is not None and not self.is_chunk_intact(chunk):
+                self.storage.report_corrupted_chunk(chunk, self.db)
+                corrupted += 1
+        return corrupted
+
+    def is_chunk_intact(self, chunk: Chunk):
+        if not os.path.isfile(chunk.local_path) or os.path.getsize(chunk.local_path) != int(chunk.chunk_size):
+            return False
+
+        with open(chunk.local_path, "rb") as chunk_file:
+            block = 0
+            data = chunk_file.read(self.READ_SIZE)
+            while len(data) != 0:
+                self.__consume_budget(len(data))
+                if not ChunkChecksum.verify(chunk.checksums, block, data):
+                    return False
+                block += self.READ_SIZE // ChunkChecksum.BLOCK_SIZE
+                data = chunk_file.read(self.READ_SIZE)
+
+        return -(-int(chunk.chunk_size) // ChunkChecksum.BLOCK_SIZE) == ChunkChecksum.block_count(chunk.checksums)
+
+    def __consume_budget(self, byte_number):
+        self.budget_bytes += byte_number
+        delay = self.budget_bytes / self.bytes_per_second - (monotonic() - self.budget_start)
+        if delay > 0:
+            sleep(delay)
@@ -1,22 +1,44 @@
 from meta_data.database import MetaDatabase
+from meta_data.models.chunk import Chunk
 from meta_data.models.data_node import DataNode
 import os
 import uuid
+from threading import Lock
+from time import time
 
+from servers.data_node_server import DataNodeServer
+from session.buffers import ReplicationWindow
+from session.channels import ChannelPool
 from singleton.singleton import Singleton
+from storage.block_cache import BlockCache
 from storage.exceptions import DataNodeNotSaved, NotEnoughSpace
-from valid_messages import UPDATE_DATA_NODE, MESSAGE_SEPARATOR
+from valid_messages import UPDATE_DATA_NODE, MESSAGE_SEPARATOR, REMOVE_CHUNK
 
 
 class Storage(metaclass=Singleton):
     CHUNK_SIZE = 64 * (10 ** 6)
     REPLICATION_FACTOR = 3
+    FALLBACK_DATA_NODE_NUMBER = 2
+    FAN_OUT_REPLICATION = "fanout"
+    PIPELINE_REPLICATION = "pipeline"
+    RESUMABLE_SUFFIX = ".resumable"
+    RESUME_TIMEOUT = 60
 
     def __init__(self, storage_path, current_data_node: DataNode, controller, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.storage_path = storage_path
         self.db = MetaDatabase()
         self.controller = controller
+        self.byte_size_lock = Lock()
+        self.replication_pool = ChannelPool(DataNodeServer.DATA_NODE_PORT_NUMBER)
+        self.replication_pool.start_maintenance()
+        self.pipeline_replication = controller.config.get("replication_mode",
+                                                          self.FAN_OUT_REPLICATION) == self.PIPELINE_REPLICATION
+        self.replication_window_size = int(controller.config.get("replication_window",
+                                                                 ReplicationWindow.DEFAULT_CAPACITY))
+        block_cache_size = int(controller.config.get("block_cache_size", BlockCache.DEFAULT_CAPACITY))
+        self.block_cache = BlockCache(block_cache_size) if block_cache_size > 0 else None
+        self.remove_stale_resumable_files()
 
         if DataNode.fetch_by_ip(current_data_node.ip_address, self.db) is not None:
             self.current_data_node = current_data_node
@@ -56,10 +78,34 @@ class Storage(metaclass=Singleton):
                 data_node.available_byte_size = 0
             i += 1
 
-        for d_node in assigned_nodes:
-            d_node.save()
+        with db.transaction():
+            for d_node in assigned_nodes:
+                d_node.save()
 
-        return chunk_list
+        return [(size, ip_address, self.__choose_fallback_data_nodes(size, ip_address, all_nodes))
+                for size, ip_address in chunk_list]
+
+    def __choose_fallback_data_nodes(self, chunk_size, ip_address, all_nodes):
+        candidates = [x for x in all_nodes if x.ip_address != ip_address and x.available_byte_size >= chunk_size]
+        candidates.sort(key=lambda x: x.available_byte_size, reverse=True)
+        return [x.ip_address for x in candidates[:self.FALLBACK_DATA_NODE_NUMBER]]
+
+    def get_resumable_file(self, file_id, sequence):
+        path = f"{self.storage_path}{file_id}_{sequence}{self.RESUMABLE_SUFFIX}"
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            return path, 0
+
+        if time() - status.st_mtime > self.RESUME_TIMEOUT:
+            os.remove(path)
+            return path, 0
+        return path, status.st_size
+
+    def remove_stale_resumable_files(self):
+        for entry in os.scandir(self.storage_path):
+            if entry.name.endswith(self.RESUMABLE_SUFFIX) and time() - entry.stat().st_mtime > self.RESUME_TIMEOUT:
+                os.remove(entry.path)
 
     def get_new_file_path(self):
         filepath = self.storage_path + str(uuid.uuid4()).replace(MESSAGE_SEPARATOR, "_")
@@ -69,27 +115,38 @@ class Storage(metaclass=Singleton):
         return filepath
 
     def update_byte_size(self, byte_size, db: MetaDatabase):
-        self.current_data_node.db = db
-        self.current_data_node.available_byte_size += byte_size
-
-        if self.current_data_node.available_byte_size < 0:
-            raise NotEnoughSpace
-
-        self.current_data_node.save()
-        self.controller.inform_modification(
-            UPDATE_DATA_NODE.format(available_byte_size=self.current_data_node.available_byte_size,
-                                    ip_address=self.current_data_node.ip_address,
-                                    rack_number=self.current_data_node.rack_number,
-                                    priority=self.current_data_node.priority,
-                                    signature=self.current_data_node.ip_address
-                                    ))
+        with self.byte_size_lock:
+            if self.current_data_node.available_byte_size + byte_size < 0:
+                raise NotEnoughSpace
+
+            self.current_data_node.db = db
+            self.current_data_node.available_byte_size += byte_size
+            self.current_data_node.save()
+            message = UPDATE_DATA_NODE.format(available_byte_size=self.current_data_node.available_byte_size,
+                                              ip_address=self.current_data_node.ip_address,
+                                              rack_number=self.current_data_node.rack_number,
+                                              priority=self.current_data_node.priority,
+                                              signature=self.current_data_node.ip_address
+                                              )
+
+        self.controller.inform_modification(message)
 
     def remove_chunk_file(self, path, db: MetaDatabase):
+        if self.block_cache is not None:
+            self.block_cache.invalidate(path)
         if self.is_valid_path(path):
             chunk_size = os.path.getsize(path)
             os.remove(path)
             self.update_byte_size(chunk_size, db)
 
+    def report_corrupted_chunk(self, chunk: Chunk, db: MetaDatabase):
+        print("Corrupted chunk detected: ", chunk.local_path)
+        chunk.delete()
+        self.remove_chunk_file(chunk.local_path, db)
+        self.controller.inform_modification(REMOVE_CHUNK.format(ip_address=self.current_data_node.ip_address,
+                                                                local_path=chunk.local_path,
+                                                                signature=self.current_data_node.ip_address))
+
     def get_replication_data_nodes(self, chunk_size, db: MetaDatabase):
         all_data_nodes = DataNode.fetch_all(db=db)
         other_data_nodes = [x for x in all_data_nodes if x.id != self.current_data_node.id]
@@ -138,3 +195,9 @@ class Storage(metaclass=Singleton):
                     add_on.append(data_node)
 
         return [x.ip_address for x in result + add_on[:self.REPLICATION_FACTOR - 1 - len(result)]]
+
+
+class WorkerStorage(Storage):
+    def update_byte_size(self, byte_size, db: MetaDatabase):
+        if not self.controller.reserve_byte_size(byte_size):
+            raise NotEnoughSpace
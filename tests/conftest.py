@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meta_data.database import MetaDatabase
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(MetaDatabase, "DATABASE_PATH", str(tmp_path / "meta_data.db"))
+    MetaDatabase.initialize_tables()
+    database = MetaDatabase()
+    yield database
+    database.close()
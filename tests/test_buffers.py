@@ -0,0 +1,117 @@
+import os
+import threading
+
+from session.buffers import ReplicationWindow
+
+
+def read_all(window, reader, size=100):
+    data = bytearray()
+    chunk = window.read(reader, size)
+    while chunk is not None:
+        data += chunk
+        chunk = window.read(reader, size)
+    return bytes(data)
+
+
+def fill(window, path, data, frame_size=100):
+    with open(path, "ab") as backing_file:
+        for start in range(0, len(data), frame_size):
+            backing_file.write(data[start:start + frame_size])
+            backing_file.flush()
+            window.append(data[start:start + frame_size])
+
+
+def test_every_reader_sees_the_whole_stream(tmp_path):
+    path = str(tmp_path / "chunk")
+    data = os.urandom(5000)
+    window = ReplicationWindow(path, capacity=1000)
+    readers = [window.register_reader() for _ in range(3)]
+    results = {}
+    threads = [threading.Thread(target=lambda r=reader: results.update({r: read_all(window, r)}))
+               for reader in readers]
+    for thread in threads:
+        thread.start()
+
+    fill(window, path, data)
+    window.close()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(results[reader] == data for reader in readers)
+
+
+def test_writer_waits_for_the_slowest_reader(tmp_path):
+    path = str(tmp_path / "chunk")
+    data = os.urandom(2000)
+    window = ReplicationWindow(path, capacity=1000)
+    reader = window.register_reader()
+    writer = threading.Thread(target=fill, args=[window, path, data])
+    writer.start()
+
+    writer.join(0.2)
+    assert writer.is_alive()
+    assert window.end_offset - window.reader_offsets[reader] <= 1000
+
+    window.release_reader(reader)
+    writer.join(5)
+    assert not writer.is_alive()
+
+
+def test_rewound_reader_catches_up_from_backing_file(tmp_path):
+    path = str(tmp_path / "chunk")
+    data = os.urandom(1500)
+    window = ReplicationWindow(path, capacity=1000)
+    reader = window.register_reader()
+    fill(window, path, data[:900])
+    assert read_all_available(window, reader, 900) == data[:900]
+    assert window.base_offset == 900
+
+    window.rewind(reader)
+    writer = threading.Thread(target=fill, args=[window, path, data[900:]])
+    writer.start()
+    received = read_all_available(window, reader, len(data))
+    writer.join(5)
+
+    assert received == data
+    assert not writer.is_alive()
+
+
+def test_window_can_start_at_a_resume_offset(tmp_path):
+    path = str(tmp_path / "chunk")
+    data = os.urandom(1200)
+    with open(path, "wb") as backing_file:
+        backing_file.write(data[:700])
+    window = ReplicationWindow(path, capacity=4096, start_offset=700)
+    fresh = window.register_reader()
+    resumed = window.register_reader()
+    window.rewind(resumed, 700)
+
+    fill(window, path, data[700:])
+    window.close()
+
+    assert read_all(window, fresh) == data
+    assert read_all(window, resumed) == data[700:]
+
+
+def read_all_available(window, reader, size):
+    data = bytearray()
+    while len(data) < size:
+        data += window.read(reader, 100)
+    return bytes(data)
+
+
+def test_backing_file_reads_release_a_waiting_writer(tmp_path):
+    path = str(tmp_path / "chunk")
+    data = os.urandom(2000)
+    with open(path, "wb") as backing_file:
+        backing_file.write(data[:1500])
+    window = ReplicationWindow(path, capacity=1000, start_offset=1500)
+    reader = window.register_reader()
+    writer = threading.Thread(target=fill, args=[window, path, data[1500:]])
+    writer.start()
+
+    writer.join(0.2)
+    assert writer.is_alive()
+    assert read_all_available(window, reader, 1500) == data[:1500]
+    writer.join(5)
+    assert not writer.is_alive()
@@ -0,0 +1,79 @@
+import os
+
+from storage.checksums import ChunkChecksum
+from storage.scrubber import ChunkScrubber
+
+BLOCK_SIZE = ChunkChecksum.BLOCK_SIZE
+
+
+class FakeDataNode:
+    id = 1
+
+
+class FakeStorage:
+    current_data_node = FakeDataNode()
+
+    def __init__(self):
+        self.reported = []
+
+    def report_corrupted_chunk(self, chunk, db):
+        self.reported.append(chunk.local_path)
+
+
+def checksums_of(data):
+    checksum = ChunkChecksum()
+    checksum.update(data[:1000])
+    checksum.update(data[1000:])
+    return checksum.digest()
+
+
+def test_checksums_cover_every_block():
+    data = os.urandom(3 * BLOCK_SIZE + 100)
+    checksums = checksums_of(data)
+
+    assert ChunkChecksum.block_count(checksums) == 4
+    assert ChunkChecksum.verify(checksums, 0, data)
+    assert ChunkChecksum.verify(checksums, 2, data[2 * BLOCK_SIZE:])
+
+
+def test_verify_detects_flipped_bit():
+    data = bytearray(os.urandom(2 * BLOCK_SIZE))
+    checksums = checksums_of(bytes(data))
+    data[BLOCK_SIZE + 7] ^= 1
+
+    assert ChunkChecksum.verify(checksums, 0, bytes(data[:BLOCK_SIZE]))
+    assert not ChunkChecksum.verify(checksums, 0, bytes(data))
+
+
+def test_scrubber_reports_only_damaged_chunks(db, tmp_path):
+    db.execute("INSERT INTO data_node (id, ip_address, rack_number, priority, available_byte_size) "
+               "VALUES (1, '10.0.0.1', 1, 0, 0);")
+    db.execute("INSERT INTO directory (id, title, path) VALUES (1, 'main', 'al/main');")
+    db.execute("INSERT INTO file (id, title, extension, is_complete, directory_id, sequence_num) "
+               "VALUES (1, 'f', 'bin', 1, 1, 4);")
+
+    chunks = {}
+    for sequence, name in enumerate(["intact", "flipped", "truncated", "missing"], start=1):
+        data = os.urandom(2 * BLOCK_SIZE + 10)
+        path = str(tmp_path / name)
+        chunks[name] = path
+        with open(path, "wb") as chunk_file:
+            chunk_file.write(data)
+        db.execute("INSERT INTO chunk (sequence, local_path, chunk_size, data_node_id, file_id, checksums) "
+                   "VALUES (?, ?, ?, 1, 1, ?);", sequence, path, len(data), checksums_of(data))
+
+    with open(chunks["flipped"], "r+b") as chunk_file:
+        chunk_file.seek(BLOCK_SIZE + 3)
+        byte = chunk_file.read(1)
+        chunk_file.seek(BLOCK_SIZE + 3)
+        chunk_file.write(bytes([byte[0] ^ 0xFF]))
+    with open(chunks["truncated"], "r+b") as chunk_file:
+        chunk_file.truncate(BLOCK_SIZE)
+    os.remove(chunks["missing"])
+
+    storage = FakeStorage()
+    scrubber = ChunkScrubber(storage, bytes_per_second=2 ** 40)
+    scrubber.db = db
+
+    assert scrubber.scrub() == 3
+    assert sorted(storage.reported) == sorted([chunks["flipped"], chunks["truncated"], chunks["missing"]])
@@ -0,0 +1,95 @@
+import socket
+import threading
+
+import pytest
+import rsa
+from cryptography.exceptions import InvalidTag
+
+from encryption.encryptors import AEADEncryption, RSAEncryption
+from encryption.exceptions import InvalidHandshake, InvalidFrameSize
+
+
+@pytest.fixture(scope="module", autouse=True)
+def identity_key():
+    previous_key = RSAEncryption.identity_key
+    RSAEncryption.identity_key = rsa.newkeys(1024)[1]
+    yield
+    RSAEncryption.identity_key = previous_key
+
+
+@pytest.fixture
+def connection():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    client = socket.create_connection(listener.getsockname())
+    server = listener.accept()[0]
+    listener.close()
+    RSAEncryption.TICKET_CACHE.entries.clear()
+    yield client, server
+    client.close()
+    server.close()
+
+
+def negotiate(connection, frame_size):
+    client, server = connection
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(server=RSAEncryption.create_server_encryption(server)))
+    thread.start()
+    client_encryption = RSAEncryption.create_client_encryption(client, frame_size=frame_size)
+    thread.join()
+    return client_encryption, result["server"]
+
+
+def test_negotiates_requested_frame_size(connection):
+    client, server = negotiate(connection, 2 ** 20)
+
+    assert isinstance(client, AEADEncryption) and isinstance(server, AEADEncryption)
+    assert client.frame_size == server.frame_size == 2 ** 20
+    assert server.decrypt(client.encrypt(b"request")) == b"request"
+    assert client.decrypt(server.encrypt(b"response")) == b"response"
+
+
+@pytest.mark.parametrize("offered, accepted", [
+    (1024, AEADEncryption.MINIMUM_FRAME_SIZE),
+    (2 ** 30, AEADEncryption.MAXIMUM_FRAME_SIZE),
+])
+def test_server_clamps_offered_frame_size(connection, offered, accepted):
+    client, server = negotiate(connection, offered)
+
+    assert client.frame_size == server.frame_size == accepted
+
+
+@pytest.mark.parametrize("offered", [None, "large"])
+def test_falls_back_to_fernet_without_usable_offer(connection, offered):
+    client, server = negotiate(connection, offered)
+
+    assert type(client) is RSAEncryption and type(server) is RSAEncryption
+    assert server.decrypt(client.encrypt(b"legacy")) == b"legacy"
+
+
+def test_rejects_truncated_handshake(connection):
+    client, server = connection
+    client.sendall(b"\x00\x00\x01\x00partial")
+    client.shutdown(socket.SHUT_WR)
+
+    with pytest.raises(InvalidHandshake):
+        RSAEncryption.create_server_encryption(server)
+
+
+def test_aead_frames_cannot_be_replayed_or_reflected():
+    key = b"k" * 32
+    client = AEADEncryption(key, 2 ** 16)
+    server = AEADEncryption(key, 2 ** 16, is_server=True)
+    frame = client.encrypt(b"once")
+
+    assert server.decrypt(frame) == b"once"
+    with pytest.raises(InvalidTag):
+        server.decrypt(frame)
+    with pytest.raises(InvalidTag):
+        client.decrypt(client.encrypt(b"reflected"))
+
+
+def test_local_frame_size_is_validated():
+    with pytest.raises(InvalidFrameSize):
+        AEADEncryption(b"k" * 32, AEADEncryption.MAXIMUM_FRAME_SIZE + 1)
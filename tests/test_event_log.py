@@ -0,0 +1,91 @@
+import pytest
+
+from meta_data.event_log import EventLog
+
+
+class Recorder:
+    def __init__(self):
+        self.applied = []
+
+    def __call__(self, origin, sequence, event):
+        self.applied.append((origin, sequence, event))
+
+
+def test_applies_events_in_sequence(db):
+    log = EventLog()
+    handler = Recorder()
+
+    for sequence in range(1, 4):
+        assert log.apply("a", sequence, f"event{sequence}", handler, db=db) is None
+
+    assert handler.applied == [("a", 1, "event1"), ("a", 2, "event2"), ("a", 3, "event3")]
+    assert log.applied_sequences(db) == {"a": 3}
+
+
+def test_holds_events_after_a_gap_and_requests_the_tail(db):
+    log = EventLog()
+    handler = Recorder()
+
+    assert log.apply("a", 3, "event3", handler, db=db) == 0
+    assert log.apply("a", 4, "event4", handler, db=db) is None
+    assert handler.applied == []
+
+    log.apply("a", 1, "event1", handler, db=db)
+    assert [x[1] for x in handler.applied] == [1]
+    log.apply("a", 2, "event2", handler, db=db)
+
+    assert [x[1] for x in handler.applied] == [1, 2, 3, 4]
+    assert log.applied_sequences(db) == {"a": 4}
+    assert log.pending == {}
+
+
+def test_ignores_already_applied_events(db):
+    log = EventLog()
+    handler = Recorder()
+    log.apply("a", 1, "event1", handler, db=db)
+
+    assert log.apply("a", 1, "event1", handler, db=db) is None
+    assert len(handler.applied) == 1
+
+
+def test_failed_handler_leaves_log_untouched(db):
+    log = EventLog()
+
+    def failing_handler(origin, sequence, event):
+        db.execute("INSERT INTO directory (id, title, path) VALUES (1, 'main', 'al/main');")
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        log.apply("a", 1, "event1", failing_handler, db=db)
+
+    assert log.applied_sequences(db) == {}
+    assert db.fetch("SELECT count(*) FROM directory;")[0][0] == 0
+    assert log.missing("a", 0, db=db) == []
+
+
+def test_tail_returns_unseen_events_per_origin(db):
+    log = EventLog()
+    handler = Recorder()
+    for origin, sequence in [("a", 1), ("b", 1), ("a", 2), ("b", 2)]:
+        log.apply(origin, sequence, f"{origin}{sequence}", handler, db=db)
+
+    assert log.tail({"a": 1, "b": 0}, db=db) == [("b", 1, "b1"), ("a", 2, "a2"), ("b", 2, "b2")]
+    assert log.missing("a", 1, db=db) == [(2, "a2")]
+
+
+def test_tail_requires_snapshot_once_events_are_truncated(db):
+    log = EventLog(retention=2)
+    handler = Recorder()
+    for sequence in range(1, 6):
+        log.apply("a", sequence, f"event{sequence}", handler, db=db)
+
+    assert log.tail({"a": 1}, db=db) is None
+    assert log.missing("a", 1, db=db) is None
+    assert log.tail({"a": 3}, db=db) == [("a", 4, "event4"), ("a", 5, "event5")]
+
+
+def test_sequence_encoding_round_trips():
+    sequences = {"10.0.0.1": 4, "10.0.0.2": 9}
+
+    assert EventLog.decode_sequences(EventLog.encode_sequences(sequences)) == sequences
+    assert EventLog.decode_sequences(EventLog.encode_sequences({})) == {}
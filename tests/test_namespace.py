@@ -0,0 +1,82 @@
+import os
+
+from meta_data.database import MetaDatabase
+from meta_data.models.permission import Permission
+from meta_data.namespace import Namespace, NamespaceEngine
+
+
+def create_tree(db):
+    db.execute("INSERT INTO users (id, username, password) VALUES (1, 'al', 'pw');")
+    db.execute("INSERT INTO directory (id, title, parent_directory_id, path) VALUES (3, 'main', NULL, 'al/main');")
+    db.execute("INSERT INTO directory (id, title, parent_directory_id, path) VALUES (1, 'docs', 3, 'al/main/docs');")
+    db.execute("INSERT INTO file (id, title, extension, is_complete, directory_id, sequence_num) "
+               "VALUES (1, 'notes', 'txt', 1, 1, 1);")
+    db.execute("INSERT INTO permission (perm, directory_id, user_id) VALUES (?, 3, 1);", Permission.OWNER)
+
+
+def test_load_links_children_regardless_of_row_order(db):
+    create_tree(db)
+
+    namespace = Namespace.load(db)
+
+    main = namespace.fetch_directory("al", "main")
+    assert main.has_child("docs")
+    assert main.get_user_permission("al") == Permission.OWNER
+    docs = namespace.fetch_directory("al", "main/docs")
+    assert namespace.fetch_file(docs.id, "notes", "txt").sequence_num == 1
+    assert namespace.fetch_user("al").password == "pw"
+
+
+def test_applied_operations_update_the_image(db):
+    create_tree(db)
+    namespace = Namespace.load(db)
+
+    namespace.apply((Namespace.NEW_FILE, 2, "draft", "md", 1, 2))
+    namespace.apply((Namespace.FILE_PERMISSION, 2, 1, "al", Permission.OWNER))
+    assert namespace.fetch_file(1, "draft", "md").get_user_permission("al") == Permission.OWNER
+
+    namespace.apply((Namespace.REMOVE_FILE, 2))
+    assert namespace.fetch_file(1, "draft", "md") is None
+
+
+def test_construction_has_no_side_effects(db):
+    NamespaceEngine()
+
+    assert not os.path.exists(NamespaceEngine.journal_path())
+
+
+def test_journal_replays_operations_missing_from_sqlite(db):
+    create_tree(db)
+    engine = NamespaceEngine()
+    engine.open()
+    connection = engine.connect()
+    engine.record(connection, (Namespace.NEW_FILE, 7, "draft", "md", 1, 2),
+                  (Namespace.FILE_PERMISSION, 7, 1, "al", Permission.READ_ONLY))
+    connection.close()
+    engine.journal.close()
+    with open(NamespaceEngine.journal_path(), "ab") as journal:
+        journal.write(b"\x00\x00\x01")
+
+    assert db.fetch("SELECT count(*) FROM file WHERE id=7;")[0][0] == 0
+    recovered = NamespaceEngine()
+    recovered.open()
+
+    assert db.fetch("SELECT title, sequence_num FROM file WHERE id=7;") == [("draft", 2)]
+    assert db.fetch("SELECT perm FROM permission WHERE file_id=7;") == [(Permission.READ_ONLY,)]
+    assert os.path.getsize(NamespaceEngine.journal_path()) == 0
+    assert recovered.image(db).fetch_file(1, "draft", "md") is not None
+
+
+def test_write_persists_and_applies_permission(db):
+    create_tree(db)
+    engine = NamespaceEngine()
+    engine.open()
+    connection = engine.connect()
+    namespace = engine.image(connection)
+
+    engine.write(connection, (Namespace.FILE_PERMISSION, 1, 1, "al", Permission.READ_ONLY))
+    engine.write(connection, (Namespace.FILE_PERMISSION, 1, 1, "al", Permission.OWNER))
+
+    assert namespace.files_by_id[1].get_user_permission("al") == Permission.OWNER
+    assert MetaDatabase().fetch("SELECT perm FROM permission WHERE file_id=1;") == [(Permission.OWNER,)]
+    connection.close()
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from client.exceptions import ChunkUploadFailed
+from client.transfers import ByteBudget, UploadPool, UploadTask
+
+
+def create_pool(upload_function, tasks):
+    pool = UploadPool(upload_function, maximum_concurrency=8, maximum_node_concurrency=4)
+    for task in tasks:
+        pool.add(task)
+    return pool
+
+
+def test_failed_upload_is_retried_on_the_next_data_node():
+    uploaded = {}
+    lock = threading.Lock()
+
+    def upload(ip_address, task):
+        if ip_address == "a":
+            raise ChunkUploadFailed("out_of_space")
+        with lock:
+            uploaded[task.sequence] = ip_address
+
+    pool = create_pool(upload, [UploadTask(sequence, 10, 0, ["a", "b"]) for sequence in range(1, 21)])
+
+    assert pool.run()
+    assert uploaded == {sequence: "b" for sequence in range(1, 21)}
+    assert pool.in_flight == 0
+    assert pool.uploaded_bytes == 200
+
+
+def test_upload_fails_after_every_data_node_failed():
+    def upload(ip_address, task):
+        raise OSError("unreachable")
+
+    pool = create_pool(upload, [UploadTask(1, 10, 0, ["a", "b"])])
+
+    assert not pool.run()
+    assert [task.sequence for task in pool.failed_tasks] == [1]
+    assert pool.failed_tasks[0].attempts == UploadPool.MAXIMUM_ATTEMPTS
+    assert pool.in_flight == 0
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_unexpected_error_settles_accounting():
+    def upload(ip_address, task):
+        if task.sequence == 3:
+            raise KeyError("reply")
+
+    pool = create_pool(upload, [UploadTask(sequence, 10, 0, ["a", "b"]) for sequence in range(1, 10)])
+    finished = threading.Event()
+    result = []
+    threading.Thread(target=lambda: (result.append(pool.run()), finished.set()), daemon=True).start()
+
+    assert finished.wait(10)
+    assert result == [False]
+    assert pool.in_flight == 0
+    assert [task.sequence for task in pool.failed_tasks] == [3]
+
+
+def test_byte_budget_blocks_until_released():
+    budget = ByteBudget(100)
+    reserved = budget.acquire(80)
+    acquired = threading.Event()
+    threading.Thread(target=lambda: (budget.acquire(50), acquired.set()), daemon=True).start()
+
+    assert not acquired.wait(0.1)
+    budget.release(reserved)
+    assert acquired.wait(5)
+
+
+def test_byte_budget_caps_oversized_reservations():
+    budget = ByteBudget(100)
+
+    assert budget.acquire(1000) == 100
+    assert budget.available == 0
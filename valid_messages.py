@@ -14,6 +14,10 @@ CREATE_CHUNK = "crc-{sequence}-{chunk_size}-{username}-{path}-{title}-{extension
 CREATE_DIR = "cd-{path}-{username}"
 GET_FILE = "getf-{path}-{username}"
 GET_CHUNK = "getc-{path}-{username}-{sequence}"
+GET_CHUNK_PLAIN = "getcp-{path}-{username}-{sequence}"
+GET_FILE_RANGE = "getfr-{offset}-{length}-{username}-{path}"
+GET_CHUNK_RANGE = "getcr-{sequence}-{offset}-{length}-{username}-{path}"
+OPEN_CHANNEL = "chnl"
 
 OUT_OF_SPACE = "no_space"
 INVALID_METADATA = "meta_err"
@@ -41,23 +45,31 @@ Peer-Peer Messages
 
 JOIN_NETWORK = "join"
 INTRODUCE_PEER = "intro-{ip_address}"
-CONFIRM_HANDSHAKE = "confirm-{available_byte_size}-{rack_number}-{priority}"
+CONFIRM_HANDSHAKE = "confirm-{available_byte_size}-{rack_number}-{priority}-{applied_events}"
 STOP_FRIENDSHIP = "stop_fr"
 RESPOND_TO_BROADCAST = "broadcast"
 RESPOND_TO_INTRODUCTION = "introduction"
 SEND_DB = "snddb"
+SEND_DB_PLAIN = "snddbp"
 UNBLOCK_QUEUEING = "unblck"
 BLOCK_QUEUEING = "blck"
 ABORT_JOIN = "abrt"
 PEER_FAILURE = "failpeer-{failed_address}-{reporter_address}"
 RESPOND_PEER_FAILURE = "rspndfailpeer-{failed_address}-{self_ip_address}-{reporter_address}"
 REPLICATE_CHUNK = "rep-{create_chunk_message}"
+REPLICATE_CHUNK_PIPELINE = "reppl-{pipeline}-{create_chunk_message}"
+REPLICATION_ACK = "repack-{replicas}"
+RESUME_REPLICATION = "represm-{offset}"
 NAME_NODE_DOWN = "namenodedown-{name_node_address}"
+SEND_EVENTS = "sndev-{count}"
+SEQUENCED_EVENT = "seqev-{origin}-{sequence}-{event}"
+REQUEST_EVENTS = "rqev-{origin}-{sequence}"
 
 """
 General Messages
 """
 ACCEPT = "ok"
+ACCEPT_PLAIN = "ok_plain"
 NULL = "null"
 REJECT = "reject"
 
@@ -74,6 +86,7 @@ REMOVE_FILE = "remfile-{path}-{signature}"
 NEW_FILE_PERMISSION = "nwfperm-{path}-{username}-{perm}-{signature}"
 NEW_DIR_PERMISSION = "nwdperm-{path}-{username}-{perm}-{signature}"
 REMOVE_DATA_NODE = "rmnd-{ip_address}-{signature}"
+REMOVE_CHUNK = "rmchnk-{ip_address}-{local_path}-{signature}"
 
 """
 Inter-Process Communication
@@ -82,3 +95,4 @@ Inter-Process Communication
 START_CLIENT_SERVER = "start"
 DELETE_CHUNK = "delc-{path}"
 NAME_NODE_STATUS = "name_node-{status}"
+UPDATE_BYTE_SIZE = "updbs-{byte_size}"